@@ -17,7 +17,9 @@ config.set_main_option('sqlalchemy.url', settings.DATABASE_URL)
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # Миграции запускаются и из процесса приложения (bootstrap) - его
+    # логгеры отключать нельзя.
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -55,8 +57,25 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 
+def include_conditional(connection: Connection):
+    """
+    Индекс с условием ddl_if сравнивается с БД, только если условие на ней
+    выполняется - как при create_all (например, pg_trgm установлен).
+    """
+    def include_object(object, name, type_, reflected, compare_to):
+        condition = getattr(object, '_ddl_if', None)
+        if type_ != 'index' or reflected or condition is None:
+            return True
+        if condition.callable_ is None:
+            return True
+        return condition.callable_(None, object, connection)
+
+    return include_object
+
+
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(connection=connection, target_metadata=target_metadata,
+                      include_object=include_conditional(connection))
 
     with context.begin_transaction():
         context.run_migrations()
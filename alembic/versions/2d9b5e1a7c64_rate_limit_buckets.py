@@ -0,0 +1,42 @@
+"""Rate limit buckets
+
+Revision ID: 2d9b5e1a7c64
+Revises: 4c1e8b3f6a27
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d9b5e1a7c64'
+down_revision: Union[str, Sequence[str], None] = '4c1e8b3f6a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'rate_limit_bucket',
+        sa.Column('key', sa.String(length=320), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.Column('burst', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+        prefixes=['UNLOGGED']
+    )
+    op.create_index('ix_rate_limit_bucket_updated_at', 'rate_limit_bucket',
+                    ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_rate_limit_bucket_updated_at',
+                  table_name='rate_limit_bucket')
+    op.drop_table('rate_limit_bucket')
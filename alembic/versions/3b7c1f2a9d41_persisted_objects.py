@@ -0,0 +1,72 @@
+"""Persisted objects with owner, attributes and indexes
+
+Revision ID: 3b7c1f2a9d41
+Revises: da855f189d03
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7c1f2a9d41'
+down_revision: Union[str, Sequence[str], None] = 'da855f189d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В заглушке somemodel хранился только id - такие строки без владельца
+    # перенести некуда.
+    op.execute('DELETE FROM somemodel')
+    op.add_column('somemodel', sa.Column('owner_id', sa.Integer(),
+                                         nullable=False))
+    op.add_column('somemodel', sa.Column('name', sa.String(length=254),
+                                         nullable=False))
+    op.add_column('somemodel', sa.Column(
+        'attributes', postgresql.JSONB(astext_type=sa.Text()),
+        server_default=sa.text("'{}'"), nullable=False
+    ))
+    op.add_column('somemodel', sa.Column(
+        'created_at', sa.DateTime(timezone=True),
+        server_default=sa.text('now()'), nullable=False
+    ))
+    op.add_column('somemodel', sa.Column(
+        'updated_at', sa.DateTime(timezone=True),
+        server_default=sa.text('now()'), nullable=False
+    ))
+    op.create_foreign_key('somemodel_owner_id_fkey', 'somemodel', 'user',
+                          ['owner_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_somemodel_owner_id_id', 'somemodel',
+                    ['owner_id', 'id'], unique=False)
+    op.create_index('ix_somemodel_created_at_id', 'somemodel',
+                    ['created_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_updated_at_id', 'somemodel',
+                    ['updated_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_name_id', 'somemodel',
+                    ['name', 'id'], unique=False)
+    op.create_index('ix_somemodel_attributes', 'somemodel', ['attributes'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'attributes': 'jsonb_path_ops'})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_somemodel_attributes', table_name='somemodel',
+                  postgresql_using='gin')
+    op.drop_index('ix_somemodel_name_id', table_name='somemodel')
+    op.drop_index('ix_somemodel_updated_at_id', table_name='somemodel')
+    op.drop_index('ix_somemodel_created_at_id', table_name='somemodel')
+    op.drop_index('ix_somemodel_owner_id_id', table_name='somemodel')
+    op.drop_constraint('somemodel_owner_id_fkey', 'somemodel',
+                       type_='foreignkey')
+    op.drop_column('somemodel', 'updated_at')
+    op.drop_column('somemodel', 'created_at')
+    op.drop_column('somemodel', 'attributes')
+    op.drop_column('somemodel', 'name')
+    op.drop_column('somemodel', 'owner_id')
@@ -0,0 +1,50 @@
+"""Token revocation
+
+Revision ID: 4c1e8b3f6a27
+Revises: 9a4f2c7e5d18
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c1e8b3f6a27'
+down_revision: Union[str, Sequence[str], None] = '9a4f2c7e5d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'revoked_token',
+        sa.Column('jti', sa.String(length=32), nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('jti')
+    )
+    op.create_index('ix_revoked_token_expires_at', 'revoked_token',
+                    ['expires_at'], unique=False)
+    op.create_table(
+        'user_token_cutoff',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('revoked_before', sa.DateTime(timezone=True),
+                  nullable=False),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    op.create_index('ix_user_token_cutoff_expires_at', 'user_token_cutoff',
+                    ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_token_cutoff_expires_at',
+                  table_name='user_token_cutoff')
+    op.drop_table('user_token_cutoff')
+    op.drop_index('ix_revoked_token_expires_at', table_name='revoked_token')
+    op.drop_table('revoked_token')
@@ -0,0 +1,51 @@
+"""User search indexes
+
+Revision ID: 5f8a3d2c1b96
+Revises: 2d9b5e1a7c64
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f8a3d2c1b96'
+down_revision: Union[str, Sequence[str], None] = '2d9b5e1a7c64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+# SQL заморожен в ревизии: миграция не должна меняться вместе с моделями.
+TRIGRAM_EXTENSION = 'pg_trgm'
+USER_FIO_SQL = ("(firstname || ' ' || coalesce(surname, '') || ' ' || "
+                "coalesce(patronymic, ''))")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_user_email_lower_pattern', 'user',
+                    [sa.text('lower(email) text_pattern_ops')], unique=False)
+    available = op.get_bind().scalar(sa.text(
+        'SELECT EXISTS (SELECT 1 FROM pg_available_extensions '
+        'WHERE name = :name)'
+    ), dict(name=TRIGRAM_EXTENSION))
+    if not available:
+        # Поиск по ФИО работает и без индекса, но без учёта опечаток.
+        logger.warning('%s недоступен: индекс ix_user_fio_trgm не создан',
+                       TRIGRAM_EXTENSION)
+        return
+    op.execute(f'CREATE EXTENSION IF NOT EXISTS {TRIGRAM_EXTENSION}')
+    op.create_index('ix_user_fio_trgm', 'user',
+                    [sa.text(f'{USER_FIO_SQL} gin_trgm_ops')],
+                    unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP INDEX IF EXISTS ix_user_fio_trgm')
+    op.drop_index('ix_user_email_lower_pattern', table_name='user')
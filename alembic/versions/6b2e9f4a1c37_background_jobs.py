@@ -0,0 +1,56 @@
+"""Background jobs
+
+Revision ID: 6b2e9f4a1c37
+Revises: 5f8a3d2c1b96
+Create Date: 2026-10-18 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6b2e9f4a1c37'
+down_revision: Union[str, Sequence[str], None] = '5f8a3d2c1b96'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'job',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('kind', sa.String(length=63), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()),
+                  nullable=False),
+        sa.Column('status', sa.String(length=16), server_default='pending',
+                  nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default=sa.text('0'),
+                  nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.Column('locked_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_job_ready', 'job', ['run_at', 'id'], unique=False,
+                    postgresql_where=sa.text("status = 'pending'"))
+    op.create_index('ix_job_running_locked_at', 'job', ['locked_at'],
+                    unique=False,
+                    postgresql_where=sa.text("status = 'running'"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_job_running_locked_at', table_name='job',
+                  postgresql_where=sa.text("status = 'running'"))
+    op.drop_index('ix_job_ready', table_name='job',
+                  postgresql_where=sa.text("status = 'pending'"))
+    op.drop_table('job')
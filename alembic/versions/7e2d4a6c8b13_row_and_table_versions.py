@@ -0,0 +1,82 @@
+"""Row and table versions for conditional GET
+
+Revision ID: 7e2d4a6c8b13
+Revises: 3b7c1f2a9d41
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e2d4a6c8b13'
+down_revision: Union[str, Sequence[str], None] = '3b7c1f2a9d41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQL заморожен в ревизии: миграция не должна меняться вместе с моделями.
+VERSIONED_TABLES = ('user', 'somemodel')
+BUMP_TABLE_VERSION_FUNCTION = '''
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_version (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_version.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+'''
+BUMP_TABLE_VERSION_TRIGGER = (
+    'CREATE TRIGGER {table_name}_bump_table_version '
+    'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{table_name}" '
+    'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()'
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('user', sa.Column('version', sa.Integer(),
+                                    server_default=sa.text('1'),
+                                    nullable=False))
+    op.add_column('user', sa.Column(
+        'updated_at', sa.DateTime(timezone=True),
+        server_default=sa.text('now()'), nullable=False
+    ))
+    op.add_column('somemodel', sa.Column('version', sa.Integer(),
+                                         server_default=sa.text('1'),
+                                         nullable=False))
+    op.create_index('ix_user_id_version', 'user', ['id'], unique=False,
+                    postgresql_include=['version', 'updated_at'])
+    op.create_index('ix_somemodel_id_version', 'somemodel', ['id'],
+                    unique=False,
+                    postgresql_include=['version', 'updated_at'])
+    op.create_table(
+        'table_version',
+        sa.Column('table_name', sa.String(length=63), nullable=False),
+        sa.Column('version', sa.BigInteger(), server_default=sa.text('0'),
+                  nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('table_name')
+    )
+    op.execute(BUMP_TABLE_VERSION_FUNCTION)
+    for table_name in VERSIONED_TABLES:
+        op.execute(BUMP_TABLE_VERSION_TRIGGER.format(table_name=table_name))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table_name in VERSIONED_TABLES:
+        op.execute(f'DROP TRIGGER {table_name}_bump_table_version '
+                   f'ON "{table_name}"')
+    op.execute('DROP FUNCTION bump_table_version()')
+    op.drop_table('table_version')
+    op.drop_index('ix_somemodel_id_version', table_name='somemodel')
+    op.drop_index('ix_user_id_version', table_name='user')
+    op.drop_column('somemodel', 'version')
+    op.drop_column('user', 'updated_at')
+    op.drop_column('user', 'version')
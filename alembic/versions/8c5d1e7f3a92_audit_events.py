@@ -0,0 +1,56 @@
+"""Audit events
+
+Revision ID: 8c5d1e7f3a92
+Revises: 6b2e9f4a1c37
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c5d1e7f3a92'
+down_revision: Union[str, Sequence[str], None] = '6b2e9f4a1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Секции по месяцам создаёт приложение перед первой записью в них
+    # (app.core.audit.ensure_partition).
+    op.create_table(
+        'audit_event',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('actor_id', sa.Integer(), nullable=True),
+        sa.Column('action', sa.String(length=63), nullable=False),
+        sa.Column('entity', sa.String(length=63), nullable=False),
+        sa.Column('entity_id', sa.BigInteger(), nullable=True),
+        sa.Column('changes', postgresql.JSONB(astext_type=sa.Text()),
+                  server_default=sa.text("'{}'"), nullable=False),
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)'
+    )
+    op.create_index('ix_audit_event_created_at_id', 'audit_event',
+                    ['created_at', 'id'], unique=False)
+    op.create_index('ix_audit_event_actor_id_created_at', 'audit_event',
+                    ['actor_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_audit_event_entity_created_at', 'audit_event',
+                    ['entity', 'entity_id', 'created_at', 'id'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audit_event_entity_created_at',
+                  table_name='audit_event')
+    op.drop_index('ix_audit_event_actor_id_created_at',
+                  table_name='audit_event')
+    op.drop_index('ix_audit_event_created_at_id', table_name='audit_event')
+    # Секции удаляются вместе с секционированной таблицей.
+    op.drop_table('audit_event')
@@ -0,0 +1,35 @@
+"""Bootstrap marker
+
+Revision ID: 9a4f2c7e5d18
+Revises: 7e2d4a6c8b13
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f2c7e5d18'
+down_revision: Union[str, Sequence[str], None] = '7e2d4a6c8b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'bootstrap_marker',
+        sa.Column('name', sa.String(length=63), nullable=False),
+        sa.Column('revision', sa.String(length=32), nullable=False),
+        sa.Column('completed_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('bootstrap_marker')
@@ -0,0 +1,56 @@
+"""Active user indexes and user archive
+
+Revision ID: a3f7c9e2d415
+Revises: 8c5d1e7f3a92
+Create Date: 2026-10-18 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f7c9e2d415'
+down_revision: Union[str, Sequence[str], None] = '8c5d1e7f3a92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_user_email_lower_active', 'user',
+                    [sa.text('lower(email)')], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.create_index('ix_user_active_id', 'user', ['id'], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.create_table(
+        'user_archive',
+        sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('email', sa.String(length=320), nullable=False),
+        sa.Column('hashed_password', sa.String(length=1024),
+                  nullable=False),
+        sa.Column('firstname', sa.String(length=254), nullable=False),
+        sa.Column('surname', sa.String(length=254), nullable=True),
+        sa.Column('patronymic', sa.String(length=254), nullable=True),
+        sa.Column('is_superuser', sa.Boolean(), nullable=False),
+        sa.Column('is_verified', sa.Boolean(), nullable=False),
+        sa.Column('deactivated_at', sa.DateTime(timezone=True),
+                  nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_user_archive_email'), 'user_archive', ['email'],
+                    unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_user_archive_email'), table_name='user_archive')
+    op.drop_table('user_archive')
+    op.drop_index('ix_user_active_id', table_name='user',
+                  postgresql_where=sa.text('is_active'))
+    op.drop_index('ix_user_email_lower_active', table_name='user',
+                  postgresql_where=sa.text('is_active'))
@@ -0,0 +1,198 @@
+"""Tenants and hash-partitioned objects
+
+Revision ID: c6e1b8d4f209
+Revises: a3f7c9e2d415
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c6e1b8d4f209'
+down_revision: Union[str, Sequence[str], None] = 'a3f7c9e2d415'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# SQL заморожен в ревизии: миграция не должна меняться вместе с моделями.
+DEFAULT_TENANT_ID = 1
+TENANT_PARTITIONS = 8
+BUMP_OBJECTS_VERSION_TRIGGER = (
+    'CREATE TRIGGER somemodel_bump_table_version '
+    'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON somemodel '
+    'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()'
+)
+OBJECT_COLUMN_NAMES = ('id', 'owner_id', 'name', 'attributes', 'created_at',
+                       'updated_at', 'version')
+OBJECT_COLUMNS = ', '.join(OBJECT_COLUMN_NAMES)
+
+
+def object_columns(*leading: sa.Column) -> list:
+    """Колонки somemodel, общие для обычной и секционированной таблиц."""
+    return [
+        sa.Column('id', sa.Integer(), nullable=False,
+                  server_default=sa.text("nextval('somemodel_id_seq')")),
+        *leading,
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=254), nullable=False),
+        sa.Column('attributes', postgresql.JSONB(astext_type=sa.Text()),
+                  server_default=sa.text("'{}'"), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.Column('version', sa.Integer(), server_default=sa.text('1'),
+                  nullable=False),
+    ]
+
+
+def detach_objects() -> None:
+    """
+    Переименовывает somemodel, освобождая имена её индексов, ограничений
+    и последовательность id для новой таблицы.
+    """
+    op.execute('ALTER SEQUENCE somemodel_id_seq OWNED BY NONE')
+    op.execute('DROP TRIGGER somemodel_bump_table_version ON somemodel')
+    op.execute('ALTER TABLE somemodel RENAME TO somemodel_old')
+    for constraint in ('somemodel_pkey', 'somemodel_owner_id_fkey',
+                       'somemodel_owner_fkey'):
+        op.execute(f'ALTER TABLE somemodel_old '
+                   f'DROP CONSTRAINT IF EXISTS {constraint}')
+    for index in ('ix_somemodel_id_version', 'ix_somemodel_tenant_id_id',
+                  'ix_somemodel_owner_id_id', 'ix_somemodel_created_at_id',
+                  'ix_somemodel_tenant_created_at_id',
+                  'ix_somemodel_updated_at_id',
+                  'ix_somemodel_tenant_updated_at_id',
+                  'ix_somemodel_name_id', 'ix_somemodel_tenant_name_id',
+                  'ix_somemodel_attributes'):
+        op.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+def attach_objects() -> None:
+    """Передаёт последовательность новой таблице и удаляет старую."""
+    op.execute('ALTER SEQUENCE somemodel_id_seq OWNED BY somemodel.id')
+    op.drop_table('somemodel_old')
+    op.execute(BUMP_OBJECTS_VERSION_TRIGGER)
+    op.create_index('ix_somemodel_owner_id_id', 'somemodel',
+                    ['owner_id', 'id'], unique=False)
+    op.create_index('ix_somemodel_attributes', 'somemodel', ['attributes'],
+                    unique=False, postgresql_using='gin',
+                    postgresql_ops={'attributes': 'jsonb_path_ops'})
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'tenant',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=254), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True),
+                  server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.execute(f"INSERT INTO tenant (id, name) "
+               f"VALUES ({DEFAULT_TENANT_ID}, 'default')")
+    op.execute("SELECT setval(pg_get_serial_sequence('tenant', 'id'), "
+               "(SELECT max(id) FROM tenant))")
+
+    # Колонка с постоянным значением по умолчанию добавляется без
+    # перезаписи таблицы.
+    op.add_column('user', sa.Column(
+        'tenant_id', sa.Integer(),
+        server_default=sa.text(str(DEFAULT_TENANT_ID)), nullable=False
+    ))
+    op.create_foreign_key('user_tenant_id_fkey', 'user', 'tenant',
+                          ['tenant_id'], ['id'])
+    op.create_unique_constraint('uq_user_tenant_id_id', 'user',
+                                ['tenant_id', 'id'])
+    op.drop_index('ix_user_active_id', table_name='user',
+                  postgresql_where=sa.text('is_active'))
+    op.create_index('ix_user_tenant_active_id', 'user', ['tenant_id', 'id'],
+                    unique=False, postgresql_where=sa.text('is_active'))
+
+    # Секционированную таблицу нельзя получить из обычной через ALTER:
+    # строки переносятся в новую таблицу, арендатор объекта - арендатор
+    # его владельца.
+    detach_objects()
+    op.create_table(
+        'somemodel',
+        *object_columns(sa.Column(
+            'tenant_id', sa.Integer(),
+            server_default=sa.text(str(DEFAULT_TENANT_ID)), nullable=False
+        )),
+        sa.PrimaryKeyConstraint('id', 'tenant_id'),
+        postgresql_partition_by='HASH (tenant_id)'
+    )
+    for remainder in range(TENANT_PARTITIONS):
+        op.execute(f'CREATE TABLE somemodel_p{remainder} '
+                   f'PARTITION OF somemodel FOR VALUES WITH '
+                   f'(MODULUS {TENANT_PARTITIONS}, REMAINDER {remainder})')
+    op.execute(
+        f'INSERT INTO somemodel (tenant_id, {OBJECT_COLUMNS}) '
+        f'SELECT u.tenant_id, '
+        f'{", ".join(f"o.{name}" for name in OBJECT_COLUMN_NAMES)} '
+        f'FROM somemodel_old o JOIN "user" u ON u.id = o.owner_id'
+    )
+    attach_objects()
+    op.create_foreign_key('somemodel_owner_fkey', 'somemodel', 'user',
+                          ['tenant_id', 'owner_id'], ['tenant_id', 'id'],
+                          ondelete='CASCADE')
+    op.create_index('ix_somemodel_tenant_id_id', 'somemodel',
+                    ['tenant_id', 'id'], unique=False,
+                    postgresql_include=['version', 'updated_at'])
+    op.create_index('ix_somemodel_tenant_created_at_id', 'somemodel',
+                    ['tenant_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_tenant_updated_at_id', 'somemodel',
+                    ['tenant_id', 'updated_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_tenant_name_id', 'somemodel',
+                    ['tenant_id', 'name', 'id'], unique=False)
+
+    op.add_column('audit_event', sa.Column('tenant_id', sa.Integer(),
+                                           nullable=True))
+    op.create_index('ix_audit_event_tenant_created_at', 'audit_event',
+                    ['tenant_id', 'created_at', 'id'], unique=False)
+    op.add_column('user_archive', sa.Column('tenant_id', sa.Integer(),
+                                            nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('user_archive', 'tenant_id')
+    op.drop_index('ix_audit_event_tenant_created_at',
+                  table_name='audit_event')
+    op.drop_column('audit_event', 'tenant_id')
+
+    detach_objects()
+    op.create_table(
+        'somemodel',
+        *object_columns(),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.execute(f'INSERT INTO somemodel ({OBJECT_COLUMNS}) '
+               f'SELECT {OBJECT_COLUMNS} FROM somemodel_old')
+    attach_objects()
+    op.create_foreign_key('somemodel_owner_id_fkey', 'somemodel', 'user',
+                          ['owner_id'], ['id'], ondelete='CASCADE')
+    op.create_index('ix_somemodel_id_version', 'somemodel', ['id'],
+                    unique=False,
+                    postgresql_include=['version', 'updated_at'])
+    op.create_index('ix_somemodel_created_at_id', 'somemodel',
+                    ['created_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_updated_at_id', 'somemodel',
+                    ['updated_at', 'id'], unique=False)
+    op.create_index('ix_somemodel_name_id', 'somemodel',
+                    ['name', 'id'], unique=False)
+
+    op.drop_index('ix_user_tenant_active_id', table_name='user',
+                  postgresql_where=sa.text('is_active'))
+    op.create_index('ix_user_active_id', 'user', ['id'], unique=False,
+                    postgresql_where=sa.text('is_active'))
+    op.drop_constraint('uq_user_tenant_id_id', 'user', type_='unique')
+    op.drop_constraint('user_tenant_id_fkey', 'user', type_='foreignkey')
+    op.drop_column('user', 'tenant_id')
+    op.drop_table('tenant')
@@ -1,2 +1,5 @@
+from .audit import router as audit_router  # noqa
 from .object import router as object_router  # noqa
+from .service import metrics_router  # noqa
+from .service import router as service_router  # noqa
 from .user import router as user_router  # noqa
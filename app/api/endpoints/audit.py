@@ -0,0 +1,74 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.crud import audit_crud
+from app.core.db import get_async_session
+from app.core.models import AuditEvent
+from app.core.pagination import (NDJSON_MEDIA_TYPE, PageParams, page_params,
+                                 page_response, stream_ndjson)
+from app.core.projection import Projection
+from app.core.user import current_superuser
+from app.schemas.audit import AuditEventRead
+
+router = APIRouter(tags=['audit'], dependencies=[Depends(current_superuser)])
+
+AUDIT_PROJECTION = Projection(AuditEvent, AuditEventRead)
+
+
+def audit_filters(
+    actor_id: Optional[int] = None,
+    entity: Optional[str] = None,
+    entity_id: Optional[int] = None,
+    action: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> list:
+    """
+    Условия выборки событий. Границы по created_at отсекают лишние секции,
+    actor_id и entity с entity_id покрыты индексами.
+    """
+    criteria = []
+    if actor_id is not None:
+        criteria.append(AuditEvent.actor_id == actor_id)
+    if entity is not None:
+        criteria.append(AuditEvent.entity == entity)
+    if entity_id is not None:
+        criteria.append(AuditEvent.entity_id == entity_id)
+    if action is not None:
+        criteria.append(AuditEvent.action == action)
+    if created_from is not None:
+        criteria.append(AuditEvent.created_at >= created_from)
+    if created_to is not None:
+        criteria.append(AuditEvent.created_at < created_to)
+    return criteria
+
+
+@router.get('/audit', response_model=List[AuditEventRead])
+async def get_audit_events(
+    request: Request,
+    page: PageParams = Depends(page_params(audit_crud, ('created_at',),
+                                           'created_at')),
+    criteria: list = Depends(audit_filters),
+    session: AsyncSession = Depends(get_async_session),
+) -> List[AuditEventRead]:
+    """
+    Журнал изменений по времени - постранично или потоком NDJSON;
+    order=desc начинает с последних событий.
+
+    События попадают в журнал пачками, с задержкой до AUDIT_FLUSH_INTERVAL.
+    """
+    if page.stream:
+        return StreamingResponse(
+            stream_ndjson(audit_crud, AUDIT_PROJECTION, page, *criteria,
+                          request=request),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    events = await audit_crud.get_rows(
+        session, AUDIT_PROJECTION, page.limit, page.after, *criteria,
+        sort=page.sort, descending=page.descending
+    )
+    return page_response(AUDIT_PROJECTION, events, page.limit, page.sort)
@@ -1,70 +1,209 @@
+import json
+from datetime import datetime
 from http import HTTPStatus
-from typing import Dict, List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.audit import audit_log
+from app.core.batch import BatchTooLarge, run_object_batch
+from app.core.bulk import iter_lines
+from app.core.conditional import (is_conditional, is_not_modified, make_etag,
+                                  not_modified, query_digest, set_validators)
 from app.core.crud import some_model_crud
 from app.core.db import get_async_session
+from app.core.models import SomeModel, User
+from app.core.pagination import (NDJSON_MEDIA_TYPE, PageParams, page_params,
+                                 page_response, stream_ndjson)
+from app.core.projection import Projection
+from app.core.responses import trusted_response
+from app.core.tenancy import current_tenant
 from app.core.user import current_superuser, current_user
-from app.schemas.object import ObjectCreate, ObjectRead, ObjectUpdate
+from app.schemas.object import (ObjectBatchReport, ObjectCreate, ObjectRead,
+                                ObjectUpdate)
 
 router = APIRouter(tags=['objects'])
 
+OBJECT_PROJECTION = Projection(SomeModel, ObjectRead)
+OBJECT_SORTABLE = ('id', 'created_at', 'updated_at', 'name')
 
-@router.get('/objects', response_model=List[ObjectRead])
+
+def object_filters(
+    owner_id: Optional[int] = None,
+    attributes: Optional[str] = Query(
+        None, description='JSON-объект: атрибуты должны его содержать'
+    ),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+) -> list:
+    """Условия выборки объектов; каждое покрыто своим индексом."""
+    criteria = []
+    if owner_id is not None:
+        criteria.append(SomeModel.owner_id == owner_id)
+    if attributes is not None:
+        try:
+            contained = json.loads(attributes)
+        except ValueError:
+            contained = None
+        if not isinstance(contained, dict):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail='attributes должен быть JSON-объектом'
+            )
+        criteria.append(SomeModel.attributes.contains(contained))
+    if created_from is not None:
+        criteria.append(SomeModel.created_at >= created_from)
+    if created_to is not None:
+        criteria.append(SomeModel.created_at < created_to)
+    return criteria
+
+
+def object_not_found(id: int) -> HTTPException:
+    return HTTPException(status_code=HTTPStatus.NOT_FOUND,
+                         detail=f'Объект с id={id} не найден!')
+
+
+@router.get('/objects', response_model=List[ObjectRead],
+            dependencies=[Depends(current_user)])
 async def get_objects_list(
+    request: Request,
+    page: PageParams = Depends(page_params(some_model_crud, OBJECT_SORTABLE)),
+    criteria: list = Depends(object_filters),
     session: AsyncSession = Depends(get_async_session),
 ) -> List[ObjectRead]:
-    """Возвращает список объектов."""
-    all_objects = await some_model_crud.get_multi(session)
-    if len(all_objects) == 0:
+    """
+    Возвращает список объектов с фильтрами по владельцу, атрибутам и дате
+    создания - постранично или потоком NDJSON.
+    """
+    if page.stream:
+        return StreamingResponse(
+            stream_ndjson(some_model_crud, OBJECT_PROJECTION, page,
+                          *criteria, request=request),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    version, last_modified = await some_model_crud.get_table_version(session)
+    etag = make_etag('somemodel', current_tenant.get(), version,
+                     query_digest(request))
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    all_objects = await some_model_crud.get_rows(
+        session, OBJECT_PROJECTION, page.limit, page.after, *criteria,
+        sort=page.sort, descending=page.descending
+    )
+    if len(all_objects) == 0 and page.after is None and not criteria:
         raise HTTPException(
             status_code=HTTPStatus.OK,
             detail='Список объектов пуст!'
         )
-    return all_objects
+    return set_validators(
+        page_response(OBJECT_PROJECTION, all_objects, page.limit, page.sort),
+        etag, last_modified
+    )
 
 
-@router.post('/objects', response_model=(Dict | ObjectRead),
-             dependencies=[Depends(current_user)],
+@router.post('/objects', response_model=ObjectRead,
              status_code=HTTPStatus.CREATED)
 async def create_new_object(
-    new_object: Dict | ObjectCreate,
+    new_object: ObjectCreate,
+    user: User = Depends(current_user),
     session: AsyncSession = Depends(get_async_session),
-) -> Dict:
-    """Создаёт новый объект."""
-    return {'message': 'Объект создан', 'Объект': new_object}
+) -> ObjectRead:
+    """Создаёт новый объект от имени текущего пользователя."""
+    db_object = await some_model_crud.create(
+        dict(new_object.model_dump(), owner_id=user.id), session
+    )
+    audit_log.record('object.create', SomeModel.__tablename__, db_object.id,
+                     actor_id=user.id)
+    return trusted_response(OBJECT_PROJECTION, db_object,
+                            HTTPStatus.CREATED)
 
 
-@router.get('/objects/{id}', response_model=(Dict | ObjectRead))
+@router.post('/objects:batch', response_model=ObjectBatchReport)
+async def batch_objects(
+    request: Request,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
+) -> ObjectBatchReport:
+    """
+    Выполняет пакет операций create/update/delete из тела в формате NDJSON
+    (по операции в строке) в одной транзакции.
+
+    Возвращает статус по каждой строке; изменять и удалять объекты может
+    только superuser.
+    """
+    try:
+        report = await run_object_batch(iter_lines(request.stream()), user,
+                                        session)
+    except BatchTooLarge as error:
+        raise HTTPException(status_code=HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                            detail=str(error))
+    for result in report.results:
+        if result['status'] < HTTPStatus.BAD_REQUEST:
+            audit_log.record(f'object.{result["op"]}',
+                             SomeModel.__tablename__, result['id'],
+                             actor_id=user.id)
+    return report
+
+
+@router.get('/objects/{id}', response_model=ObjectRead,
+            dependencies=[Depends(current_user)])
 async def get_object(
     id: int,
+    request: Request,
     session: AsyncSession = Depends(get_async_session),
-) -> (Dict | ObjectRead):
-    """Возвращает объект по id."""
-    return {'message': f'Объект {id} извлечён из БД.'}
+) -> ObjectRead:
+    """
+    Возвращает объект по id с ETag/Last-Modified.
+
+    Если копия клиента актуальна, отвечает 304 после чтения одной лишь
+    версии записи.
+    """
+    if is_conditional(request):
+        validators = await some_model_crud.get_validators(id, session)
+        if validators is None:
+            raise object_not_found(id)
+        etag = make_etag('somemodel', id, validators.version)
+        if is_not_modified(request, etag, validators.updated_at):
+            return not_modified(etag, validators.updated_at)
+    db_object = await some_model_crud.get(id, session)
+    if db_object is None:
+        raise object_not_found(id)
+    return set_validators(
+        trusted_response(OBJECT_PROJECTION, db_object),
+        make_etag('somemodel', id, db_object.version), db_object.updated_at
+    )
 
 
-@router.put('/objects/{id}',
-            dependencies=[Depends(current_superuser)],
-            response_model=(Dict | ObjectRead))
+@router.put('/objects/{id}', response_model=ObjectRead)
 async def update_object(
     id: int,
     data_to_update: ObjectUpdate,
+    admin: User = Depends(current_superuser),
     session: AsyncSession = Depends(get_async_session),
-) -> (Dict | ObjectRead):
+) -> ObjectRead:
     """Superuser обновляет ранее созданную запись об объекте."""
-    data_to_update = data_to_update.model_dump()
-    return {'message': f'Объект {id} обновлён в БД.'}
+    db_object = await some_model_crud.update_by_id(id, data_to_update,
+                                                   session)
+    if db_object is None:
+        db_object = await some_model_crud.get(id, session)
+    if db_object is None:
+        raise object_not_found(id)
+    audit_log.record('object.update', SomeModel.__tablename__, id,
+                     data_to_update.model_dump(exclude_unset=True),
+                     actor_id=admin.id)
+    return trusted_response(OBJECT_PROJECTION, db_object)
 
 
-@router.delete('/objects/{id}',
-               dependencies=[Depends(current_superuser)],
-               status_code=HTTPStatus.NO_CONTENT)
+@router.delete('/objects/{id}', status_code=HTTPStatus.NO_CONTENT)
 async def delete_object(
     id: int,
+    admin: User = Depends(current_superuser),
     session: AsyncSession = Depends(get_async_session),
 ) -> None:
     """Superuser удаляет ранее созданную запись об объекте."""
-    pass
+    if await some_model_crud.remove_by_id(id, session) is None:
+        raise object_not_found(id)
+    audit_log.record('object.delete', SomeModel.__tablename__, id,
+                     actor_id=admin.id)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Response
+
+from app.core.audit import audit_log
+from app.core.bus import event_bus
+from app.core.db import pool_status
+from app.core.jobs import job_worker
+from app.core.metrics import PROMETHEUS_MEDIA_TYPE, registry
+from app.core.tenancy import tenant_limiter
+from app.core.user import current_superuser
+
+router = APIRouter(prefix='/service', tags=['service'],
+                   dependencies=[Depends(current_superuser)])
+# Prometheus опрашивает /metrics без токена: доступ к нему ограничивается
+# на уровне сети, как и для остальных служебных портов.
+metrics_router = APIRouter(tags=['service'])
+
+
+@router.get('/db-pool')
+async def get_db_pool_status():
+    """Состояние пула соединений: занятые, overflow, ожидание получения."""
+    return pool_status()
+
+
+@metrics_router.get('/metrics', include_in_schema=False)
+async def get_metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    gauges = {
+        f'db_pool_{name}': value for name, value in pool_status().items()
+        if isinstance(value, (int, float))
+    }
+    bus = event_bus.stats()
+    gauges.update(event_bus_connected=int(bus['connected']),
+                  event_bus_connections=bus['connections'],
+                  event_bus_received=bus['received'])
+    jobs = job_worker.stats()
+    gauges.update(job_workers=jobs['workers'],
+                  jobs_processed=jobs['processed'],
+                  jobs_failed=jobs['failed'])
+    gauges.update(audit_events_buffered=len(audit_log),
+                  tenant_requests_active=sum(tenant_limiter.active.values()))
+    return Response(registry.render(gauges), media_type=PROMETHEUS_MEDIA_TYPE)
@@ -1,17 +1,43 @@
 from http import HTTPStatus
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.archive import enqueue_archive
+from app.core.audit import audit_log
+from app.core.bulk import BulkFormat, export_users, import_users, iter_lines
+from app.core.conditional import (is_conditional, is_not_modified, make_etag,
+                                  not_modified, query_digest, set_validators)
+from app.core.config import settings
 from app.core.crud import user_crud
 from app.core.db import get_async_session
-from app.core.user import (auth_backend, current_superuser, current_user,
-                           fastapi_users)
+from app.core.jobs import enqueue
+from app.core.models import User
+from app.core.pagination import (NDJSON_MEDIA_TYPE, PageParams,
+                                 decode_cursor, page_params, page_response,
+                                 stream_ndjson)
+from app.core.projection import Projection
+from app.core.responses import trusted_response
+from app.core.revocation import revoke_user_tokens
+from app.core.search import search_bound, search_users
+from app.core.tenancy import current_tenant
+from app.core.user import (USER_DEACTIVATED, auth_backend,
+                           current_superuser, current_user, fastapi_users,
+                           user_cache)
 from app.schemas.user import UserCreate, UserRead, UserUpdate
 
 router = APIRouter()
 
+USER_PROJECTION = Projection(User, UserRead)
+
+
+def user_not_found(id: int) -> HTTPException:
+    return HTTPException(status_code=HTTPStatus.NOT_FOUND,
+                         detail=f'Пользователь с id={id} не найден!')
+
+
 router.include_router(
     fastapi_users.get_auth_router(auth_backend),
     prefix='/auth/jwt',
@@ -24,38 +50,176 @@ router.include_router(
 )
 
 
+def include_inactive_param(
+    include_inactive: bool = Query(
+        False, description='Показать и деактивированных (только superuser)'
+    ),
+    user: User = Depends(current_user),
+) -> bool:
+    if include_inactive and not user.is_superuser:
+        raise HTTPException(
+            status_code=HTTPStatus.FORBIDDEN,
+            detail='Деактивированных пользователей видит только superuser'
+        )
+    return include_inactive
+
+
 @router.get('/users', tags=['users'],
-            response_model=List[UserRead],
-            dependencies=[Depends(current_user)])
+            response_model=List[UserRead])
 async def get_users_list(
+    request: Request,
+    page: PageParams = Depends(page_params(user_crud)),
+    include_inactive: bool = Depends(include_inactive_param),
     session: AsyncSession = Depends(get_async_session),
 ) -> List[UserRead]:
-    """Возвращает список пользователей."""
-    all_users = await user_crud.get_multi(session)
-    if len(all_users) == 0:
+    """
+    Возвращает список активных пользователей постранично или потоком NDJSON.
+    """
+    if page.stream:
+        return StreamingResponse(
+            stream_ndjson(user_crud, USER_PROJECTION, page, request=request,
+                          include_inactive=include_inactive),
+            media_type=NDJSON_MEDIA_TYPE
+        )
+    version, last_modified = await user_crud.get_table_version(session)
+    etag = make_etag('user', current_tenant.get(), version,
+                     query_digest(request))
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    all_users = await user_crud.get_rows(
+        session, USER_PROJECTION, page.limit, page.after,
+        descending=page.descending, include_inactive=include_inactive
+    )
+    if len(all_users) == 0 and page.after is None:
         raise HTTPException(
             status_code=HTTPStatus.NOT_FOUND,
             detail='Список пользователей пуст!'
         )
-    return all_users
+    return set_validators(
+        page_response(USER_PROJECTION, all_users, page.limit),
+        etag, last_modified
+    )
 
 
-@router.delete(
-    '/users/{id}',
-    tags=['users'], dependencies=[Depends(current_superuser)]
-)
+@router.get('/users/search', tags=['users'],
+            response_model=List[UserRead],
+            dependencies=[Depends(current_superuser)])
+async def find_users(
+    q: str = Query(..., min_length=2, max_length=254,
+                   description='Часть ФИО или начало e-mail'),
+    limit: int = Query(settings.PAGE_LIMIT, ge=1,
+                       le=settings.PAGE_MAX_LIMIT),
+    after: Optional[str] = Query(None, description='Курсор из X-Next-Cursor'),
+    session: AsyncSession = Depends(get_async_session),
+) -> List[UserRead]:
+    """
+    Ищет пользователей по ФИО с учётом опечаток и по префиксу e-mail.
+
+    Лучшие совпадения идут первыми; следующая страница - по курсору.
+    """
+    try:
+        bound = search_bound(decode_cursor(after))
+    except ValueError as error:
+        raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                            detail=str(error))
+    found = await search_users(session, USER_PROJECTION, q, limit, bound)
+    return page_response(USER_PROJECTION, found, limit, sort='rank')
+
+
+@router.get('/users/cache-stats', tags=['users'],
+            dependencies=[Depends(current_superuser)])
+async def get_user_cache_stats():
+    """Счётчики попаданий и промахов кэша пользователей для аутентификации."""
+    return user_cache.stats()
+
+
+@router.get('/users/{id:int}', tags=['users'], response_model=UserRead,
+            dependencies=[Depends(current_superuser)])
+async def get_user(
+    id: int,
+    request: Request,
+    include_inactive: bool = Query(
+        False, description='Найти и деактивированного пользователя'
+    ),
+    session: AsyncSession = Depends(get_async_session),
+) -> UserRead:
+    """
+    Карточка пользователя с ETag/Last-Modified.
+
+    Перекрывает GET /users/{id} из fastapi-users, чтобы актуальная копия
+    клиента подтверждалась ответом 304 по одной лишь версии записи.
+    """
+    if is_conditional(request):
+        validators = await user_crud.get_validators(id, session,
+                                                    include_inactive)
+        if validators is None:
+            raise user_not_found(id)
+        etag = make_etag('user', id, validators.version)
+        if is_not_modified(request, etag, validators.updated_at):
+            return not_modified(etag, validators.updated_at)
+    user = await user_crud.get(id, session, include_inactive)
+    if user is None:
+        raise user_not_found(id)
+    return set_validators(trusted_response(USER_PROJECTION, user),
+                          make_etag('user', id, user.version),
+                          user.updated_at)
+
+
+@router.post('/users/import', tags=['users'],
+             dependencies=[Depends(current_superuser)])
+async def import_users_bulk(
+    request: Request,
+    format: BulkFormat = Query('ndjson'),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Массово создаёт пользователей из тела запроса в формате CSV или NDJSON.
+
+    Возвращает отчёт с числом созданных строк и ошибками по номерам строк.
+    """
+    return await import_users(iter_lines(request.stream()), format, session)
+
+
+@router.get('/users/export', tags=['users'],
+            dependencies=[Depends(current_superuser)])
+async def export_users_bulk(
+    format: BulkFormat = Query('ndjson'),
+):
+    """
+    Потоково выгружает всех пользователей в CSV или NDJSON.
+
+    Хэши паролей по HTTP не выгружаются: только командой
+    `python -m app.cli export-users --include-hashes`.
+    """
+    media_type = NDJSON_MEDIA_TYPE if format == 'ndjson' else 'text/csv'
+    return StreamingResponse(export_users(format),
+                             media_type=media_type)
+
+
+@router.delete('/users/{id}', tags=['users'])
 async def delete_user(
-    id: int, session: AsyncSession = Depends(get_async_session),
+    id: int,
+    admin: User = Depends(current_superuser),
+    session: AsyncSession = Depends(get_async_session),
 ):
-    """Don't delete users - just deactivate."""
-    user_to_deactivate = await user_crud.get(id, session)
-    if not user_to_deactivate:
-        raise HTTPException(
-            status_code=HTTPStatus.NOT_FOUND,
-            detail=f'Пользователь с id={id} не найден!'
-        )
-    if user_to_deactivate.is_active:
-        await user_crud.update(user_to_deactivate, UserUpdate(is_active=False), session)
+    """
+    Don't delete users - just deactivate.
+
+    Деактивация, задачи и отзыв токенов фиксируются одной транзакцией.
+    """
+    deactivated_id = await user_crud.deactivate(id, session)
+    if deactivated_id is None and await user_crud.get(
+        id, session, include_inactive=True
+    ) is None:
+        raise user_not_found(id)
+    if deactivated_id is not None:
+        await enqueue(session, USER_DEACTIVATED, dict(id=id))
+        await enqueue_archive(session, id)
+    await revoke_user_tokens(id, session)
+    user_cache.invalidate(id)
+    if deactivated_id is not None:
+        audit_log.record('user.deactivate', User.__tablename__, id,
+                         actor_id=admin.id)
     return {'message': f'Пользователь с id={id} деактивирован'}
 
 
@@ -1,7 +1,11 @@
 from fastapi import APIRouter
 
-from app.api.endpoints import object_router, user_router
+from app.api.endpoints import (audit_router, metrics_router, object_router,
+                               service_router, user_router)
 
 main_router = APIRouter()
 main_router.include_router(user_router)
 main_router.include_router(object_router)
+main_router.include_router(audit_router)
+main_router.include_router(service_router)
+main_router.include_router(metrics_router)
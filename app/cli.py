@@ -0,0 +1,161 @@
+"""
+Служебные команды сервиса.
+
+    python -m app.cli bootstrap
+    python -m app.cli import-users users.csv --format csv --tenant 2
+    python -m app.cli export-users users.ndjson --include-hashes
+    python -m app.cli create-tenant acme
+    python -m app.cli worker --concurrency 4
+    python -m app.cli archive-users
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import sys
+import time
+from typing import Optional
+
+from app.core.bulk import aiter_sync, export_users, import_users
+from app.core.db import dispose_engine, get_session_factory
+from app.core.init_db import StartupTimings, bootstrap
+from app.core.tenancy import current_tenant
+
+
+async def run_bootstrap() -> None:
+    timings = StartupTimings()
+    try:
+        done = await bootstrap(timings)
+    finally:
+        await dispose_engine()
+    print('Окружение подготовлено' if done
+          else 'Окружение уже подготовлено другим процессом')
+    print(timings.report(), file=sys.stderr)
+
+
+async def run_import(path: str, fmt: str) -> None:
+    start = time.perf_counter()
+    try:
+        with open(path, encoding='utf-8-sig') as source:
+            async with get_session_factory()() as session:
+                report = await import_users(aiter_sync(source), fmt,
+                                            session)
+    finally:
+        await dispose_engine()
+    print(json.dumps(dataclasses.asdict(report), ensure_ascii=False,
+                     indent=2))
+    print(f'Импорт занял {time.perf_counter() - start:.1f} с',
+          file=sys.stderr)
+
+
+async def run_export(path: str, fmt: str, include_hashes: bool) -> None:
+    try:
+        with (open(path, 'wb') if path != '-'
+              else sys.stdout.buffer) as target:
+            async for chunk in export_users(fmt, include_hashes):
+                target.write(chunk)
+    finally:
+        await dispose_engine()
+
+
+async def run_create_tenant(name: str) -> None:
+    from sqlalchemy import insert
+
+    from app.core.models import Tenant
+
+    async with get_session_factory()() as session:
+        tenant_id = await session.scalar(
+            insert(Tenant).values(name=name).returning(Tenant.id)
+        )
+        await session.commit()
+    await dispose_engine()
+    print(tenant_id)
+
+
+def set_tenant(tenant_id: Optional[int]) -> None:
+    """Ограничивает импорт и экспорт арендатором; без него - все данные."""
+    if tenant_id is not None:
+        current_tenant.set(tenant_id)
+
+
+async def run_worker(concurrency: int) -> None:
+    # Обработчики задач регистрируются при импорте своих модулей.
+    import app.core.user  # noqa: F401
+    from app.core.audit import audit_log
+    from app.core.bus import event_bus
+    from app.core.jobs import job_worker
+
+    event_bus.start()
+    job_worker.start(concurrency)
+    audit_log.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await job_worker.stop()
+        await event_bus.stop()
+        await audit_log.stop()
+        await dispose_engine()
+
+
+async def run_archive() -> None:
+    from app.core.archive import archive_all
+    from app.core.audit import audit_log
+
+    async with get_session_factory()() as session:
+        total = await archive_all(session)
+    await audit_log.stop()
+    await dispose_engine()
+    print(f'Перенесено в архив пользователей: {total}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('bootstrap',
+                        help='создать БД, применить миграции, '
+                             'создать первого суперпользователя')
+    import_parser = commands.add_parser('import-users')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--format', choices=('csv', 'ndjson'),
+                               default='ndjson')
+    import_parser.add_argument('--tenant', type=int,
+                               help='арендатор новых пользователей')
+    export_parser = commands.add_parser('export-users')
+    export_parser.add_argument('path', help="файл или '-' для stdout")
+    export_parser.add_argument('--format', choices=('csv', 'ndjson'),
+                               default='ndjson')
+    export_parser.add_argument('--include-hashes', action='store_true')
+    export_parser.add_argument('--tenant', type=int,
+                               help='выгрузить только этого арендатора')
+    tenant_parser = commands.add_parser('create-tenant',
+                                        help='создать арендатора и '
+                                             'напечатать его id')
+    tenant_parser.add_argument('name')
+    worker_parser = commands.add_parser('worker',
+                                        help='обрабатывать фоновые задачи')
+    worker_parser.add_argument('--concurrency', type=int, default=4)
+    commands.add_parser('archive-users',
+                        help='перенести давно деактивированных '
+                             'пользователей в архив')
+    args = parser.parse_args()
+    if args.command == 'bootstrap':
+        asyncio.run(run_bootstrap())
+    elif args.command == 'import-users':
+        set_tenant(args.tenant)
+        asyncio.run(run_import(args.path, args.format))
+    elif args.command == 'export-users':
+        set_tenant(args.tenant)
+        asyncio.run(run_export(args.path, args.format, args.include_hashes))
+    elif args.command == 'create-tenant':
+        asyncio.run(run_create_tenant(args.name))
+    elif args.command == 'archive-users':
+        asyncio.run(run_archive())
+    elif args.command == 'worker':
+        try:
+            asyncio.run(run_worker(args.concurrency))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
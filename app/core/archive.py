@@ -0,0 +1,102 @@
+"""
+Перенос давно деактивированных пользователей в user_archive.
+
+Деактивированные строки остаются в user ради уникальности e-mail и истории,
+но раздувают таблицу и её полные индексы. Через USER_ARCHIVE_AFTER_DAYS
+после деактивации (по updated_at) пользователь переносится одним
+выражением WITH moved AS (DELETE ... RETURNING) INSERT INTO user_archive.
+Пользователи, у которых остались объекты, не переносятся: удаление из
+user каскадом удалило бы и объекты.
+
+Деактивация ставит отложенную задачу USER_ARCHIVE на каждого пользователя;
+деактивированных раньше переносит `python -m app.cli archive-users`.
+"""
+from datetime import timedelta
+from typing import List, Optional, Sequence
+
+from sqlalchemy import exists, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.audit import audit_log
+from app.core.bus import publish_changes
+from app.core.config import settings
+from app.core.db import get_session_factory
+from app.core.jobs import enqueue, job_handler
+from app.core.models import SomeModel, User, UserArchive
+
+USER_ARCHIVE = 'user.archive'
+ARCHIVED_COLUMNS = ('id', 'tenant_id', 'email', 'hashed_password',
+                    'firstname', 'surname', 'patronymic', 'is_superuser',
+                    'is_verified')
+
+
+async def enqueue_archive(session: AsyncSession, user_id: int) -> None:
+    """Откладывает перенос пользователя на USER_ARCHIVE_AFTER_DAYS."""
+    if settings.USER_ARCHIVE_AFTER_DAYS:
+        await enqueue(session, USER_ARCHIVE, dict(id=user_id),
+                      delay=settings.USER_ARCHIVE_AFTER_DAYS * 86400)
+
+
+async def archive_users(
+        session: AsyncSession,
+        user_ids: Optional[Sequence[int]] = None,
+        limit: Optional[int] = None
+) -> List[int]:
+    """
+    Переносит до limit подходящих пользователей (из user_ids, если задан)
+    и возвращает их id. Пользователь, которого снова активировали или
+    изменили позже срока, не подходит.
+    """
+    criteria = [
+        User.is_active.is_(False),
+        User.updated_at < func.now() - timedelta(
+            days=settings.USER_ARCHIVE_AFTER_DAYS
+        ),
+        # Условие на арендатора оставляет проверке одну секцию somemodel.
+        ~exists().where(SomeModel.tenant_id == User.tenant_id,
+                        SomeModel.owner_id == User.id),
+    ]
+    if user_ids is not None:
+        criteria.append(User.id.in_(user_ids))
+    candidates = (
+        select(User.id).where(*criteria)
+        .limit(limit or settings.USER_ARCHIVE_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    table = User.__table__
+    moved = (
+        table.delete().where(table.c.id.in_(candidates.scalar_subquery()))
+        .returning(*(table.c[name] for name in ARCHIVED_COLUMNS),
+                   table.c.updated_at)
+        .cte('moved')
+    )
+    archived = list(await session.scalars(
+        insert(UserArchive).from_select(
+            [*ARCHIVED_COLUMNS, 'deactivated_at'],
+            select(*(moved.c[name] for name in ARCHIVED_COLUMNS),
+                   moved.c.updated_at)
+        ).add_cte(moved).returning(UserArchive.id)
+    ))
+    await publish_changes(session, User.__tablename__,
+                          [(user_id, None) for user_id in archived])
+    await session.commit()
+    for user_id in archived:
+        audit_log.record('user.archive', User.__tablename__, user_id)
+    return archived
+
+
+async def archive_all(session: AsyncSession) -> int:
+    """Переносит всех подходящих пользователей пачками; возвращает их число."""
+    total = 0
+    while True:
+        archived = await archive_users(session)
+        total += len(archived)
+        if len(archived) < settings.USER_ARCHIVE_BATCH_SIZE:
+            return total
+
+
+@job_handler(USER_ARCHIVE)
+async def archive_deactivated_users(payloads: List[dict]) -> None:
+    async with get_session_factory()() as session:
+        await archive_users(session, [payload['id'] for payload in payloads],
+                            limit=len(payloads))
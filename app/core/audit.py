@@ -0,0 +1,227 @@
+"""
+Журнал аудита: кто и что изменил.
+
+Запись не ждёт БД: record только добавляет событие в буфер процесса.
+Фоновая задача сбрасывает буфер одним многострочным INSERT, когда в нём
+набралось AUDIT_BATCH_SIZE событий или прошло AUDIT_FLUSH_INTERVAL секунд.
+При штатной остановке (lifespan) остаток буфера записывается до закрытия
+пула. Если БД недоступна, события возвращаются в буфер до следующей
+попытки; сверх AUDIT_BUFFER_LIMIT самые старые отбрасываются и
+учитываются в audit_events_total{result="dropped"}. Пачку, которую БД
+отвергла из-за данных, запись делит пополам, пока не найдёт виновные
+события: они пишутся в лог и учитываются в result="rejected", а не
+блокируют журнал повторами.
+
+Таблица audit_event секционирована по месяцам created_at. Секция месяца
+создаётся перед первой записью в неё, поэтому старые события удаляются
+DROP TABLE секции, без DELETE и VACUUM.
+"""
+import asyncio
+import logging
+from contextvars import ContextVar
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import insert, text
+from sqlalchemy.exc import (DBAPIError, InterfaceError, OperationalError,
+                            TimeoutError as PoolTimeoutError)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import get_session_factory
+from app.core.metrics import audit_events
+from app.core.models import AuditEvent
+from app.core.tenancy import current_tenant
+
+logger = logging.getLogger(__name__)
+
+# Ключ pg_advisory_xact_lock: секции создаёт один воркер за раз.
+AUDIT_PARTITION_LOCK_ID = 0x61756469745f7074
+
+# Пользователь, от имени которого выполняется запрос; его выставляет
+# JWT-стратегия при проверке токена.
+current_actor: ContextVar[Optional[int]] = ContextVar('current_actor',
+                                                      default=None)
+
+
+def is_transient(error: Exception) -> bool:
+    """Ошибка соединения или сервера, после которой запись стоит повторить."""
+    if isinstance(error, (OperationalError, InterfaceError, PoolTimeoutError,
+                          OSError, asyncio.TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def month_start(moment: datetime) -> date:
+    return date(moment.year, moment.month, 1)
+
+
+def next_month(month: date) -> date:
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f'{AuditEvent.__tablename__}_{month:%Y%m}'
+
+
+async def ensure_partition(session: AsyncSession, month: date) -> None:
+    """Создаёт секцию audit_event за месяц, если её ещё нет."""
+    await session.execute(text('SELECT pg_advisory_xact_lock(:key)'),
+                          dict(key=AUDIT_PARTITION_LOCK_ID))
+    await session.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(month)}" '
+        f'PARTITION OF {AuditEvent.__tablename__} '
+        f"FOR VALUES FROM ('{month}') TO ('{next_month(month)}')"
+    ))
+
+
+class AuditLog:
+    """Буфер событий аудита одного процесса и его фоновая запись."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self.buffer: List[Dict[str, Any]] = []
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+        self._partitions: Set[date] = set()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.buffer)
+
+    def _session(self) -> AsyncSession:
+        return (self.session_factory or get_session_factory())()
+
+    def record(self, action: str, entity: str,
+               entity_id: Optional[int] = None,
+               changes: Optional[Dict[str, Any]] = None,
+               actor_id: Optional[int] = None) -> None:
+        """
+        Добавляет событие в буфер; без actor_id берётся current_actor,
+        арендатор - из current_tenant.
+        """
+        self.buffer.append(dict(
+            created_at=datetime.now(timezone.utc),
+            actor_id=actor_id if actor_id is not None else current_actor.get(),
+            tenant_id=current_tenant.get(),
+            action=action, entity=entity, entity_id=entity_id,
+            changes=changes or {},
+        ))
+        audit_events.inc(result='recorded')
+        self._trim()
+        if len(self.buffer) >= settings.AUDIT_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _trim(self) -> None:
+        excess = len(self.buffer) - settings.AUDIT_BUFFER_LIMIT
+        if excess > 0:
+            del self.buffer[:excess]
+            self.dropped += excess
+            audit_events.inc(excess, result='dropped')
+
+    async def flush(self) -> int:
+        """Записывает накопленные события; возвращает число записанных."""
+        async with self._lock:
+            events, self.buffer = self.buffer, []
+            if not events:
+                return 0
+            # Стек частей пачки: вершина пишется первой.
+            pending = [events]
+            written = 0
+            try:
+                while pending:
+                    chunk = pending[-1]
+                    try:
+                        await self._insert(chunk)
+                    except Exception as error:
+                        if is_transient(error):
+                            raise
+                        # Секцию могли удалить - при следующей попытке
+                        # она проверяется заново.
+                        self._partitions.clear()
+                        pending.pop()
+                        if len(chunk) == 1:
+                            self._reject(chunk[0], error)
+                        else:
+                            middle = len(chunk) // 2
+                            pending += [chunk[middle:], chunk[:middle]]
+                        continue
+                    pending.pop()
+                    written += len(chunk)
+            except BaseException:
+                # Незаписанные события возвращаются в начало буфера;
+                # пришедшие во время записи остаются после них.
+                self._partitions.clear()
+                self.buffer[:0] = [event for part in reversed(pending)
+                                   for event in part]
+                self._trim()
+                raise
+            finally:
+                if written:
+                    self.written += written
+                    audit_events.inc(written, result='written')
+            return written
+
+    async def _insert(self, events: List[Dict[str, Any]]) -> None:
+        """Пишет события одной транзакцией, создавая нужные секции."""
+        async with self._session() as session:
+            months = {month_start(event['created_at'])
+                      for event in events} - self._partitions
+            for month in sorted(months):
+                await ensure_partition(session, month)
+            for start in range(0, len(events), settings.AUDIT_BATCH_SIZE):
+                await session.execute(insert(AuditEvent).values(
+                    events[start:start + settings.AUDIT_BATCH_SIZE]
+                ))
+            await session.commit()
+        self._partitions |= months
+
+    def _reject(self, event: Dict[str, Any], error: Exception) -> None:
+        self.rejected += 1
+        audit_events.inc(result='rejected')
+        logger.error('БД отвергла событие аудита %s %s id=%s: %s',
+                     event['action'], event['entity'], event['entity_id'],
+                     error)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(),
+                                       settings.AUDIT_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Не удалось записать журнал аудита')
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Останавливает фоновую запись и сбрасывает остаток буфера."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception('При остановке не записано событий аудита: %d',
+                             len(self.buffer))
+
+    def stats(self) -> dict:
+        return dict(buffered=len(self.buffer), written=self.written,
+                    dropped=self.dropped, rejected=self.rejected)
+
+
+audit_log = AuditLog()
@@ -1,3 +1,5 @@
 """Импорты класса Base и всех моделей для Alembic."""
 from app.core.db import Base  # noqa
-from app.core.models import SomeModel, User  # noqa
+from app.core.models import (BootstrapMarker, RateLimitBucket,  # noqa
+                             RevokedToken, SomeModel, TableVersion, User,
+                             UserTokenCutoff)
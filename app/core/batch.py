@@ -0,0 +1,158 @@
+"""
+Пакетные операции над объектами (POST /objects:batch).
+
+Тело запроса - NDJSON, по операции в строке. Строки разбираются по мере
+чтения и копятся в пачки по OBJECTS_BATCH_CHUNK_SIZE. Каждая пачка - не
+больше трёх выражений: INSERT, UPDATE ... FROM (VALUES ...) и DELETE.
+Все пачки идут в одной транзакции, которая фиксируется после последней
+строки.
+"""
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from pydantic import TypeAdapter
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bulk import describe_error, parse_rows
+from app.core.config import settings
+from app.core.crud import some_model_crud
+from app.core.models import User
+from app.schemas.object import ObjectBatchOperation
+
+OPERATION = TypeAdapter(ObjectBatchOperation)
+
+
+class BatchTooLarge(ValueError):
+    """В пакете больше OBJECTS_BATCH_MAX_ITEMS операций."""
+
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    results: List[Dict] = field(default_factory=list)
+
+    def add(self, row: int, op: Optional[str], status: int,
+            **extra) -> None:
+        if status < HTTPStatus.BAD_REQUEST:
+            self.succeeded += 1
+        else:
+            self.failed += 1
+        self.results.append(dict(row=row, op=op, status=status, **extra))
+
+
+@dataclass
+class Chunk:
+    """Операции одной пачки; каждый id встречается в ней не больше раза."""
+    creates: List[Tuple[int, object]] = field(default_factory=list)
+    updates: List[Tuple[int, object]] = field(default_factory=list)
+    deletes: List[Tuple[int, object]] = field(default_factory=list)
+    ids: Set[int] = field(default_factory=set)
+
+    def __len__(self) -> int:
+        return len(self.creates) + len(self.updates) + len(self.deletes)
+
+    def touches(self, operation) -> bool:
+        # Повторная операция над тем же id ждёт следующей пачки: внутри
+        # пачки порядок выражений (INSERT, UPDATE, DELETE) не совпадает
+        # с порядком строк.
+        return getattr(operation, 'id', None) in self.ids
+
+    def add(self, row: int, operation) -> None:
+        if operation.op == 'create':
+            self.creates.append((row, operation))
+            return
+        self.ids.add(operation.id)
+        target = self.updates if operation.op == 'update' else self.deletes
+        target.append((row, operation))
+
+    async def execute(self, session: AsyncSession, owner_id: int,
+                      report: BatchReport) -> None:
+        created = await some_model_crud.create_many(
+            [dict(operation.model_dump(exclude={'op'}), owner_id=owner_id)
+             for _, operation in self.creates], session
+        )
+        for (row, _), (obj_id, version) in zip(self.creates, created):
+            report.add(row, 'create', HTTPStatus.CREATED, id=obj_id,
+                       version=version)
+        updated = await some_model_crud.update_many(
+            [(operation.id, operation.model_dump(exclude={'op', 'id'}))
+             for _, operation in self.updates], session
+        )
+        for row, operation in self.updates:
+            if operation.id in updated:
+                report.add(row, 'update', HTTPStatus.OK, id=operation.id,
+                           version=updated[operation.id])
+            else:
+                report.add(row, 'update', HTTPStatus.NOT_FOUND,
+                           id=operation.id, detail=not_found(operation.id))
+        deleted = await some_model_crud.remove_many(
+            [operation.id for _, operation in self.deletes], session
+        )
+        for row, operation in self.deletes:
+            if operation.id in deleted:
+                report.add(row, 'delete', HTTPStatus.NO_CONTENT,
+                           id=operation.id)
+            else:
+                report.add(row, 'delete', HTTPStatus.NOT_FOUND,
+                           id=operation.id, detail=not_found(operation.id))
+
+
+def not_found(obj_id: int) -> str:
+    return f'Объект с id={obj_id} не найден!'
+
+
+def operation_name(data) -> Optional[str]:
+    op = data.get('op') if isinstance(data, dict) else None
+    return op if isinstance(op, str) else None
+
+
+async def run_object_batch(
+        lines: AsyncIterator[str], user: User, session: AsyncSession
+) -> BatchReport:
+    """
+    Выполняет операции пакета и возвращает результат по каждой строке.
+
+    Ошибки отдельных строк (формат, права, отсутствующий объект) попадают
+    в отчёт и не мешают остальным. Превышение лимита операций или ошибка
+    БД откатывают весь пакет.
+    """
+    report = BatchReport()
+    chunk = Chunk()
+    try:
+        async for row, data in parse_rows(lines, 'ndjson'):
+            report.total += 1
+            if report.total > settings.OBJECTS_BATCH_MAX_ITEMS:
+                raise BatchTooLarge(
+                    f'В пакете больше '
+                    f'{settings.OBJECTS_BATCH_MAX_ITEMS} операций'
+                )
+            try:
+                if isinstance(data, str):
+                    raise ValueError(data)
+                operation = OPERATION.validate_python(data)
+            except ValueError as error:
+                report.add(row, operation_name(data),
+                           HTTPStatus.UNPROCESSABLE_ENTITY,
+                           detail=describe_error(error))
+                continue
+            if operation.op != 'create' and not user.is_superuser:
+                report.add(row, operation.op, HTTPStatus.FORBIDDEN,
+                           id=operation.id,
+                           detail='Изменять и удалять объекты может '
+                                  'только суперпользователь')
+                continue
+            full = len(chunk) >= settings.OBJECTS_BATCH_CHUNK_SIZE
+            if full or chunk.touches(operation):
+                await chunk.execute(session, user.id, report)
+                chunk = Chunk()
+            chunk.add(row, operation)
+        await chunk.execute(session, user.id, report)
+    except BaseException:
+        await session.rollback()
+        raise
+    await session.commit()
+    report.results.sort(key=lambda result: result['row'])
+    return report
@@ -0,0 +1,214 @@
+"""Массовый импорт и потоковый экспорт пользователей."""
+import asyncio
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, List, Literal, Optional
+
+from fastapi_users import InvalidPasswordException
+from pydantic import ValidationError
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.crud import user_crud
+from app.core.db import get_session_factory
+from app.core.hashing import HashingPool, bulk_hashing_pool, hash_passwords
+from app.core.models import User
+from app.core.projection import Projection
+from app.core.tenancy import current_tenant
+from app.core.user import check_password
+from app.schemas.user import UserExport, UserExportWithHash, UserImport
+
+BulkFormat = Literal['csv', 'ndjson']
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    created: int = 0
+    skipped: int = 0
+    errors: List[Dict] = field(default_factory=list)
+    errors_total: int = 0
+
+    def add_error(self, row: int, error: str) -> None:
+        self.errors_total += 1
+        if len(self.errors) < settings.BULK_IMPORT_MAX_ERRORS:
+            self.errors.append(dict(row=row, error=error))
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Режет поток байтов на строки, не собирая его целиком в памяти."""
+    tail = b''
+    async for chunk in chunks:
+        tail += chunk
+        *lines, tail = tail.split(b'\n')
+        for line in lines:
+            yield line.decode('utf-8-sig').rstrip('\r')
+    if tail:
+        yield tail.decode('utf-8-sig').rstrip('\r')
+
+
+async def aiter_sync(lines: Iterable[str]) -> AsyncIterator[str]:
+    for line in lines:
+        yield line.rstrip('\r\n')
+
+
+async def parse_rows(lines: AsyncIterator[str], fmt: BulkFormat):
+    """
+    Выдаёт пары (номер строки, словарь значений или текст ошибки).
+
+    Для CSV первая строка - заголовок; поля с переводом строки внутри
+    кавычек не поддерживаются.
+    """
+    header: Optional[List[str]] = None
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        if fmt == 'ndjson':
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as error:
+                yield number, f'Некорректный JSON: {error}'
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield number, {name: value for name, value in zip(header, values)
+                       if value != ''}
+
+
+def validate_row(data) -> UserImport:
+    if not isinstance(data, dict):
+        raise ValueError('Строка должна быть объектом')
+    user = UserImport.model_validate(data)
+    if user.password is not None:
+        check_password(user.password, user.email)
+    return user
+
+
+def describe_error(error: Exception) -> str:
+    if isinstance(error, ValidationError):
+        return '; '.join(
+            f'{".".join(map(str, item["loc"])) or "row"}: {item["msg"]}'
+            for item in error.errors()
+        )
+    if isinstance(error, InvalidPasswordException):
+        return str(error.reason)
+    return str(error)
+
+
+async def hash_batch(users: List[UserImport], pool: HashingPool) -> None:
+    """Хеширует открытые пароли пачки параллельно во всех воркерах пула."""
+    pending = [user for user in users if user.password is not None]
+    if not pending:
+        return
+    chunk = -(-len(pending) // pool.workers)
+    parts = [pending[start:start + chunk]
+             for start in range(0, len(pending), chunk)]
+    hashed = await asyncio.gather(*(
+        pool.run(hash_passwords, [user.password for user in part])
+        for part in parts
+    ))
+    for part, hashes in zip(parts, hashed):
+        for user, hashed_password in zip(part, hashes):
+            user.hashed_password = hashed_password
+
+
+async def insert_batch(
+        batch: List[tuple], session: AsyncSession, report: ImportReport,
+        pool: HashingPool
+) -> None:
+    # Уникальный индекс email учитывает регистр: пользователей, уже
+    # зарегистрированных с другим регистром, отсекает отдельная проверка.
+    email = func.lower(User.email)
+    existing = set(await session.scalars(select(email).where(
+        email.in_([user.email for _, user in batch])
+    )))
+    fresh = [user for _, user in batch if user.email not in existing]
+    created = set()
+    if fresh:
+        await hash_batch(fresh, pool)
+        values = [user.model_dump(exclude={'password'}) for user in fresh]
+        tenant_id = current_tenant.get()
+        if tenant_id is not None:
+            for row in values:
+                row['tenant_id'] = tenant_id
+        created = set(await session.scalars(
+            insert(User).values(values).on_conflict_do_nothing(
+                index_elements=[User.email]
+            ).returning(User.email)
+        ))
+    await session.commit()
+    for number, user in batch:
+        if user.email in created:
+            created.discard(user.email)
+            report.created += 1
+        else:
+            report.skipped += 1
+            report.add_error(number, f'Пользователь {user.email} '
+                                     f'уже существует')
+
+
+async def import_users(
+        lines: AsyncIterator[str], fmt: BulkFormat, session: AsyncSession,
+        pool: HashingPool = bulk_hashing_pool
+) -> ImportReport:
+    """
+    Загружает пользователей пачками INSERT ... ON CONFLICT (email) DO NOTHING.
+
+    Каждая пачка фиксируется отдельно, так что уже загруженные строки
+    не теряются при ошибке в следующих. Строки с готовым hashed_password
+    (например, из экспорта) не хешируются повторно.
+    """
+    report = ImportReport()
+    batch: List[tuple] = []
+    async for number, data in parse_rows(lines, fmt):
+        report.total += 1
+        try:
+            if isinstance(data, str):
+                raise ValueError(data)
+            batch.append((number, validate_row(data)))
+        except (ValueError, InvalidPasswordException) as error:
+            report.add_error(number, describe_error(error))
+            continue
+        if len(batch) >= settings.BULK_IMPORT_BATCH_SIZE:
+            await insert_batch(batch, session, report, pool)
+            batch = []
+    if batch:
+        await insert_batch(batch, session, report, pool)
+    return report
+
+
+async def export_users(
+        fmt: BulkFormat, include_hashes: bool = False
+) -> AsyncIterator[bytes]:
+    """
+    Потоково выгружает таблицу user через серверный курсор, вместе
+    с деактивированными пользователями.
+    """
+    projection = Projection(
+        User, UserExportWithHash if include_hashes else UserExport
+    )
+    async with get_session_factory()() as session:
+        if fmt == 'ndjson':
+            async for row in user_crud.stream_rows(
+                    session, projection, include_inactive=True):
+                yield projection.to_ndjson_line(row)
+            return
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(projection.fields)
+        async for row in user_crud.stream_rows(
+                session, projection, include_inactive=True):
+            writer.writerow(projection.dump(row).values())
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
@@ -0,0 +1,160 @@
+"""
+Шина событий между воркерами поверх LISTEN/NOTIFY PostgreSQL.
+
+Запись публикует событие через pg_notify в своей же транзакции, поэтому
+оно доходит до остальных воркеров только после COMMIT и не приходит при
+откате. Каждый воркер держит одно отдельное соединение с LISTEN на все
+каналы. Пока оно разорвано, события теряются. Поэтому после каждого
+подключения вызываются обработчики on_connect: кэши сбрасываются целиком,
+а денайлист токенов перечитывается из БД.
+"""
+import asyncio
+import inspect
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import ARRAY, Text, func, literal, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.db import READ_ONLY
+
+logger = logging.getLogger(__name__)
+
+CHANGES_CHANNEL = 'entity_change'
+
+Handler = Callable[[dict], Any]
+ConnectHandler = Callable[[Any], Any]
+
+
+async def publish(session: AsyncSession, channel: str, payload: dict) -> None:
+    """Ставит событие в очередь транзакции сессии; уйдёт при COMMIT."""
+    # NOTIFY нельзя выполнить на реплике.
+    await session.execute(select(
+        func.pg_notify(channel, json.dumps(payload))
+    ).execution_options(**{READ_ONLY: False}))
+
+
+async def publish_change(session: AsyncSession, table: str, obj_id: int,
+                         version: Optional[int] = None) -> None:
+    """Событие изменения строки: таблица, id и версия (если известна)."""
+    await publish(session, CHANGES_CHANNEL,
+                  dict(table=table, id=obj_id, version=version))
+
+
+async def publish_changes(
+        session: AsyncSession, table: str,
+        changes: Sequence[Tuple[int, Optional[int]]]
+) -> None:
+    """События изменения многих строк (id, версия) одним запросом."""
+    if not changes:
+        return
+    payloads = [json.dumps(dict(table=table, id=obj_id, version=version))
+                for obj_id, version in changes]
+    payload = func.unnest(literal(payloads, ARRAY(Text))).column_valued()
+    await session.execute(select(func.pg_notify(CHANGES_CHANNEL, payload)))
+
+
+class EventBus:
+    """Подписки воркера на каналы и соединение, которое их слушает."""
+
+    def __init__(self, reconnect_delay: float = 1.0):
+        self.reconnect_delay = reconnect_delay
+        self.handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self.connect_handlers: List[ConnectHandler] = []
+        self.connections = 0
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, channel: str, handler: Handler) -> None:
+        self.handlers[channel].append(handler)
+
+    def subscribe_changes(
+            self, table: str,
+            handler: Callable[[int, Optional[int]], Any]
+    ) -> None:
+        """Подписка на изменения строк одной таблицы: handler(id, version)."""
+        def on_change(payload: dict):
+            if payload.get('table') == table:
+                return handler(payload['id'], payload.get('version'))
+        self.subscribe(CHANGES_CHANNEL, on_change)
+
+    def on_connect(self, handler: ConnectHandler) -> None:
+        """handler(connection) вызывается после каждой подписки на каналы."""
+        self.connect_handlers.append(handler)
+
+    def stats(self) -> dict:
+        return dict(connected=self._task is not None and not self._task.done(),
+                    connections=self.connections, received=self.received)
+
+    async def dispatch(self, channel: str, payload: dict) -> None:
+        self.received += 1
+        for handler in self.handlers.get(channel, ()):
+            try:
+                result = handler(payload)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception:
+                logger.exception('Ошибка обработчика события %s: %s',
+                                 channel, payload)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, connection, pid, channel: str, payload: str) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning('Некорректное событие %s: %s', channel, payload)
+            return
+        asyncio.get_running_loop().create_task(self.dispatch(channel, data))
+
+    async def _run(self) -> None:
+        import asyncpg
+
+        dsn = make_url(settings.DATABASE_URL).set(
+            drivername='postgresql'
+        ).render_as_string(hide_password=False)
+        while True:
+            try:
+                connection = await asyncpg.connect(dsn)
+                try:
+                    await self._listen(connection)
+                finally:
+                    await connection.close()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Шина событий переподключается')
+                await asyncio.sleep(self.reconnect_delay)
+
+    async def _listen(self, connection) -> None:
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        # Сначала подписка, затем восстановление состояния: всё, что
+        # изменится после чтения снимка, придёт уведомлением.
+        for channel in list(self.handlers):
+            await connection.add_listener(channel, self._on_notify)
+        self.connections += 1
+        for handler in self.connect_handlers:
+            result = handler(connection)
+            if inspect.isawaitable(result):
+                await result
+        await closed.wait()
+        raise ConnectionError('Соединение шины событий закрыто')
+
+
+event_bus = EventBus()
@@ -0,0 +1,80 @@
+"""Условные GET-запросы: ETag, Last-Modified и ответ 304."""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import blake2b
+from http import HTTPStatus
+from typing import Optional
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из составных частей версии ресурса."""
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def query_digest(request: Request) -> str:
+    """Короткий отпечаток строки запроса: у каждой страницы списка свой."""
+    return blake2b(str(request.query_params).encode(),
+                   digest_size=8).hexdigest()
+
+
+def is_conditional(request: Request) -> bool:
+    """Прислал ли клиент валидаторы закэшированной копии."""
+    headers = request.headers
+    return 'if-none-match' in headers or 'if-modified-since' in headers
+
+
+def is_not_modified(
+        request: Request, etag: str,
+        last_modified: Optional[datetime] = None
+) -> bool:
+    """Проверяет If-None-Match, а при его отсутствии - If-Modified-Since."""
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        candidates = [tag.strip().removeprefix('W/')
+                      for tag in if_none_match.split(',')]
+        return '*' in candidates or etag in candidates
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        # Зона -0000 по RFC 5322 - это UTC без указания источника.
+        since = since.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+
+# Ответ зависит от пользователя и его арендатора: общие кэши не должны
+# отдавать его другим клиентам.
+CACHE_HEADERS = {'Vary': 'Authorization, X-Tenant-ID',
+                 'Cache-Control': 'private'}
+
+
+def validator_headers(
+        etag: str, last_modified: Optional[datetime] = None
+) -> dict:
+    headers = {'ETag': etag, **CACHE_HEADERS}
+    if last_modified is not None:
+        headers['Last-Modified'] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def not_modified(
+        etag: str, last_modified: Optional[datetime] = None
+) -> Response:
+    return Response(status_code=HTTPStatus.NOT_MODIFIED,
+                    headers=validator_headers(etag, last_modified))
+
+
+def set_validators(
+        response: Response, etag: str,
+        last_modified: Optional[datetime] = None
+) -> Response:
+    response.headers.update(validator_headers(etag, last_modified))
+    return response
@@ -1,34 +1,167 @@
 import os
-from typing import Optional
+from typing import Dict, List, Literal, Optional
 
-from dotenv import load_dotenv
-from pydantic import EmailStr, ConfigDict
+from pydantic import EmailStr, ConfigDict, model_validator
 from pydantic_settings import BaseSettings
 
-load_dotenv()
+# Профили развёртывания: значения подставляются только в те настройки
+# пула, которые не заданы явно через окружение или .env.
+DB_PROFILES = {
+    'default': {},
+    'small': dict(DB_POOL_SIZE=2, DB_MAX_OVERFLOW=2),
+    'high_load': dict(DB_POOL_SIZE=20, DB_MAX_OVERFLOW=20,
+                      DB_POOL_TIMEOUT=5, DB_POOL_PRE_PING=True,
+                      DB_POOL_RECYCLE=1800),
+    'pgbouncer': dict(DB_POOL_SIZE=10, DB_MAX_OVERFLOW=0,
+                      DB_POOL_PRE_PING=True, DB_PGBOUNCER=True),
+}
 
 
 class Settings(BaseSettings):
     APP_TITLE: str = 'Сервис для управления пользователями'
     APP_DESCRIPTION: str = 'Тестовое задание'
 
-    POSTGRES_USER: str = os.getenv("POSTGRES_USER", "postgres")
-    POSTGRES_PASSWORD: str = os.getenv("POSTGRES_PASSWORD", "postgres")
-    POSTGRES_SERVER: str = os.getenv("POSTGRES_SERVER", "localhost")
-    POSTGRES_PORT: str | int = os.getenv("POSTGRES_PORT", 5432)
-    POSTGRES_DB: str = os.getenv("POSTGRES_DB", "postgres")
-    DATABASE_URL: str = (f"postgresql+asyncpg://{POSTGRES_USER}:"
-                         f"{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:"
-                         f"{POSTGRES_PORT}/{POSTGRES_DB}")
+    # Значения читаются из окружения и .env самим BaseSettings.
+    POSTGRES_USER: str = "postgres"
+    POSTGRES_PASSWORD: str = "postgres"
+    POSTGRES_SERVER: str = "localhost"
+    POSTGRES_PORT: str | int = 5432
+    POSTGRES_DB: str = "postgres"
+    # По умолчанию собирается из POSTGRES_*.
+    DATABASE_URL: str = ''
     secret: str = 'SECRET'
     first_superuser_email: Optional[EmailStr] = None
     first_superuser_password: Optional[str] = None
 
+    PAGE_LIMIT: int = 100
+    PAGE_MAX_LIMIT: int = 1000
+    STREAM_BATCH_SIZE: int = 1000
+
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 60
+    AUTH_STATELESS: bool = False
+
+    PASSWORD_HASH_EXECUTOR: Literal['thread', 'process', 'inline'] = 'thread'
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+    ARGON2_TIME_COST: int = 3
+    ARGON2_MEMORY_COST: int = 65536
+    ARGON2_PARALLELISM: int = 4
+    BCRYPT_ROUNDS: int = 12
+
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+    BULK_IMPORT_MAX_ERRORS: int = 1000
+    BULK_HASH_EXECUTOR: Literal['thread', 'process', 'inline'] = 'process'
+    BULK_HASH_WORKERS: int = os.cpu_count() or 1
+
+    OBJECTS_BATCH_MAX_ITEMS: int = 10000
+    OBJECTS_BATCH_CHUNK_SIZE: int = 1000
+
+    DB_PROFILE: Literal['default', 'small', 'high_load',
+                        'pgbouncer'] = 'default'
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+    DB_PGBOUNCER: bool = False
+    # Реплики для чтения; веса по порядку URL, по умолчанию все равны 1.
+    # После записи клиент STICKY_SECONDS читает из основной БД.
+    DB_REPLICA_URLS: List[str] = []
+    DB_REPLICA_WEIGHTS: List[int] = []
+    DB_REPLICA_STICKY_SECONDS: float = 5
+    DB_REPLICA_CHECK_INTERVAL: float = 5
+    DB_REPLICA_CHECK_TIMEOUT: float = 2
+
+    # Фоновые задачи: JOB_WORKERS обработчиков в процессе приложения
+    # (0 - только отдельный `python -m app.cli worker`).
+    JOB_WORKERS: int = 2
+    JOB_BATCH_SIZE: int = 100
+    JOB_POLL_INTERVAL: float = 5
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BASE_SECONDS: float = 1
+    JOB_RETRY_MAX_SECONDS: float = 600
+    JOB_LOCK_TIMEOUT: float = 300
+
+    # Деактивированные пользователи без объектов через столько дней
+    # переносятся в user_archive (0 - не переносить).
+    USER_ARCHIVE_AFTER_DAYS: int = 90
+    USER_ARCHIVE_BATCH_SIZE: int = 1000
+
+    # Журнал аудита: запись пачкой по размеру или по времени; сверх
+    # AUDIT_BUFFER_LIMIT (БД недоступна) теряются самые старые события.
+    AUDIT_BATCH_SIZE: int = 500
+    AUDIT_FLUSH_INTERVAL: float = 1
+    AUDIT_BUFFER_LIMIT: int = 100000
+
+    # Арендаторы: одновременных запросов одного арендатора на воркер
+    # (0 - без ограничения), индивидуальные лимиты {id: число} и сколько
+    # секунд запрос ждёт свободного места до ответа 503. Заголовок
+    # X-Tenant-ID учитывается только за доверенным шлюзом.
+    TENANT_MAX_CONCURRENCY: int = 0
+    TENANT_CONCURRENCY: Dict[int, int] = {}
+    TENANT_QUEUE_TIMEOUT: float = 5
+    TENANT_TRUST_HEADER: bool = False
+
+    # auto - проверить отметку и при её отсутствии подготовить окружение;
+    # check - только проверить; skip - не обращаться к БД при старте.
+    STARTUP_BOOTSTRAP: Literal['auto', 'check', 'skip'] = 'auto'
+
+    # Лимиты для маршрутов RATE_LIMIT_ROUTES: по IP клиента, по e-mail
+    # из тела запроса с этого IP и по маршруту в целом. postgres - общие
+    # для всех воркеров корзины поверх локальных.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: Literal['memory', 'postgres'] = 'memory'
+    RATE_LIMIT_ROUTES: List[str] = ['/auth/jwt/login', '/auth/register']
+    RATE_LIMIT_IP_PER_MINUTE: float = 30
+    RATE_LIMIT_IP_BURST: int = 10
+    RATE_LIMIT_EMAIL_PER_MINUTE: float = 5
+    RATE_LIMIT_EMAIL_BURST: int = 5
+    RATE_LIMIT_ROUTE_PER_MINUTE: float = 3000
+    RATE_LIMIT_ROUTE_BURST: int = 100
+    RATE_LIMIT_TABLE_SIZE: int = 100000
+    RATE_LIMIT_TRUST_FORWARDED: bool = False
+
+    # 0 - выключено.
+    SLOW_QUERY_MS: int = 0
+    N_PLUS_ONE_THRESHOLD: int = 50
+
     model_config = ConfigDict(
         env_file = '.env',
         extra = 'allow'
     )
 
+    @model_validator(mode='after')
+    def apply_db_profile(self):
+        for name, value in DB_PROFILES[self.DB_PROFILE].items():
+            if name not in self.model_fields_set:
+                setattr(self, name, value)
+        return self
+
+    @model_validator(mode='after')
+    def check_replica_weights(self):
+        weights = self.DB_REPLICA_WEIGHTS
+        if weights and len(weights) != len(self.DB_REPLICA_URLS):
+            raise ValueError('DB_REPLICA_WEIGHTS: нужен вес для каждого '
+                             'из DB_REPLICA_URLS')
+        return self
+
+    @model_validator(mode='after')
+    def build_database_url(self):
+        if not self.DATABASE_URL:
+            self.DATABASE_URL = (
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:"
+                f"{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:"
+                f"{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        return self
+
+
+# Настройки читаются из окружения при импорте модуля; движок БД
+# при этом не создаётся (app.core.db.get_engine).
 settings = Settings()
 
+
 LIFETIME = 3600
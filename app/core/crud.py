@@ -1,42 +1,243 @@
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (JSON, Integer, delete, func, insert, select, tuple_,
+                        update, values)
+from sqlalchemy.sql import column as sql_column
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.models import SomeModel, User
+from app.core.bus import publish_change, publish_changes
+from app.core.config import settings
+from app.core.models import AuditEvent, SomeModel, TableVersion, User
+from app.core.projection import Projection
+from app.core.tenancy import current_tenant
 
 
 class CRUDBase:
+    """
+    Типовые операции над моделью.
+
+    Если задан active_column, записи удаляются мягко (deactivate), а чтение
+    по умолчанию видит только активные строки - те, что покрыты частичными
+    индексами WHERE <active_column>. include_inactive снимает фильтр.
+
+    Если задан tenant_column, все запросы ограничены арендатором
+    current_tenant, а новые записи получают его id. Без арендатора
+    (фоновые задачи, CLI) условие не добавляется.
+    """
 
-    def __init__(self, model):
+    def __init__(self, model, active_column: Optional[str] = None,
+                 tenant_column: Optional[str] = None):
         self.model = model
+        self.active_column = active_column
+        self.tenant_column = tenant_column
+
+    def _tenant(self) -> list:
+        """Условие на арендатора запроса; пусто, если он не задан."""
+        tenant_id = current_tenant.get()
+        if self.tenant_column is None or tenant_id is None:
+            return []
+        return [self.model.__table__.c[self.tenant_column] == tenant_id]
+
+    def _visible(self, include_inactive: bool = False) -> list:
+        """Условие на активные строки арендатора; пусто, если не нужно."""
+        if self.active_column is None or include_inactive:
+            return self._tenant()
+        # Сама колонка, а не сравнение с true: только такое условие
+        # планировщик сопоставляет с предикатом частичного индекса.
+        return [self.model.__table__.c[self.active_column], *self._tenant()]
 
     async def get(
             self,
             obj_in: int,
-            session: AsyncSession
+            session: AsyncSession,
+            include_inactive: bool = False
     ):
         db_obj = await session.execute(
-            select(self.model).where(self.model.id == obj_in)
+            select(self.model).where(self.model.id == obj_in,
+                                     *self._visible(include_inactive))
         )
         return db_obj.scalars().first()
 
-    async def get_multi(
+    async def get_validators(
+            self,
+            obj_id: int,
+            session: AsyncSession,
+            include_inactive: bool = False
+    ):
+        """
+        Версия и время изменения записи без чтения остальных колонок.
+
+        Покрывающий индекс (id) INCLUDE (version, updated_at) позволяет
+        ответить index-only сканированием.
+        """
+        db_row = await session.execute(
+            select(self.model.version, self.model.updated_at).where(
+                self.model.id == obj_id, *self._visible(include_inactive)
+            )
+        )
+        return db_row.first()
+
+    async def get_table_version(
             self,
             session: AsyncSession
     ):
-        db_objs = await session.execute(select(self.model))
+        """Версия таблицы целиком, которую увеличивает триггер на запись."""
+        db_row = await session.execute(
+            select(TableVersion.version, TableVersion.updated_at).where(
+                TableVersion.table_name == self.model.__tablename__
+            )
+        )
+        return db_row.first() or (0, None)
+
+    def _sort_keys(self, sort: str = 'id') -> list:
+        """Колонки ключа сортировки; id замыкает ключ для однозначности."""
+        table = self.model.__table__
+        if sort == 'id':
+            return [table.c.id]
+        return [table.c[sort], table.c.id]
+
+    def keyset_bound(
+            self,
+            after: Optional[Sequence],
+            sort: str = 'id'
+    ) -> Optional[list]:
+        """Приводит значения курсора к типам колонок ключа сортировки."""
+        if after is None:
+            return None
+        keys = self._sort_keys(sort)
+        if len(after) != len(keys):
+            raise ValueError('Курсор не соответствует сортировке')
+        bound = []
+        for column, value in zip(keys, after):
+            python_type = column.type.python_type
+            if python_type is datetime and isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            if not isinstance(value, python_type):
+                raise ValueError('Курсор не соответствует сортировке')
+            bound.append(value)
+        return bound
+
+    def _keyset_query(
+            self,
+            limit: Optional[int] = None,
+            after: Optional[Sequence] = None,
+            projection: Optional[Projection] = None,
+            criteria: Sequence = (),
+            sort: str = 'id',
+            descending: bool = False,
+            include_inactive: bool = False
+    ):
+        """
+        Запрос страницы, упорядоченной по `sort` и id, начиная после `after`.
+
+        Сравнение (sort, id) > (:sort, :id) использует составной индекс
+        по тем же колонкам и не зависит от глубины страницы.
+        """
+        columns = projection.columns if projection else (self.model,)
+        keys = self._sort_keys(sort)
+        query = select(*columns).where(
+            *criteria, *self._visible(include_inactive)
+        ).order_by(
+            *(key.desc() if descending else key for key in keys)
+        )
+        if after is not None:
+            if len(keys) == 1:
+                position, bound = keys[0], after[0]
+            else:
+                position, bound = tuple_(*keys), tuple_(*after)
+            query = query.where(
+                position < bound if descending else position > bound
+            )
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+    async def get_multi(
+            self,
+            session: AsyncSession,
+            limit: Optional[int] = None,
+            after: Optional[Sequence] = None,
+            include_inactive: bool = False
+    ):
+        db_objs = await session.execute(self._keyset_query(
+            limit, after, include_inactive=include_inactive
+        ))
         return [obj.dict() for obj in db_objs.scalars().all()]
 
+    async def get_rows(
+            self,
+            session: AsyncSession,
+            projection: Projection,
+            limit: Optional[int] = None,
+            after: Optional[Sequence] = None,
+            *criteria,
+            sort: str = 'id',
+            descending: bool = False,
+            include_inactive: bool = False
+    ):
+        """Страница записей в виде кортежей колонок проекции, без ORM."""
+        query = self._keyset_query(limit, after, projection, criteria,
+                                   sort, descending, include_inactive)
+        db_rows = await session.execute(query)
+        return db_rows.all()
+
+    async def stream_rows(
+            self,
+            session: AsyncSession,
+            projection: Projection,
+            after: Optional[Sequence] = None,
+            batch_size: Optional[int] = None,
+            *criteria,
+            sort: str = 'id',
+            descending: bool = False,
+            include_inactive: bool = False
+    ):
+        """Построчно выдаёт кортежи колонок проекции через серверный курсор."""
+        query = self._keyset_query(
+            None, after, projection, criteria, sort, descending,
+            include_inactive
+        ).execution_options(yield_per=batch_size or settings.STREAM_BATCH_SIZE)
+        db_rows = await session.stream(query)
+        async for row in db_rows:
+            yield row
+
+    def _values(self, obj_in, skip_none: bool = True) -> dict:
+        """Поля схемы (или словаря), которым соответствуют колонки модели."""
+        data = obj_in if isinstance(obj_in, dict) else obj_in.model_dump()
+        columns = self.model.__table__.columns
+        return {field: value for field, value in data.items()
+                if field in columns and not (skip_none and value is None)}
+
+    def _new_values(self, obj_in) -> dict:
+        """Значения новой записи вместе с арендатором запроса."""
+        values = self._values(obj_in, skip_none=False)
+        tenant_id = current_tenant.get()
+        if self.tenant_column is not None and tenant_id is not None:
+            values[self.tenant_column] = tenant_id
+        return values
+
+    async def _publish(self, session: AsyncSession, obj_id: int,
+                       db_obj=None) -> None:
+        """Событие для кэшей других воркеров - в транзакции записи."""
+        version = (getattr(db_obj, 'version', None)
+                   if isinstance(db_obj, self.model) else None)
+        await publish_change(session, self.model.__tablename__, obj_id,
+                             version)
+
     async def create(
             self,
             obj_in,
             session: AsyncSession,
     ):
-        obj_in_data = obj_in.dict()
-        db_obj = self.model(**obj_in_data)
-        session.add(db_obj)
+        """INSERT ... RETURNING: запись и её итоговые значения за один запрос."""
+        db_obj = await session.scalar(
+            insert(self.model).values(
+                **self._new_values(obj_in)
+            ).returning(self.model)
+        )
+        await self._publish(session, db_obj.id, db_obj)
         await session.commit()
-        await session.refresh(db_obj)
         return db_obj
 
     async def update(
@@ -45,25 +246,182 @@ class CRUDBase:
             obj_in,
             session: AsyncSession
     ):
-        obj_data = jsonable_encoder(db_obj)
-        update_data = obj_in.dict()
-        for field in obj_data:
-            if field in update_data and update_data[field] is not None:
-                setattr(db_obj, field, update_data[field])
-        session.add(db_obj)
+        updated = await self.update_by_id(db_obj.id, obj_in, session)
+        return updated if updated is not None else db_obj
+
+    async def update_by_id(
+            self,
+            obj_id: int,
+            obj_in,
+            session: AsyncSession,
+            *criteria,
+            returning=None
+    ):
+        """
+        UPDATE ... WHERE id = :id RETURNING без предварительной загрузки.
+
+        Дополнительные условия `criteria` сужают WHERE; `returning` задаёт
+        колонку, которую нужно вернуть вместо всей записи. Если ни одна
+        строка не подошла, возвращает None.
+        """
+        values = self._values(obj_in)
+        if not values:
+            return None
+        query = update(self.model).where(
+            self.model.id == obj_id, *criteria, *self._tenant()
+        ).values(**values).returning(
+            returning if returning is not None else self.model
+        )
+        db_obj = await session.scalar(query)
+        if db_obj is not None:
+            await self._publish(session, obj_id, db_obj)
         await session.commit()
-        await session.refresh(db_obj)
         return db_obj
 
+    async def deactivate(
+            self,
+            obj_id: int,
+            session: AsyncSession
+    ) -> Optional[int]:
+        """
+        Мягкое удаление: UPDATE ... SET <active_column> = false RETURNING id.
+
+        Возвращает id, если запись была активна; None - если её нет или она
+        уже деактивирована. Транзакцию не фиксирует: побочные записи
+        деактивации уходят тем же COMMIT и тем же соединением из пула.
+        """
+        table = self.model.__table__
+        deactivated_id = await session.scalar(
+            update(self.model).where(
+                self.model.id == obj_id, table.c[self.active_column],
+                *self._tenant()
+            ).values({self.active_column: False}).returning(self.model.id)
+        )
+        if deactivated_id is not None:
+            await self._publish(session, deactivated_id)
+        return deactivated_id
+
     async def remove(
             self,
             db_obj,
             session: AsyncSession
     ):
-        await session.delete(db_obj)
-        await session.commit()
+        await self.remove_by_id(db_obj.id, session)
         return db_obj
 
+    async def remove_by_id(
+            self,
+            obj_id: int,
+            session: AsyncSession
+    ) -> Optional[int]:
+        """DELETE ... RETURNING id; None, если записи не было."""
+        deleted_id = await session.scalar(
+            delete(self.model).where(
+                self.model.id == obj_id, *self._tenant()
+            ).returning(self.model.id)
+        )
+        if deleted_id is not None:
+            await self._publish(session, deleted_id)
+        await session.commit()
+        return deleted_id
+
+    # Пакетные операции не фиксируют транзакцию: пакет из нескольких
+    # выражений фиксирует вызывающий код.
+
+    async def create_many(
+            self,
+            objs_in: Sequence,
+            session: AsyncSession
+    ) -> List[Tuple[int, int]]:
+        """
+        INSERT через executemany; (id, version) в порядке входных записей.
+        """
+        if not objs_in:
+            return []
+        created = (await session.execute(
+            insert(self.model).returning(
+                self.model.id, self.model.version,
+                sort_by_parameter_order=True
+            ),
+            [self._new_values(obj_in) for obj_in in objs_in]
+        )).all()
+        await publish_changes(session, self.model.__tablename__, created)
+        return created
+
+    def _batch_source(self, items: Sequence[Tuple[int, Dict]],
+                      fields: List[str]):
+        """VALUES (id, поля...) для UPDATE ... FROM; None - поле не меняется."""
+        table = self.model.__table__
+        columns = [sql_column('id', Integer)]
+        for name in fields:
+            type_ = table.c[name].type
+            if isinstance(type_, JSON):
+                # Иначе None уйдёт как JSON null, а не SQL NULL.
+                type_ = type(type_)(none_as_null=True)
+            columns.append(sql_column(name, type_))
+        return values(*columns, name='batch').data([
+            (obj_id, *(data.get(name) for name in fields))
+            for obj_id, data in items
+        ])
+
+    async def update_many(
+            self,
+            objs_in: Sequence[Tuple[int, object]],
+            session: AsyncSession
+    ) -> Dict[int, int]:
+        """
+        Обновляет записи одним UPDATE ... FROM (VALUES ...).
+
+        Возвращает {id: version} для найденных записей. Записи без
+        изменяемых полей только проверяются на существование - как в
+        update_by_id, их версия не меняется.
+        """
+        items = [(obj_id, self._values(obj_in)) for obj_id, obj_in in objs_in]
+        changed = [(obj_id, data) for obj_id, data in items if data]
+        unchanged = [obj_id for obj_id, data in items if not data]
+        found: Dict[int, int] = {}
+        if changed:
+            fields = sorted({name for _, data in changed for name in data})
+            source = self._batch_source(changed, fields)
+            table = self.model.__table__
+            rows = (await session.execute(
+                update(self.model).where(
+                    self.model.id == source.c.id, *self._tenant()
+                ).values(
+                    {name: func.coalesce(source.c[name], table.c[name])
+                     for name in fields}
+                ).returning(self.model.id, self.model.version)
+                .execution_options(synchronize_session=False)
+            )).all()
+            await publish_changes(session, self.model.__tablename__, rows)
+            found.update(rows)
+        if unchanged:
+            found.update((await session.execute(
+                select(self.model.id, self.model.version).where(
+                    self.model.id.in_(unchanged), *self._tenant()
+                )
+            )).all())
+        return found
+
+    async def remove_many(
+            self,
+            obj_ids: Sequence[int],
+            session: AsyncSession
+    ) -> set:
+        """DELETE ... WHERE id IN (...) RETURNING id; id удалённых записей."""
+        if not obj_ids:
+            return set()
+        deleted = set(await session.scalars(
+            delete(self.model).where(self.model.id.in_(obj_ids),
+                                     *self._tenant())
+            .returning(self.model.id)
+        ))
+        await publish_changes(session, self.model.__tablename__,
+                              [(obj_id, None) for obj_id in deleted])
+        return deleted
+
 
-some_model_crud = CRUDBase(SomeModel)
-user_crud = CRUDBase(User)
+some_model_crud = CRUDBase(SomeModel, tenant_column='tenant_id')
+user_crud = CRUDBase(User, active_column='is_active',
+                     tenant_column='tenant_id')
+audit_crud = CRUDBase(AuditEvent, tenant_column='tenant_id')
@@ -1,8 +1,33 @@
-from sqlalchemy import Column, Integer
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import declarative_base, declared_attr, sessionmaker
+import logging
+import time
+from functools import lru_cache
+from typing import Optional
+from uuid import uuid4
+
+from fastapi import Request
+from sqlalchemy import Column, Integer, Select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import (AsyncEngine, AsyncSession,
+                                    create_async_engine)
+from sqlalchemy.orm import (Session, declarative_base, declared_attr,
+                            sessionmaker)
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.sql.expression import Executable
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.replicas import ReplicaSet
+
+logger = logging.getLogger(__name__)
+
+# Методы, запросы которых только читают и могут уйти в реплику.
+READ_METHODS = frozenset({'GET', 'HEAD'})
+# Опция выполнения выражения: True - только читает и может уйти в реплику,
+# False - требует основной БД. Без неё реплике доверяются только SELECT.
+READ_ONLY = 'read_only'
+# Ключ состояния запроса: info сессии, чьи чтения ушли в реплику.
+ROUTING_STATE = 'db_routing'
 
 
 class PreBase:
@@ -15,12 +40,258 @@ class PreBase:
 
 Base = declarative_base(cls=PreBase)
 
-engine = create_async_engine(settings.DATABASE_URL)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession,
-                                 expire_on_commit=False)
 
+class PoolMetrics:
+    """Счётчики ожидания соединения из пула."""
+
+    def __init__(self):
+        self.acquisitions = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.acquisitions += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Пул, который замеряет время получения соединения."""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.observe(time.perf_counter() - start)
+
+
+def engine_options() -> dict:
+    """Параметры пула и драйвера asyncpg из настроек."""
+    connect_args = dict(
+        statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+        prepared_statement_cache_size=settings.DB_STATEMENT_CACHE_SIZE,
+    )
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        connect_args['server_settings'] = dict(
+            statement_timeout=str(settings.DB_STATEMENT_TIMEOUT_MS)
+        )
+    if settings.DB_PGBOUNCER:
+        # В транзакционном режиме PgBouncer соединение с сервером меняется
+        # между транзакциями, поэтому подготовленные выражения не кэшируем
+        # и даём им уникальные имена.
+        connect_args.update(
+            statement_cache_size=0,
+            prepared_statement_cache_size=0,
+            prepared_statement_name_func=lambda: f'__asyncpg_{uuid4()}__',
+        )
+    return dict(
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
+
+@lru_cache
+def get_engine() -> AsyncEngine:
+    """
+    Движок создаётся при первом обращении: импорт моделей, тесты и CLI
+    не загружают драйвер asyncpg и не строят пул, пока не пойдут в БД.
+    """
+    engine = create_async_engine(settings.DATABASE_URL, **engine_options())
+    instrument_engine(engine.sync_engine)
+    return engine
+
+
+class RoutingSession(Session):
+    """
+    Сессия, которая читает из реплики info['replica'], если она задана.
+
+    Запись (flush, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE) идёт
+    в основную БД, и после неё сессия читает оттуда же, чтобы видеть
+    собственные изменения. Клиент info['client'] после записи на время
+    читает из основной БД. По тексту text() не понять, читает ли он,
+    поэтому такое выражение считается записью, пока вызывающий не пометит
+    его опцией read_only=True; read_only=False отправляет в основную БД
+    и SELECT с побочными эффектами.
+    """
+
+    def _is_read(self, clause) -> bool:
+        if not isinstance(clause, Executable) or self._flushing:
+            return False
+        hint = clause.get_execution_options().get(READ_ONLY)
+        if hint is not None:
+            return hint
+        return isinstance(clause, Select) and clause._for_update_arg is None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self._is_read(clause):
+            replica = self.info.get('replica')
+            if replica is not None:
+                return replica.sync_engine
+        elif not self.info.get('wrote'):
+            self.info['wrote'] = True
+            self.info.pop('replica', None)
+            if 'client' in self.info:
+                get_replica_set().stick(self.info['client'])
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@lru_cache
+def get_session_factory() -> sessionmaker:
+    return sessionmaker(get_engine(), class_=AsyncSession,
+                        sync_session_class=RoutingSession,
+                        expire_on_commit=False)
+
+
+@lru_cache
+def get_replica_set() -> ReplicaSet:
+    """Реплики из DB_REPLICA_URLS; движки создаются при первом обращении."""
+    urls = settings.DB_REPLICA_URLS
+    replicas = []
+    for url, weight in zip(urls, settings.DB_REPLICA_WEIGHTS or [1] * len(urls)):
+        engine = create_async_engine(url, **engine_options())
+        instrument_engine(engine.sync_engine)
+        replicas.append((engine, weight))
+    return ReplicaSet(replicas,
+                      sticky_seconds=settings.DB_REPLICA_STICKY_SECONDS,
+                      check_interval=settings.DB_REPLICA_CHECK_INTERVAL,
+                      check_timeout=settings.DB_REPLICA_CHECK_TIMEOUT)
+
+
+def request_client(request: Request) -> str:
+    """Ключ клиента для липкости: токен, а без него - адрес."""
+    authorization = request.headers.get('authorization')
+    if authorization:
+        return authorization
+    return request.client.host if request.client else ''
+
+
+def route_reads(session: AsyncSession,
+                request: Optional[Request]) -> AsyncSession:
+    """
+    Направляет чтения сессии в реплику, если запрос только читает,
+    а клиент не писал в последние DB_REPLICA_STICKY_SECONDS.
+    """
+    if request is None or not settings.DB_REPLICA_URLS:
+        return session
+    client = request_client(request)
+    session.info['client'] = client
+    if request.method in READ_METHODS:
+        replica = get_replica_set().choose(client)
+        if replica is not None:
+            session.info['replica'] = replica
+            # Запись снимает info['replica'] (RoutingSession.get_bind), и
+            # ReplicaFailoverMiddleware такой запрос уже не повторяет.
+            request.scope.setdefault('state', {})[ROUTING_STATE] = (
+                session.info
+            )
+    return session
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Отказ в подключении или обрыв соединения, а не ошибка запроса."""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, OSError)
+
+
+class ReplicaFailoverMiddleware:
+    """
+    Повторяет запрос на чтение, которому отказала реплика.
+
+    Реплика может упасть между проверками ReplicaSet. Запрос GET или HEAD,
+    который ещё ничего не записал и не начал ответ, выполняется заново
+    один раз: отказавшая реплика выключается, и повтор читает из следующей
+    здоровой реплики или из основной БД.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in READ_METHODS:
+            return await self.app(scope, receive, send)
+        state = scope.setdefault('state', {})
+        started = False
+
+        async def send_started(message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_started)
+        except Exception as error:
+            routing = state.pop(ROUTING_STATE, None)
+            replica = routing.get('replica') if routing else None
+            if started or replica is None or not is_connection_error(error):
+                raise
+            get_replica_set().fail(replica)
+            logger.warning('Чтение %s повторяется без отказавшей реплики: %r',
+                           scope['path'], error)
+            await self.app(scope, receive, send)
+
+
+def __getattr__(name: str):
+    # Совместимость с прежними модульными объектами engine/AsyncSessionLocal.
+    if name == 'engine':
+        return get_engine()
+    if name == 'AsyncSessionLocal':
+        return get_session_factory()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+async def dispose_engine() -> None:
+    """Закрывает соединения пулов, если движки уже были созданы."""
+    if get_engine.cache_info().currsize:
+        await get_engine().dispose()
+    if get_replica_set.cache_info().currsize:
+        await get_replica_set().dispose()
+
+
+def pool_status() -> dict:
+    """Текущее состояние пула соединений и статистика ожидания."""
+    pool = get_engine().sync_engine.pool
+    return dict(
+        profile=settings.DB_PROFILE,
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        checked_in=pool.checkedin(),
+        overflow=max(pool.overflow(), 0),
+        acquisitions=pool_metrics.acquisitions,
+        timeouts=pool_metrics.timeouts,
+        wait_seconds_total=round(pool_metrics.wait_seconds_total, 6),
+        wait_seconds_max=round(pool_metrics.wait_seconds_max, 6),
+        replicas=len(settings.DB_REPLICA_URLS),
+        replicas_healthy=(len(get_replica_set().healthy())
+                          if settings.DB_REPLICA_URLS else 0),
+    )
+
+
+async def get_async_session(request: Request):
+    """
+    Сессия запроса; чтения запросов GET и HEAD уходят в реплику
+    (см. route_reads).
 
-async def get_async_session():
-    """Генерирует экземпляр асинхронной сессии."""
-    async with AsyncSessionLocal() as async_session:
-        yield async_session
+    FastAPI кэширует зависимость в пределах запроса, поэтому current_user
+    (через get_user_db и стратегию JWT) и обработчик получают одну и ту же
+    сессию. Соединение из пула она берёт только при первом запросе к БД:
+    запрос, которому хватило кэша пользователей, пул не трогает. Сессия
+    закрывается сразу после обработчика, до отправки ответа, и каждая
+    фиксация транзакции возвращает соединение в пул, поэтому побочные
+    записи одного действия фиксируются вместе.
+    """
+    async with get_session_factory()() as async_session:
+        yield route_reads(async_session, request)
@@ -0,0 +1,130 @@
+"""Хеширование паролей в ограниченном пуле потоков или процессов."""
+import asyncio
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from functools import lru_cache
+from http import HTTPStatus
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi_users.password import PasswordHelper
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from pwdlib.hashers.bcrypt import BcryptHasher
+
+from app.core.config import settings
+
+
+@lru_cache
+def get_password_hash() -> PasswordHash:
+    """Хешер с параметрами стоимости из настроек (свой в каждом процессе)."""
+    return PasswordHash((
+        Argon2Hasher(time_cost=settings.ARGON2_TIME_COST,
+                     memory_cost=settings.ARGON2_MEMORY_COST,
+                     parallelism=settings.ARGON2_PARALLELISM),
+        BcryptHasher(rounds=settings.BCRYPT_ROUNDS),
+    ))
+
+
+def hash_password(password: str) -> str:
+    return get_password_hash().hash(password)
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Хеширует пачку паролей за одну задачу пула."""
+    password_hash = get_password_hash()
+    return [password_hash.hash(password) for password in passwords]
+
+
+def verify_and_update_password(
+        plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    return get_password_hash().verify_and_update(plain_password,
+                                                 hashed_password)
+
+
+class HashingPoolSaturated(HTTPException):
+    """Очередь на хеширование заполнена - клиенту стоит повторить позже."""
+
+    def __init__(self):
+        super().__init__(
+            status_code=HTTPStatus.SERVICE_UNAVAILABLE,
+            detail='Сервис перегружен, повторите запрос позже',
+            headers={'Retry-After': '1'},
+        )
+
+
+class HashingPool:
+    """
+    Выполняет хеширование вне event loop.
+
+    Одновременно принимается не больше workers + queue_size задач, лишние
+    сразу отклоняются с 503, а не копятся в памяти. Режим 'inline' считает
+    хеш прямо в event loop - для сравнения в нагрузочных тестах.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int):
+        self.kind = kind
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.pending = 0
+        self.rejected = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            executor_class = (ProcessPoolExecutor if self.kind == 'process'
+                              else ThreadPoolExecutor)
+            self._executor = executor_class(max_workers=self.workers)
+        return self._executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.capacity:
+            self.rejected += 1
+            raise HashingPoolSaturated()
+        if self.kind == 'inline':
+            return func(*args)
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, func, *args
+            )
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hashing_pool = HashingPool(settings.PASSWORD_HASH_EXECUTOR,
+                           settings.PASSWORD_HASH_WORKERS,
+                           settings.PASSWORD_HASH_QUEUE_SIZE)
+# Отдельный пул для массового импорта, чтобы он не вытеснял логины.
+bulk_hashing_pool = HashingPool(settings.BULK_HASH_EXECUTOR,
+                                settings.BULK_HASH_WORKERS,
+                                settings.BULK_HASH_WORKERS)
+
+
+class PooledPasswordHelper(PasswordHelper):
+    """
+    PasswordHelper с асинхронными методами, уходящими в hashing_pool.
+
+    Синхронные методы оставлены для кода fastapi-users, который
+    UserManager не переопределяет.
+    """
+
+    def __init__(self, pool: HashingPool = hashing_pool):
+        super().__init__(get_password_hash())
+        self.pool = pool
+
+    async def hash_async(self, password: str) -> str:
+        return await self.pool.run(hash_password, password)
+
+    async def verify_and_update_async(
+            self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        return await self.pool.run(verify_and_update_password,
+                                   plain_password, hashed_password)
@@ -1,16 +1,39 @@
+"""
+Первичная подготовка окружения: БД, миграции, первый суперпользователь.
+
+Подготовка выполняется один раз командой ``python -m app.cli bootstrap``
+(или первым воркером в режиме STARTUP_BOOTSTRAP=auto) и оставляет отметку
+в bootstrap_marker. Последующие запуски проверяют отметку одним запросом
+и больше ничего не делают.
+"""
+import asyncio
 import contextlib
-import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
 
-import asyncpg
 from fastapi_users.exceptions import UserAlreadyExists
 from pydantic import EmailStr
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
 
 from app.core.config import settings
-from app.core.db import get_async_session
-from app.core.models import User
+from app.core.db import get_async_session, get_engine
+from app.core.metrics import startup_phase_seconds
+from app.core.models import BootstrapMarker, User
 from app.core.user import get_user_db, get_user_manager
 from app.schemas.user import UserCreate
 
+# Ревизия alembic, до которой bootstrap доводит схему. Обновляется вместе
+# с каждой новой миграцией (это проверяет тест).
+SCHEMA_REVISION = 'c6e1b8d4f209'
+BOOTSTRAP_MARKER = 'bootstrap'
+# Ключ pg_advisory_lock: одновременно готовит окружение только один процесс.
+BOOTSTRAP_LOCK_ID = 0x6170705f626f6f74
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / 'alembic.ini'
+
 get_async_session_context = contextlib.asynccontextmanager(get_async_session)
 get_user_db_context = contextlib.asynccontextmanager(get_user_db)
 get_user_manager_context = contextlib.asynccontextmanager(get_user_manager)
@@ -50,7 +73,9 @@ async def create_first_superuser():
 
 
 async def create_db_if_not_exists():
-    """Создаём БД, если не существует."""
+    """Создаём роль и БД, если не существуют."""
+    import asyncpg
+
     try:
         connection = await asyncpg.connect(
             host=settings.POSTGRES_SERVER,
@@ -67,9 +92,14 @@ async def create_db_if_not_exists():
             host=settings.POSTGRES_SERVER,
             port=settings.POSTGRES_PORT,
             user='postgres',
-            database='template1',
+            # Не template1: CREATE DATABASE копирует его и не допускает
+            # к нему других подключений.
+            database='postgres',
             password='postgres'
         )
+        # Сессионная блокировка снимается при закрытии соединения.
+        await connection.execute('SELECT pg_advisory_lock($1)',
+                                 BOOTSTRAP_LOCK_ID)
         CREATE_USER_IF_NOT_EXISTS = f"""
         DO
         $do$
@@ -90,8 +120,120 @@ async def create_db_if_not_exists():
         CREATE DATABASE {settings.POSTGRES_DB}
         OWNER '{settings.POSTGRES_USER}';
         """
-        await connection.execute(CREATE_DB)
-        print('База создана!')
+        if not await connection.fetchval(
+            'SELECT 1 FROM pg_database WHERE datname = $1',
+            settings.POSTGRES_DB
+        ):
+            await connection.execute(CREATE_DB)
+            print('База создана!')
         await connection.close()
-        os.system('alembic upgrade head')
+
+
+class StartupTimings:
+    """Длительность фаз запуска: печатается при старте и видна в /metrics."""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+            startup_phase_seconds.set(self.phases[name], phase=name)
+
+    def report(self) -> str:
+        return ', '.join(f'{name} {seconds * 1000:.1f} мс'
+                         for name, seconds in self.phases.items())
+
+
+startup_timings = StartupTimings()
+
+
+async def is_bootstrapped(bind: Optional[AsyncEngine] = None) -> bool:
+    """Доведена ли схема до SCHEMA_REVISION и создан ли суперпользователь."""
+    import asyncpg
+
+    bind = bind or get_engine()
+    try:
+        async with bind.connect() as connection:
+            revision = await connection.scalar(
+                select(BootstrapMarker.revision)
+                .where(BootstrapMarker.name == BOOTSTRAP_MARKER)
+            )
+    except (DBAPIError, asyncpg.PostgresError):
+        # Нет базы или таблицы отметок - окружение ещё не готовили.
+        return False
+    return revision == SCHEMA_REVISION
+
+
+async def mark_bootstrapped(bind: Optional[AsyncEngine] = None) -> None:
+    bind = bind or get_engine()
+    statement = insert(BootstrapMarker).values(
+        name=BOOTSTRAP_MARKER, revision=SCHEMA_REVISION
+    )
+    async with bind.begin() as connection:
+        await connection.execute(statement.on_conflict_do_update(
+            index_elements=[BootstrapMarker.name],
+            set_=dict(revision=statement.excluded.revision,
+                      completed_at=func.now()),
+        ))
+
+
+async def run_migrations() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    # env.py сам запускает цикл событий, поэтому миграции идут в потоке.
+    await asyncio.to_thread(command.upgrade, Config(str(ALEMBIC_INI)), 'head')
+
+
+async def bootstrap(timings: StartupTimings = startup_timings) -> bool:
+    """
+    Готовит окружение под advisory-блокировкой.
+
+    Возвращает False, если пока процесс ждал блокировку, окружение
+    подготовил другой. Блокировка сессионная, поэтому при PgBouncer
+    в транзакционном режиме команду нужно запускать напрямую к PostgreSQL.
+    """
+    with timings.phase('database'):
         await create_db_if_not_exists()
+    async with get_engine().connect() as lock_connection:
+        with timings.phase('lock'):
+            await lock_connection.execute(
+                text('SELECT pg_advisory_lock(:key)'),
+                dict(key=BOOTSTRAP_LOCK_ID)
+            )
+            await lock_connection.commit()
+        try:
+            if await is_bootstrapped():
+                return False
+            with timings.phase('migrations'):
+                await run_migrations()
+            with timings.phase('superuser'):
+                await create_first_superuser()
+            await mark_bootstrapped()
+        finally:
+            await lock_connection.execute(
+                text('SELECT pg_advisory_unlock(:key)'),
+                dict(key=BOOTSTRAP_LOCK_ID)
+            )
+            await lock_connection.commit()
+    return True
+
+
+async def startup(mode: Optional[str] = None) -> None:
+    """Действия с БД при запуске процесса приложения."""
+    mode = mode or settings.STARTUP_BOOTSTRAP
+    if mode == 'skip':
+        return
+    with startup_timings.phase('bootstrap_check'):
+        ready = await is_bootstrapped()
+    if ready:
+        return
+    if mode == 'check':
+        raise RuntimeError('Окружение не подготовлено: выполните '
+                           '`python -m app.cli bootstrap`.')
+    await bootstrap()
@@ -0,0 +1,218 @@
+"""
+Фоновые задачи в очереди на таблице job.
+
+Задача ставится в текущую транзакцию сессии и существует, только если
+эта транзакция зафиксирована. Вместе с записью она фиксируется там, где
+код сам управляет транзакцией, как DELETE /users/{id}. Хуки fastapi-users
+on_after_register и on_after_update вызываются уже после фиксации
+пользователя: их задачи ставятся следующей транзакцией, и при сбое между
+ними запись останется без задачи - их доставка не гарантирована.
+
+Воркеры забирают готовые задачи пачкой через SELECT ... FOR UPDATE SKIP
+LOCKED, не мешая друг другу, и узнают о новых задачах уведомлением шины
+событий (а без него - опросом раз в JOB_POLL_INTERVAL). Задачи одного
+вида из пачки обрабатываются одним вызовом обработчика.
+
+Упавшая группа повторяется целиком с экспоненциальной задержкой, поэтому
+обработчики должны быть идемпотентны. После max_attempts попыток задачи
+остаются в статусе failed для разбора.
+"""
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bus import event_bus, publish
+from app.core.config import settings
+from app.core.db import get_session_factory
+from app.core.metrics import background_jobs
+from app.core.models import Job
+
+logger = logging.getLogger(__name__)
+
+JOBS_CHANNEL = 'job_enqueued'
+PENDING, RUNNING, FAILED = 'pending', 'running', 'failed'
+MAX_ERROR_LENGTH = 2000
+
+Handler = Callable[[List[dict]], Awaitable[None]]
+
+handlers: Dict[str, Handler] = {}
+
+
+def job_handler(kind: str):
+    """Регистрирует обработчик задач kind: он получает список payload."""
+    def register(handler: Handler) -> Handler:
+        handlers[kind] = handler
+        return handler
+    return register
+
+
+async def enqueue(session: AsyncSession, kind: str, payload: dict,
+                  delay: float = 0) -> None:
+    """
+    Ставит задачу в текущую транзакцию сессии; воркеры увидят её после
+    COMMIT. С записью она атомарна, только если запись ещё не
+    зафиксирована.
+    """
+    run_at = func.now()
+    if delay:
+        run_at = run_at + timedelta(seconds=delay)
+    await session.execute(insert(Job).values(
+        kind=kind, payload=payload, run_at=run_at,
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    ))
+    await publish(session, JOBS_CHANNEL, dict(kind=kind))
+
+
+def claim_statement(limit: int):
+    """Забирает до limit готовых задач, пропуская занятые другими."""
+    ready = (
+        select(Job.id)
+        .where(Job.status == PENDING, Job.run_at <= func.now())
+        .order_by(Job.run_at, Job.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Job)
+        .where(Job.id.in_(ready.scalar_subquery()))
+        .values(status=RUNNING, locked_at=func.now(),
+                attempts=Job.attempts + 1)
+        .returning(Job.id, Job.kind, Job.payload)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def retry_delay():
+    """Задержка повтора: base * 2^(попытка-1) с разбросом 50-100%."""
+    delay = func.least(
+        settings.JOB_RETRY_MAX_SECONDS,
+        settings.JOB_RETRY_BASE_SECONDS * func.power(2, Job.attempts - 1),
+    ) * (0.5 + func.random() / 2)
+    return func.make_interval(0, 0, 0, 0, 0, 0, delay)
+
+
+def exhausted_or(status: str):
+    return case((Job.attempts >= Job.max_attempts, FAILED), else_=status)
+
+
+class JobWorker:
+    """Обработчики очереди, работающие в event loop процесса."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+        self.processed = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._recover_at = 0.0
+
+    def wake(self, payload: Optional[dict] = None) -> None:
+        self._wakeup.set()
+
+    def _session(self) -> AsyncSession:
+        return (self.session_factory or get_session_factory())()
+
+    async def run_once(self, limit: Optional[int] = None) -> int:
+        """Обрабатывает одну пачку; возвращает число забранных задач."""
+        async with self._session() as session:
+            jobs = (await session.execute(
+                claim_statement(limit or settings.JOB_BATCH_SIZE)
+            )).all()
+            await session.commit()
+        if not jobs:
+            return 0
+        groups = defaultdict(list)
+        # RETURNING не сохраняет порядок очереди - восстанавливаем его.
+        for job in sorted(jobs, key=lambda job: job.id):
+            groups[job.kind].append(job)
+        done, errors = [], {}
+        for kind, group in groups.items():
+            try:
+                handler = handlers.get(kind)
+                if handler is None:
+                    raise LookupError(f'Нет обработчика задач {kind}')
+                await handler([job.payload for job in group])
+            except Exception as error:
+                logger.exception('Задачи %s (%d) не выполнены', kind,
+                                 len(group))
+                message = f'{type(error).__name__}: {error}'
+                errors[message[:MAX_ERROR_LENGTH]] = [job.id for job in group]
+                background_jobs.inc(len(group), kind=kind, result='error')
+            else:
+                done.extend(job.id for job in group)
+                background_jobs.inc(len(group), kind=kind, result='done')
+        async with self._session() as session:
+            if done:
+                await session.execute(delete(Job).where(Job.id.in_(done)))
+            for message, ids in errors.items():
+                await session.execute(
+                    update(Job).where(Job.id.in_(ids))
+                    .values(status=exhausted_or(PENDING), locked_at=None,
+                            run_at=func.now() + retry_delay(),
+                            last_error=message)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+        self.processed += len(done)
+        self.failed += len(jobs) - len(done)
+        return len(jobs)
+
+    async def requeue_stale(self) -> None:
+        """Возвращает в очередь задачи воркеров, умерших посреди работы."""
+        deadline = func.now() - timedelta(seconds=settings.JOB_LOCK_TIMEOUT)
+        async with self._session() as session:
+            await session.execute(
+                update(Job)
+                .where(Job.status == RUNNING, Job.locked_at < deadline)
+                .values(status=exhausted_or(PENDING), locked_at=None)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+
+    async def _run(self) -> None:
+        while True:
+            claimed = 0
+            try:
+                now = time.monotonic()
+                if now >= self._recover_at:
+                    self._recover_at = now + settings.JOB_LOCK_TIMEOUT / 2
+                    await self.requeue_stale()
+                claimed = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Ошибка обработчика очереди задач')
+            if claimed < settings.JOB_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(),
+                                           settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def start(self, concurrency: Optional[int] = None) -> None:
+        if not self._tasks:
+            self._tasks = [
+                asyncio.create_task(self._run())
+                for _ in range(concurrency or settings.JOB_WORKERS)
+            ]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return dict(workers=len(self._tasks), processed=self.processed,
+                    failed=self.failed)
+
+
+job_worker = JobWorker()
+event_bus.subscribe(JOBS_CHANNEL, job_worker.wake)
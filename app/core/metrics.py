@@ -0,0 +1,295 @@
+"""
+Метрики HTTP-запросов и обращений к БД в текстовом формате Prometheus.
+
+Метрики живут в памяти процесса: при нескольких воркерах uvicorn каждый
+отдаёт свои значения, а суммирует их уже Prometheus.
+"""
+import logging
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_MEDIA_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+UNMATCHED_ROUTE = '<unmatched>'
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def escape_label(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_labels(labels: Labels, **extra: str) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"'
+                          for name, value in pairs) + '}'
+
+
+class Metric:
+    type_name = 'untyped'
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> Iterator[str]:
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} {self.type_name}'
+        yield from self.samples()
+
+
+class Counter(Metric):
+    type_name = 'counter'
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f'{self.name}{format_labels(labels)} {value}'
+
+
+class Gauge(Counter):
+    type_name = 'gauge'
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram(Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(buckets)
+        # Для каждого набора меток: счётчики по корзинам (последняя - +Inf),
+        # сумма и количество наблюдений.
+        self.values: Dict[Labels, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self) -> Iterator[str]:
+        for labels, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                yield (f'{self.name}_bucket'
+                       f'{format_labels(labels, le=str(bound))} {cumulative}')
+            yield f'{self.name}_sum{format_labels(labels)} {total}'
+            yield f'{self.name}_count{format_labels(labels)} {count}'
+
+
+class MetricsRegistry:
+    """Набор метрик процесса."""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self, gauges: Optional[Dict[str, float]] = None) -> str:
+        """
+        Текст для /metrics; gauges - мгновенные значения,
+        которые снимаются в момент запроса (например, состояние пула).
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        for name, value in (gauges or {}).items():
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+http_requests = registry.register(Counter(
+    'http_requests_total', 'Количество обработанных HTTP-запросов.'
+))
+http_request_seconds = registry.register(Histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса.'
+))
+http_requests_in_flight = registry.register(Gauge(
+    'http_requests_in_flight', 'HTTP-запросы в обработке.'
+))
+http_request_db_seconds = registry.register(Histogram(
+    'http_request_db_seconds', 'Время запросов к БД за один HTTP-запрос.'
+))
+http_request_db_queries = registry.register(Histogram(
+    'http_request_db_queries', 'Число запросов к БД за один HTTP-запрос.',
+    QUERY_COUNT_BUCKETS
+))
+http_request_db_checkouts = registry.register(Histogram(
+    'http_request_db_checkouts',
+    'Число соединений, взятых из пула за один HTTP-запрос.',
+    QUERY_COUNT_BUCKETS
+))
+db_query_seconds = registry.register(Histogram(
+    'db_query_duration_seconds', 'Время выполнения одного запроса к БД.'
+))
+db_slow_queries = registry.register(Counter(
+    'db_slow_queries_total', 'Запросы к БД дольше SLOW_QUERY_MS.'
+))
+rate_limited_requests = registry.register(Counter(
+    'http_rate_limited_total', 'Запросы, отклонённые ограничением частоты.'
+))
+startup_phase_seconds = registry.register(Gauge(
+    'startup_phase_seconds', 'Длительность фаз запуска процесса.'
+))
+background_jobs = registry.register(Counter(
+    'background_jobs_total', 'Фоновые задачи, обработанные воркером.'
+))
+audit_events = registry.register(Counter(
+    'audit_events_total',
+    'События аудита: принятые в буфер, записанные в БД и потерянные.'
+))
+tenant_throttled_requests = registry.register(Counter(
+    'http_tenant_throttled_total',
+    'Запросы, отклонённые лимитом одновременных запросов арендатора.'
+))
+n_plus_one_requests = registry.register(Counter(
+    'http_n_plus_one_total',
+    'HTTP-запросы, выполнившие больше N_PLUS_ONE_THRESHOLD запросов к БД.'
+))
+
+
+@dataclass
+class RequestStats:
+    """Обращения к БД в рамках одного HTTP-запроса."""
+    scope: dict = field(repr=False)
+    queries: int = 0
+    db_seconds: float = 0.0
+    checkouts: int = 0
+
+    @property
+    def route(self) -> str:
+        # Шаблон пути, а не сам путь: иначе каждый id порождал бы
+        # отдельный ряд метрик.
+        route = self.scope.get('route')
+        return getattr(route, 'path', UNMATCHED_ROUTE)
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar(
+    'current_request', default=None
+)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context,
+                           executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    finished = time.perf_counter()
+    elapsed = finished - conn.info.pop('query_start', finished)
+    db_query_seconds.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if settings.SLOW_QUERY_MS and elapsed * 1000 >= settings.SLOW_QUERY_MS:
+        route = stats.route if stats is not None else None
+        db_slow_queries.inc(route=route or '')
+        logger.warning('Медленный запрос %.1f мс (маршрут %s): %s',
+                       elapsed * 1000, route, statement)
+
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    # Каждая фиксация транзакции возвращает соединение сессии в пул, и
+    # следующий запрос к БД берёт его заново.
+    stats = current_request.get()
+    if stats is not None:
+        stats.checkouts += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключает замер запросов к синхронному движку SQLAlchemy."""
+    if not event.contains(engine, 'before_cursor_execute',
+                          _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'checkout', _checkout)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: латентность по маршрутам, запросы в обработке
+    и обращения к БД за запрос с предупреждением о N+1.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            current_request.reset(token)
+            self.record(stats, scope['method'], status_code, elapsed)
+
+    @staticmethod
+    def record(stats: RequestStats, method: str, status_code: int,
+               elapsed: float) -> None:
+        route = stats.route
+        http_requests.inc(method=method, route=route,
+                          status=str(status_code))
+        http_request_seconds.observe(elapsed, method=method, route=route)
+        http_request_db_seconds.observe(stats.db_seconds, route=route)
+        http_request_db_queries.observe(stats.queries, route=route)
+        http_request_db_checkouts.observe(stats.checkouts, route=route)
+        threshold = settings.N_PLUS_ONE_THRESHOLD
+        if threshold and stats.queries > threshold:
+            n_plus_one_requests.inc(route=route)
+            logger.warning('Возможный N+1: %s %s выполнил %d запросов к БД',
+                           method, route, stats.queries)
@@ -1,22 +1,300 @@
 from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable
-from sqlalchemy import Column, String
+from sqlalchemy import (DDL, BigInteger, Boolean, Column, DateTime, Float,
+                        ForeignKey, ForeignKeyConstraint, Index, Integer,
+                        String, Text, UniqueConstraint, event, func,
+                        literal_column, text)
+from sqlalchemy.dialects.postgresql import JSONB
 
 from app.core.db import Base
 
+VERSIONED_TABLES = ('user', 'somemodel')
+# ФИО одной строкой для триграммного индекса. Поиск (app.core.search)
+# подставляет выражение дословно, иначе планировщик не сопоставит его
+# с индексом.
+USER_FIO_SQL = ("(firstname || ' ' || coalesce(surname, '') || ' ' || "
+                "coalesce(patronymic, ''))")
+TRIGRAM_EXTENSION = 'pg_trgm'
+# Арендатор, которому принадлежат данные, созданные до разделения
+# на арендаторов, и анонимные запросы без X-Tenant-ID.
+DEFAULT_TENANT_ID = 1
+# Число хеш-секций somemodel. Изменить его можно только пересозданием
+# таблицы, поэтому оно задаётся здесь, а не в настройках.
+TENANT_PARTITIONS = 8
 
-class SomeModel(Base):
-    """Дополнительная модель."""
-    pass
 
+def trigram_available(ddl, target, bind, **kw) -> bool:
+    """Можно ли установить pg_trgm на этом сервере."""
+    return bind.scalar(text(
+        'SELECT EXISTS (SELECT 1 FROM pg_available_extensions '
+        'WHERE name = :name)'
+    ), dict(name=TRIGRAM_EXTENSION))
 
-class User(SQLAlchemyBaseUserTable[int], Base):
+
+def trigram_installed(ddl, target, bind, **kw) -> bool:
+    return bind.scalar(text(
+        'SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = :name)'
+    ), dict(name=TRIGRAM_EXTENSION))
+
+
+class VersionedMixin:
+    """
+    Версия строки и время её изменения - для ETag и Last-Modified.
+
+    Оба значения обновляются в том же UPDATE, которым меняется строка,
+    включая записи fastapi-users в обход CRUDBase.
+    """
+    version = Column(Integer, nullable=False, server_default=text('1'),
+                     onupdate=literal_column('version') + 1)
+    updated_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now(), onupdate=func.now())
+
+
+class Tenant(Base):
+    """Арендатор: изолированный набор пользователей и их объектов."""
+    name = Column(String(254), nullable=False, unique=True)
+    created_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now())
+
+
+class TableVersion(Base):
+    """
+    Версия таблицы целиком - для ETag списков.
+
+    Версия общая для всех арендаторов: запись любого из них меняет ETag
+    списков у всех, и клиенты получают лишний 200 вместо 304, но не
+    устаревшую страницу.
+    """
+    __tablename__ = 'table_version'
+
+    id = None
+    table_name = Column(String(63), primary_key=True)
+    version = Column(BigInteger, nullable=False, server_default=text('0'))
+    updated_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now())
+
+
+class BootstrapMarker(Base):
+    """Отметка о выполненной первичной подготовке окружения."""
+    __tablename__ = 'bootstrap_marker'
+
+    id = None
+    name = Column(String(63), primary_key=True)
+    revision = Column(String(32), nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=False,
+                          server_default=func.now())
+
+
+class RevokedToken(Base):
+    """Отозванный токен; строка нужна только до истечения самого токена."""
+    __tablename__ = 'revoked_token'
+
+    id = None
+    jti = Column(String(32), primary_key=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class UserTokenCutoff(Base):
+    """Токены пользователя, выпущенные раньше revoked_before, недействительны."""
+    __tablename__ = 'user_token_cutoff'
+
+    id = None
+    user_id = Column(Integer, ForeignKey('user.id', ondelete='CASCADE'),
+                     primary_key=True)
+    revoked_before = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class RateLimitBucket(Base):
+    """
+    Общая для воркеров корзина токенов (RATE_LIMIT_BACKEND=postgres).
+
+    Таблица UNLOGGED: состояние лимитов не стоит записи в WAL и может
+    потеряться при сбое сервера.
+    """
+    __tablename__ = 'rate_limit_bucket'
+    __table_args__ = {'prefixes': ['UNLOGGED']}
+
+    id = None
+    key = Column(String(320), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    rate = Column(Float, nullable=False)
+    burst = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now(), index=True)
+
+
+class Job(Base):
+    """
+    Фоновая задача (app.core.jobs); выполненные задачи удаляются.
+
+    Частичные индексы охватывают только ожидающие и выполняющиеся задачи,
+    поэтому не растут вместе с задачами в статусе failed.
+    """
+    __tablename__ = 'job'
+
+    id = Column(BigInteger, primary_key=True)
+    kind = Column(String(63), nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(16), nullable=False, server_default='pending')
+    attempts = Column(Integer, nullable=False, server_default=text('0'))
+    max_attempts = Column(Integer, nullable=False)
+    run_at = Column(DateTime(timezone=True), nullable=False,
+                    server_default=func.now())
+    locked_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_job_ready', 'run_at', 'id',
+              postgresql_where=text("status = 'pending'")),
+        Index('ix_job_running_locked_at', 'locked_at',
+              postgresql_where=text("status = 'running'")),
+    )
+
+
+class AuditEvent(Base):
+    """
+    Событие журнала аудита (app.core.audit).
+
+    Таблица секционирована по месяцам created_at, поэтому created_at входит
+    в первичный ключ. Внешнего ключа на user нет: журнал переживает
+    удаление пользователей, а запись пачки не проверяет ссылки.
+    """
+    __tablename__ = 'audit_event'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True)
+    actor_id = Column(Integer, nullable=True)
+    tenant_id = Column(Integer, nullable=True)
+    action = Column(String(63), nullable=False)
+    entity = Column(String(63), nullable=False)
+    entity_id = Column(BigInteger, nullable=True)
+    changes = Column(JSONB, nullable=False, server_default=text("'{}'"))
+
+    __table_args__ = (
+        Index('ix_audit_event_created_at_id', 'created_at', 'id'),
+        Index('ix_audit_event_actor_id_created_at', 'actor_id',
+              'created_at', 'id'),
+        Index('ix_audit_event_entity_created_at', 'entity', 'entity_id',
+              'created_at', 'id'),
+        Index('ix_audit_event_tenant_created_at', 'tenant_id',
+              'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+
+# Триггер на уровне выражения увеличивает версию таблицы при любой записи
+# в неё; строка table_version меняется в той же транзакции, поэтому версия
+# не опережает видимые данные.
+BUMP_TABLE_VERSION_FUNCTION = DDL('''
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO table_version (table_name, version, updated_at)
+    VALUES (TG_TABLE_NAME, 1, now())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_version.version + 1, updated_at = now();
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+''')
+
+
+def bump_table_version_trigger(table_name: str) -> DDL:
+    trigger_name = f'{table_name}_bump_table_version'
+
+    def trigger_missing(ddl, target, bind, **kw) -> bool:
+        # Повторный create_all над готовой схемой не должен падать
+        # на уже существующем триггере.
+        return not bind.scalar(text(
+            'SELECT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = :name)'
+        ), dict(name=trigger_name))
+
+    return DDL(
+        f'CREATE TRIGGER {trigger_name} '
+        f'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{table_name}" '
+        f'FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()'
+    ).execute_if(callable_=trigger_missing)
+
+
+class SomeModel(VersionedMixin, Base):
+    """
+    Объект пользователя с произвольными атрибутами.
+
+    Таблица секционирована по хешу tenant_id: запрос с условием
+    на арендатора читает одну секцию, а индексы начинаются с tenant_id,
+    поэтому их глубина зависит от объёма данных арендатора, а не всей
+    таблицы. Ключ секционирования входит в первичный ключ, а владелец
+    ссылается на (tenant_id, id) пользователя - объект не может
+    принадлежать пользователю другого арендатора.
+    """
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tenant_id = Column(Integer, primary_key=True, autoincrement=False,
+                       server_default=text(str(DEFAULT_TENANT_ID)))
+    owner_id = Column(Integer, nullable=False)
+    name = Column(String(254), nullable=False)
+    attributes = Column(JSONB, nullable=False, server_default=text("'{}'"))
+    created_at = Column(DateTime(timezone=True), nullable=False,
+                        server_default=func.now())
+
+    __table_args__ = (
+        ForeignKeyConstraint(['tenant_id', 'owner_id'],
+                             ['user.tenant_id', 'user.id'],
+                             name='somemodel_owner_fkey',
+                             ondelete='CASCADE'),
+        Index('ix_somemodel_tenant_id_id', 'tenant_id', 'id',
+              postgresql_include=['version', 'updated_at']),
+        Index('ix_somemodel_owner_id_id', 'owner_id', 'id'),
+        Index('ix_somemodel_tenant_created_at_id', 'tenant_id',
+              'created_at', 'id'),
+        Index('ix_somemodel_tenant_updated_at_id', 'tenant_id',
+              'updated_at', 'id'),
+        Index('ix_somemodel_tenant_name_id', 'tenant_id', 'name', 'id'),
+        Index('ix_somemodel_attributes', 'attributes',
+              postgresql_using='gin',
+              postgresql_ops={'attributes': 'jsonb_path_ops'}),
+        {'postgresql_partition_by': 'HASH (tenant_id)'},
+    )
+
+    def dict(self):
+        return dict(id=self.id, owner_id=self.owner_id, name=self.name,
+                    attributes=self.attributes, created_at=self.created_at,
+                    updated_at=self.updated_at)
+
+
+class User(SQLAlchemyBaseUserTable[int], VersionedMixin, Base):
     """
     Расширяем модель пользователя из библиотеки FastAPI Users.
+
+    Таблица не секционирована: e-mail для входа уникален среди всех
+    арендаторов, а на user ссылаются внешние ключи по одному id.
     """
+    tenant_id = Column(Integer, ForeignKey('tenant.id'), nullable=False,
+                       server_default=text(str(DEFAULT_TENANT_ID)))
     firstname = Column(String(254), nullable=False)
     surname = Column(String(254), nullable=True)
     patronymic = Column(String(254), nullable=True)
 
+    __table_args__ = (
+        Index('ix_user_id_version', 'id',
+              postgresql_include=['version', 'updated_at']),
+        # Горячие запросы (вход по e-mail, список) читают только активных
+        # пользователей; частичные индексы не растут с деактивированными.
+        Index('ix_user_email_lower_active', text('lower(email)'),
+              postgresql_where=text('is_active')),
+        Index('ix_user_tenant_active_id', 'tenant_id', 'id',
+              postgresql_where=text('is_active')),
+        # Цель составного внешнего ключа объектов.
+        UniqueConstraint('tenant_id', 'id', name='uq_user_tenant_id_id'),
+        # Поиск по префиксу e-mail: LIKE 'abc%' без учёта регистра.
+        Index('ix_user_email_lower_pattern',
+              text('lower(email) text_pattern_ops')),
+        # Без pg_trgm на сервере индекс не создаётся, а поиск по ФИО
+        # переходит на ILIKE без учёта опечаток.
+        Index('ix_user_fio_trgm', text(f'{USER_FIO_SQL} gin_trgm_ops'),
+              postgresql_using='gin').ddl_if(callable_=trigram_installed),
+    )
+
     def dict(self):
         return dict(
             id=self.id,
@@ -24,3 +302,58 @@ class User(SQLAlchemyBaseUserTable[int], Base):
             is_superuser=self.is_superuser,
             firstname=self.firstname
         )
+
+
+class UserArchive(Base):
+    """
+    Пользователь, давно деактивированный и перенесённый из таблицы user
+    (app.core.archive).
+    """
+    __tablename__ = 'user_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    tenant_id = Column(Integer, nullable=True)
+    email = Column(String(320), nullable=False, index=True)
+    hashed_password = Column(String(1024), nullable=False)
+    firstname = Column(String(254), nullable=False)
+    surname = Column(String(254), nullable=True)
+    patronymic = Column(String(254), nullable=True)
+    is_superuser = Column(Boolean, nullable=False)
+    is_verified = Column(Boolean, nullable=False)
+    deactivated_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), nullable=False,
+                         server_default=func.now())
+
+
+event.listen(
+    Base.metadata, 'before_create',
+    DDL(f'CREATE EXTENSION IF NOT EXISTS {TRIGRAM_EXTENSION}').execute_if(
+        callable_=trigram_available
+    )
+)
+event.listen(Base.metadata, 'after_create', BUMP_TABLE_VERSION_FUNCTION)
+
+
+def tenant_partition_ddl(remainder: int) -> DDL:
+    return DDL(
+        f'CREATE TABLE somemodel_p{remainder} PARTITION OF somemodel '
+        f'FOR VALUES WITH (MODULUS {TENANT_PARTITIONS}, '
+        f'REMAINDER {remainder})'
+    )
+
+
+# Арендатор по умолчанию существует с момента создания схемы: на него
+# ссылаются server_default колонок tenant_id.
+event.listen(Tenant.__table__, 'after_create', DDL(
+    f"INSERT INTO tenant (id, name) VALUES ({DEFAULT_TENANT_ID}, 'default')"
+))
+event.listen(Tenant.__table__, 'after_create', DDL(
+    "SELECT setval(pg_get_serial_sequence('tenant', 'id'), "
+    "(SELECT max(id) FROM tenant))"
+))
+for partition in range(TENANT_PARTITIONS):
+    event.listen(SomeModel.__table__, 'after_create',
+                 tenant_partition_ddl(partition))
+for versioned_table in VERSIONED_TABLES:
+    event.listen(Base.metadata, 'after_create',
+                 bump_table_version_trigger(versioned_table))
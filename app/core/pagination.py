@@ -0,0 +1,127 @@
+"""Курсорная (keyset) пагинация по ключу сортировки и id."""
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from http import HTTPStatus
+from typing import Literal, Optional, Sequence
+
+from fastapi import HTTPException, Query, Request, Response
+
+from app.core.config import settings
+from app.core.db import get_session_factory, route_reads
+from app.core.projection import Projection, json_default
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Упаковывает ключ сортировки последней записи в непрозрачный курсор."""
+    raw = json.dumps(list(values), default=json_default,
+                     separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[list]:
+    """Распаковывает курсор; при некорректном значении - ValueError."""
+    if cursor is None:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f'Некорректный курсор: {cursor}')
+    if not isinstance(values, list) or not values:
+        raise ValueError(f'Некорректный курсор: {cursor}')
+    return values
+
+
+@dataclass
+class PageParams:
+    limit: int
+    after: Optional[list]
+    stream: bool
+    sort: str = 'id'
+    descending: bool = False
+
+
+def page_params(crud, sortable: Sequence[str] = ('id',),
+                default_sort: str = 'id'):
+    """
+    Зависимость с параметрами страницы списка из строки запроса.
+
+    Курсор сразу приводится к типам колонок ключа сортировки `crud`,
+    так что некорректный курсор даёт 400, а не ошибку базы.
+    """
+
+    def dependency(
+        limit: int = Query(settings.PAGE_LIMIT, ge=1,
+                           le=settings.PAGE_MAX_LIMIT),
+        after: Optional[str] = Query(None,
+                                     description='Курсор из X-Next-Cursor'),
+        stream: bool = Query(False, description='Отдать все записи в NDJSON'),
+        sort: str = Query(default_sort,
+                          description=f'Одно из: {", ".join(sortable)}'),
+        order: Literal['asc', 'desc'] = 'asc',
+    ) -> PageParams:
+        if sort not in sortable:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                                detail=f'Сортировка по {sort} недоступна')
+        try:
+            after_values = crud.keyset_bound(decode_cursor(after), sort)
+        except ValueError as error:
+            raise HTTPException(status_code=HTTPStatus.BAD_REQUEST,
+                                detail=str(error))
+        return PageParams(limit=limit, after=after_values, stream=stream,
+                          sort=sort, descending=order == 'desc')
+
+    return dependency
+
+
+def next_cursor(rows: Sequence, limit: int,
+                sort: str = 'id') -> Optional[str]:
+    """Курсор следующей страницы, если текущая заполнена целиком."""
+    if len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor([last.id] if sort == 'id'
+                         else [getattr(last, sort), last.id])
+
+
+def page_response(
+    projection: Projection, rows: Sequence, limit: int, sort: str = 'id'
+) -> Response:
+    """
+    Готовый JSON-ответ со страницей строк проекции.
+
+    Строки уже выбраны по схеме ответа, поэтому повторная валидация
+    через response_model не нужна.
+    """
+    response = Response(content=projection.to_json(rows),
+                        media_type='application/json')
+    cursor = next_cursor(rows, limit, sort)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return response
+
+
+async def stream_ndjson(
+    crud, projection: Projection, page: PageParams, *criteria,
+    request: Optional[Request] = None, include_inactive: bool = False
+):
+    """
+    Отдаёт записи построчно в формате NDJSON через серверный курсор.
+
+    Сессия открывается здесь же: зависимости с yield закрываются до того,
+    как StreamingResponse начнёт отправлять тело ответа. С request чтение
+    может уйти в реплику, как и у сессии запроса.
+    """
+    async with get_session_factory()() as session:
+        route_reads(session, request)
+        async for row in crud.stream_rows(
+            session, projection, page.after, None, *criteria,
+            sort=page.sort, descending=page.descending,
+            include_inactive=include_inactive
+        ):
+            yield projection.to_ndjson_line(row)
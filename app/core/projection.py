@@ -0,0 +1,61 @@
+"""Чтение только тех колонок, которые нужны схеме ответа, без ORM."""
+import datetime
+import decimal
+import uuid
+from typing import Iterable, List
+
+import orjson
+from pydantic import BaseModel
+
+
+def json_default(value):
+    """Сериализует типы, которые не умеет стандартный json."""
+    if isinstance(value, (datetime.datetime, datetime.date,
+                          datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f'Тип {type(value).__name__} не сериализуется в JSON')
+
+
+def dumps(value) -> bytes:
+    """JSON в UTF-8 через orjson; datetime и UUID он сериализует сам."""
+    return orjson.dumps(value, default=json_default,
+                        option=orjson.OPT_NON_STR_KEYS)
+
+
+class Projection:
+    """
+    Набор колонок таблицы, соответствующий полям схемы ответа.
+
+    Первой колонкой всегда выбирается id - он нужен для курсора, даже если
+    схема его не отдаёт.
+    """
+
+    def __init__(self, model, schema: type[BaseModel]):
+        table = model.__table__
+        self.fields = [name for name in schema.model_fields
+                       if name in table.c]
+        self.columns = [table.c.id] + [table.c[name] for name in self.fields
+                                       if name != 'id']
+        names = ['id'] + [name for name in self.fields if name != 'id']
+        self._positions = [(name, names.index(name)) for name in self.fields]
+
+    def dump(self, row) -> dict:
+        return {name: row[position] for name, position in self._positions}
+
+    def dump_object(self, obj) -> dict:
+        """Поля схемы из ORM-объекта модели."""
+        return {name: getattr(obj, name) for name in self.fields}
+
+    def to_json(self, rows: Iterable) -> bytes:
+        return dumps([self.dump(row) for row in rows])
+
+    def to_ndjson_line(self, row) -> bytes:
+        return dumps(self.dump(row)) + b'\n'
+
+    def object_to_json(self, obj) -> bytes:
+        return dumps(self.dump_object(obj))
+
+    def dump_many(self, rows: Iterable) -> List[dict]:
+        return [self.dump(row) for row in rows]
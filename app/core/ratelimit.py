@@ -0,0 +1,249 @@
+"""
+Ограничение частоты запросов к маршрутам аутентификации.
+
+Проверка выполняется в ASGI-middleware до маршрутизации: отклонённый
+запрос не занимает соединение из пула и не запускает хеширование пароля.
+"""
+import json
+import math
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from http import HTTPStatus
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.core.config import settings
+from app.core.db import get_session_factory
+from app.core.metrics import rate_limited_requests
+from app.core.models import RateLimitBucket
+
+# Тело запроса больше этого размера не разбирается в поисках e-mail.
+MAX_INSPECTED_BODY = 64 * 1024
+# Раз в столько общих проверок удаляются давно не менявшиеся корзины.
+SHARED_PURGE_EVERY = 1000
+
+
+class TokenBuckets:
+    """
+    Корзины токенов по ключу в LRU ограниченного размера.
+
+    Корзина хранит пару (токены, время пополнения) и пополняется лениво при
+    обращении. Вытесненная корзина при следующем запросе начинает полной,
+    поэтому размер таблицы берётся с запасом к числу активных клиентов.
+    Рассчитано на один event loop, поэтому обходится без блокировок.
+    """
+
+    def __init__(self, per_minute: float, burst: float, maxsize: int,
+                 clock: Callable[[], float] = time.monotonic):
+        self.rate = per_minute / 60
+        self.burst = burst
+        self.maxsize = maxsize
+        self._clock = clock
+        self._data: OrderedDict = OrderedDict()
+
+    def take(self, key: str, cost: float = 1) -> float:
+        """0, если токен выдан, иначе через сколько секунд повторить."""
+        now = self._clock()
+        entry = self._data.pop(key, None)
+        if entry is None:
+            tokens = self.burst
+        else:
+            tokens = min(self.burst, entry[0] + (now - entry[1]) * self.rate)
+        allowed = tokens >= cost
+        self._data[key] = (tokens - cost if allowed else tokens, now)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return 0.0 if allowed else (cost - tokens) / self.rate
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SharedBuckets:
+    """
+    Корзины в таблице rate_limit_bucket, общие для всех воркеров.
+
+    Все ключи запроса списываются одним INSERT ... ON CONFLICT DO UPDATE:
+    строка обновляется и возвращается, только если в корзине есть токен.
+    """
+
+    def __init__(self):
+        self.checks = 0
+
+    async def take(self, limits: List[Tuple[str, TokenBuckets]]) -> bool:
+        statement = insert(RateLimitBucket).values([
+            dict(key=key, tokens=buckets.burst - 1, rate=buckets.rate,
+                 burst=buckets.burst)
+            for key, buckets in limits
+        ])
+        excluded = statement.excluded
+        refilled = func.least(
+            excluded.burst,
+            RateLimitBucket.tokens + excluded.rate * func.extract(
+                'epoch', func.now() - RateLimitBucket.updated_at
+            )
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_=dict(tokens=refilled - 1, rate=excluded.rate,
+                      burst=excluded.burst, updated_at=func.now()),
+            where=refilled >= 1,
+        ).returning(RateLimitBucket.key)
+        async with get_session_factory()() as session:
+            granted = (await session.scalars(statement)).all()
+            self.checks += 1
+            if self.checks % SHARED_PURGE_EVERY == 0:
+                await self.purge(session)
+            await session.commit()
+        return len(granted) == len(limits)
+
+    @staticmethod
+    async def purge(session) -> None:
+        # Корзина, не менявшаяся час, давно полна - строка не нужна.
+        await session.execute(delete(RateLimitBucket).where(
+            RateLimitBucket.updated_at < func.now() - timedelta(hours=1)
+        ))
+
+
+class RateLimiter:
+    """
+    Лимиты по IP, e-mail и маршруту из настроек.
+
+    Корзина e-mail общая только для запросов с одного IP: иначе любой,
+    кто знает адрес, пятью неверными паролями в минуту не пускал бы
+    владельца. Цена - подбор пароля к одному адресу с многих IP
+    ограничен лишь корзинами IP и маршрута.
+    """
+
+    def __init__(self):
+        size = settings.RATE_LIMIT_TABLE_SIZE
+        self.routes = frozenset(settings.RATE_LIMIT_ROUTES)
+        self.buckets: Dict[str, TokenBuckets] = dict(
+            ip=TokenBuckets(settings.RATE_LIMIT_IP_PER_MINUTE,
+                            settings.RATE_LIMIT_IP_BURST, size),
+            email=TokenBuckets(settings.RATE_LIMIT_EMAIL_PER_MINUTE,
+                               settings.RATE_LIMIT_EMAIL_BURST, size),
+            route=TokenBuckets(settings.RATE_LIMIT_ROUTE_PER_MINUTE,
+                               settings.RATE_LIMIT_ROUTE_BURST, len(self.routes)),
+        )
+        self.shared = (SharedBuckets()
+                       if settings.RATE_LIMIT_BACKEND == 'postgres' else None)
+
+    async def check(self, route: str, ip: str,
+                    email: Optional[str]) -> Tuple[str, float]:
+        """('', 0), если запрос разрешён, иначе (область лимита, Retry-After)."""
+        keys = dict(ip=f'ip:{route}:{ip}', route=f'route:{route}')
+        if email:
+            keys['email'] = f'email:{route}:{email}:{ip}'
+        for scope, key in keys.items():
+            retry_after = self.buckets[scope].take(key)
+            if retry_after:
+                return scope, retry_after
+        # Общие корзины проверяются, только если пропустили локальные:
+        # под нагрузкой отказ обходится без обращения к БД.
+        if self.shared is not None and not await self.shared.take(
+            [(key, self.buckets[scope]) for scope, key in keys.items()]
+        ):
+            return 'shared', 1 / self.buckets['ip'].rate
+        return '', 0.0
+
+
+def client_ip(scope: dict) -> str:
+    if settings.RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get('headers', ()):
+            if name == b'x-forwarded-for':
+                return value.decode('latin-1').split(',')[0].strip()
+    client = scope.get('client')
+    return client[0] if client else ''
+
+
+def extract_email(headers: dict, body: bytes) -> Optional[str]:
+    """E-mail из формы входа (username) или JSON регистрации (email)."""
+    content_type = headers.get(b'content-type', b'').decode('latin-1')
+    try:
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            values = parse_qs(body.decode('utf-8')).get('username')
+            email = values[0] if values else None
+        elif content_type.startswith('application/json'):
+            data = json.loads(body)
+            email = data.get('email') if isinstance(data, dict) else None
+        else:
+            return None
+    except ValueError:
+        return None
+    return email.strip().lower() if isinstance(email, str) else None
+
+
+rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    global rate_limiter
+    if rate_limiter is None:
+        rate_limiter = RateLimiter()
+    return rate_limiter
+
+
+class RateLimitMiddleware:
+    """Отвечает 429 на превышение лимита, не доходя до приложения."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        enabled = settings.RATE_LIMIT_ENABLED
+        if not enabled or scope['type'] != 'http' or scope['method'] != 'POST':
+            return await self.app(scope, receive, send)
+        limiter = get_rate_limiter()
+        route = scope['path']
+        if route not in limiter.routes:
+            return await self.app(scope, receive, send)
+        messages, body = await self.read_body(receive)
+        email = extract_email(dict(scope['headers']), body)
+        limited_scope, retry_after = await limiter.check(
+            route, client_ip(scope), email
+        )
+        if limited_scope:
+            rate_limited_requests.inc(scope=limited_scope)
+            return await self.reject(send, retry_after)
+        pending = iter(messages)
+
+        async def replay():
+            return next(pending, None) or await receive()
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def read_body(receive) -> Tuple[list, bytes]:
+        """Читает тело до MAX_INSPECTED_BODY, сохраняя сообщения для app."""
+        messages, body = [], b''
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message['type'] != 'http.request':
+                break
+            body += message.get('body', b'')
+            if not message.get('more_body') or len(body) > MAX_INSPECTED_BODY:
+                break
+        return messages, body
+
+    @staticmethod
+    async def reject(send, retry_after: float) -> None:
+        body = json.dumps(
+            {'detail': 'Слишком много запросов, повторите позже'},
+            ensure_ascii=False
+        ).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': HTTPStatus.TOO_MANY_REQUESTS,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(math.ceil(retry_after)).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
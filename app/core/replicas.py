@@ -0,0 +1,163 @@
+"""
+Реплики для чтения: выбор по весу, проверка доступности и липкость.
+
+Сессия запроса только на чтение берёт реплику из ReplicaSet.choose(); если
+здоровых реплик нет или клиент недавно писал, чтение идёт в основную БД.
+Запрос, которому реплика отказала до начала ответа, повторяется без неё
+(app.core.db.ReplicaFailoverMiddleware).
+Отметки о записи хранятся в памяти воркера: запрос, попавший в другой
+воркер, может прочитать реплику, ещё не догнавшую запись.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+# Столько клиентов с недавней записью помнит воркер; вытесняются старые.
+STICKY_TABLE_SIZE = 100000
+
+
+class Replica:
+    def __init__(self, engine: AsyncEngine, weight: int):
+        self.engine = engine
+        self.weight = weight
+        self.healthy = True
+        # Текущий вес в плавном взвешенном round-robin.
+        self.current = 0
+
+    @property
+    def name(self) -> str:
+        return self.engine.url.render_as_string(hide_password=True)
+
+
+class ReplicaSet:
+    """
+    Реплики с весами и их состояние.
+
+    Выбор - плавный взвешенный round-robin (как в nginx): реплики с весами
+    2 и 1 чередуются a, b, a, а не a, a, b. Нерабочая реплика выпадает из
+    выбора до следующей успешной проверки.
+    """
+
+    def __init__(self, replicas: Sequence[Tuple[AsyncEngine, int]],
+                 sticky_seconds: float = 0, check_interval: float = 5,
+                 check_timeout: float = 2,
+                 clock: Callable[[], float] = time.monotonic):
+        self.replicas = [Replica(engine, weight)
+                         for engine, weight in replicas]
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._clock = clock
+        self._sticky: OrderedDict = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        for replica in self.replicas:
+            event.listen(replica.engine.sync_engine, 'handle_error',
+                         self._on_error(replica))
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def healthy(self) -> List[Replica]:
+        return [replica for replica in self.replicas if replica.healthy]
+
+    def choose(self, client: Optional[str] = None) -> Optional[AsyncEngine]:
+        """Движок реплики для чтения или None - читать из основной БД."""
+        if client is not None and self.is_sticky(client):
+            return None
+        candidates = self.healthy()
+        if not candidates:
+            return None
+        total = 0
+        for replica in candidates:
+            replica.current += replica.weight
+            total += replica.weight
+        chosen = max(candidates, key=lambda replica: replica.current)
+        chosen.current -= total
+        return chosen.engine
+
+    def stick(self, client: Optional[str]) -> None:
+        """Клиент записал: sticky_seconds его чтения идут в основную БД."""
+        if client is None or not self.sticky_seconds:
+            return
+        self._sticky.pop(client, None)
+        self._sticky[client] = self._clock() + self.sticky_seconds
+        while len(self._sticky) > STICKY_TABLE_SIZE:
+            self._sticky.popitem(last=False)
+
+    def is_sticky(self, client: str) -> bool:
+        until = self._sticky.get(client)
+        if until is None:
+            return False
+        if until <= self._clock():
+            del self._sticky[client]
+            return False
+        return True
+
+    def mark(self, replica: Replica, healthy: bool) -> None:
+        if replica.healthy != healthy:
+            logger.warning('Реплика %s %s', replica.name,
+                           'снова доступна' if healthy else 'недоступна')
+        replica.healthy = healthy
+        if not healthy:
+            replica.current = 0
+
+    def fail(self, engine: AsyncEngine) -> None:
+        """Выключает реплику, соединение с которой оборвалось в запросе."""
+        for replica in self.replicas:
+            if replica.engine is engine:
+                self.mark(replica, False)
+
+    def _on_error(self, replica: Replica):
+        def handle_error(context):
+            # Ошибки самих запросов реплику не выключают, только потеря
+            # соединения или отказ в подключении.
+            if context.is_disconnect or context.connection is None:
+                self.mark(replica, False)
+        return handle_error
+
+    async def check(self) -> None:
+        """Проверяет каждую реплику запросом SELECT 1."""
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(self._ping(replica.engine),
+                                       self.check_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.mark(replica, False)
+            else:
+                self.mark(replica, True)
+
+    @staticmethod
+    async def _ping(engine: AsyncEngine) -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text('SELECT 1'))
+
+    def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.check_interval)
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
@@ -0,0 +1,22 @@
+"""
+Быстрые JSON-ответы.
+
+По умолчанию ответы рендерятся через orjson. Маршрут, который отдаёт
+объект, только что прочитанный из своей таблицы, может вернуть
+trusted_response: тогда FastAPI не валидирует его через response_model
+и не прогоняет через jsonable_encoder - схема остаётся только для OpenAPI.
+"""
+from http import HTTPStatus
+
+from fastapi.responses import ORJSONResponse, Response
+
+from app.core.projection import Projection
+
+DefaultResponse = ORJSONResponse
+
+
+def trusted_response(projection: Projection, obj,
+                     status_code: int = HTTPStatus.OK) -> Response:
+    """Ответ из ORM-объекта по полям проекции, без повторной валидации."""
+    return Response(content=projection.object_to_json(obj),
+                    status_code=status_code, media_type='application/json')
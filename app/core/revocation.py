@@ -0,0 +1,181 @@
+"""
+Отзыв JWT без обращения к БД на каждый запрос.
+
+В памяти процесса хранятся отозванные jti и для каждого пользователя момент,
+раньше которого выпущенные ему токены недействительны. Запись нужна не
+дольше LIFETIME: потом токен истекает сам. Источник истины - таблицы
+revoked_token и user_token_cutoff; об изменениях остальные воркеры узнают
+через шину событий (app.core.bus).
+"""
+import heapq
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.bus import event_bus, publish
+from app.core.config import LIFETIME
+from app.core.models import RevokedToken, UserTokenCutoff
+
+REVOCATION_CHANNEL = 'token_revocation'
+
+
+def to_datetime(timestamp: float) -> datetime:
+    return datetime.fromtimestamp(timestamp, timezone.utc)
+
+
+class RevocationStore:
+    """
+    Денайлист jti и отсечки по пользователям.
+
+    Проверка - два поиска в словаре. Записи удаляются по мере истечения
+    через кучу сроков, поэтому память ограничена отзывами за LIFETIME.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.tokens: Dict[str, float] = {}
+        self.users: Dict[int, float] = {}
+        # (срок, вид, ключ); записи, перекрытые более поздним отзывом,
+        # пропускаются при очистке.
+        self._expiry: List[Tuple[float, str, object]] = []
+
+    def __len__(self) -> int:
+        return len(self.tokens) + len(self.users)
+
+    def _expires(self, kind: str, key) -> Optional[float]:
+        if kind == 'jti':
+            return self.tokens.get(key)
+        revoked_before = self.users.get(key)
+        return None if revoked_before is None else revoked_before + LIFETIME
+
+    def revoke_token(self, jti: str, expires: float) -> None:
+        """Отзывает токен до момента его истечения expires."""
+        if expires <= self.clock() or self.tokens.get(jti, 0) >= expires:
+            return
+        self.tokens[jti] = expires
+        heapq.heappush(self._expiry, (expires, 'jti', jti))
+        self.purge()
+
+    def revoke_user(self, user_id: int, revoked_before: float) -> None:
+        """Отзывает токены пользователя, выпущенные не позже revoked_before."""
+        expires = revoked_before + LIFETIME
+        if expires <= self.clock():
+            return
+        if self.users.get(user_id, 0) >= revoked_before:
+            return
+        self.users[user_id] = revoked_before
+        heapq.heappush(self._expiry, (expires, 'user', user_id))
+        self.purge()
+
+    def is_revoked(self, jti: Optional[str], user_id: int,
+                   issued_at: Optional[float]) -> bool:
+        # Истёкшие записи проверке не мешают: такой токен уже отверг бы
+        # контроль exp.
+        if jti is not None and jti in self.tokens:
+            return True
+        revoked_before = self.users.get(user_id)
+        if revoked_before is None:
+            return False
+        # Токены без iat выпущены до появления отзыва - считаем их старыми.
+        return issued_at is None or issued_at <= revoked_before
+
+    def purge(self) -> None:
+        now = self.clock()
+        while self._expiry and self._expiry[0][0] <= now:
+            expires, kind, key = heapq.heappop(self._expiry)
+            if self._expires(kind, key) == expires:
+                del (self.tokens if kind == 'jti' else self.users)[key]
+
+    def apply(self, payload: dict) -> None:
+        """Применяет отзыв из уведомления другого воркера."""
+        if 'jti' in payload:
+            self.revoke_token(payload['jti'], payload['exp'])
+        else:
+            self.revoke_user(payload['user_id'], payload['revoked_before'])
+
+    def replace(self, tokens: Dict[str, float],
+                users: Dict[int, float]) -> None:
+        """Заменяет содержимое снимком из БД."""
+        self.tokens, self.users, self._expiry = {}, {}, []
+        for jti, expires in tokens.items():
+            self.revoke_token(jti, expires)
+        for user_id, revoked_before in users.items():
+            self.revoke_user(user_id, revoked_before)
+
+
+revocation_store = RevocationStore()
+
+
+async def purge_expired(session: AsyncSession) -> None:
+    # Отзывы редки, поэтому истёкшие строки удаляются попутно, по индексу
+    # expires_at.
+    await session.execute(
+        delete(RevokedToken).where(RevokedToken.expires_at <= func.now())
+    )
+    await session.execute(
+        delete(UserTokenCutoff).where(UserTokenCutoff.expires_at <= func.now())
+    )
+
+
+async def revoke_token(jti: str, expires: float,
+                       session: AsyncSession) -> None:
+    """Отзывает один токен (выход из системы)."""
+    await session.execute(
+        insert(RevokedToken)
+        .values(jti=jti, expires_at=to_datetime(expires))
+        .on_conflict_do_nothing()
+    )
+    await purge_expired(session)
+    await publish(session, REVOCATION_CHANNEL, dict(jti=jti, exp=expires))
+    await session.commit()
+    revocation_store.revoke_token(jti, expires)
+
+
+async def revoke_user_tokens(user_id: int, session: AsyncSession,
+                             revoked_before: Optional[float] = None) -> None:
+    """Отзывает все ранее выпущенные токены пользователя."""
+    if revoked_before is None:
+        revoked_before = time.time()
+    statement = insert(UserTokenCutoff).values(
+        user_id=user_id,
+        revoked_before=to_datetime(revoked_before),
+        expires_at=to_datetime(revoked_before + LIFETIME),
+    )
+    await session.execute(statement.on_conflict_do_update(
+        index_elements=[UserTokenCutoff.user_id],
+        set_=dict(
+            revoked_before=func.greatest(UserTokenCutoff.revoked_before,
+                                         statement.excluded.revoked_before),
+            expires_at=func.greatest(UserTokenCutoff.expires_at,
+                                     statement.excluded.expires_at),
+        ),
+    ))
+    await purge_expired(session)
+    await publish(session, REVOCATION_CHANNEL,
+                  dict(user_id=user_id, revoked_before=revoked_before))
+    await session.commit()
+    revocation_store.revoke_user(user_id, revoked_before)
+
+
+async def load_revocations(connection) -> None:
+    """Перечитывает действующие отзывы после подключения шины событий."""
+    tokens = await connection.fetch(
+        'SELECT jti, extract(epoch FROM expires_at) AS expires '
+        'FROM revoked_token WHERE expires_at > now()'
+    )
+    users = await connection.fetch(
+        'SELECT user_id, extract(epoch FROM revoked_before) AS before '
+        'FROM user_token_cutoff WHERE expires_at > now()'
+    )
+    revocation_store.replace(
+        {row['jti']: float(row['expires']) for row in tokens},
+        {row['user_id']: float(row['before']) for row in users},
+    )
+
+
+event_bus.subscribe(REVOCATION_CHANNEL, revocation_store.apply)
+event_bus.on_connect(load_revocations)
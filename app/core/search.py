@@ -0,0 +1,94 @@
+"""
+Поиск пользователей по ФИО и префиксу e-mail.
+
+С pg_trgm ФИО сравнивается пословно через word_similarity: оператор <%
+покрыт GIN-индексом ix_user_fio_trgm и прощает опечатки. Без расширения
+ФИО ищется ILIKE по подстроке. Префикс e-mail ищется по индексу
+ix_user_email_lower_pattern, и такое совпадение ранжируется выше всех.
+"""
+from typing import Optional, Sequence
+
+from sqlalchemy import (Float, and_, case, cast, func, literal, literal_column,
+                        or_, select, text)
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.db import READ_ONLY
+from app.core.models import TRIGRAM_EXTENSION, USER_FIO_SQL, User
+from app.core.projection import Projection
+from app.core.tenancy import current_tenant
+
+FIO = literal_column(USER_FIO_SQL)
+EMAIL_PREFIX_RANK = 1.0
+# Без pg_trgm степень сходства не вычислить: все совпадения по ФИО
+# равноценны и упорядочены по id.
+SUBSTRING_RANK = 0.5
+
+_trigram: Optional[bool] = None
+
+
+async def has_trigram(session: AsyncSession) -> bool:
+    """Установлен ли pg_trgm; проверяется один раз за процесс."""
+    global _trigram
+    if _trigram is None:
+        _trigram = await session.scalar(text(
+            'SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = :name)'
+        ).execution_options(**{READ_ONLY: True}),
+            dict(name=TRIGRAM_EXTENSION))
+    return _trigram
+
+
+def escape_like(value: str) -> str:
+    return (value.replace('\\', '\\\\').replace('%', '\\%')
+            .replace('_', '\\_'))
+
+
+def search_bound(after: Optional[Sequence]) -> Optional[list]:
+    """Проверяет курсор поиска: [ранг, id] последней выданной строки."""
+    if after is None:
+        return None
+    if len(after) == 2:
+        rank, last_id = after
+        if isinstance(rank, (int, float)) and isinstance(last_id, int):
+            return [float(rank), last_id]
+    raise ValueError('Курсор не соответствует поиску')
+
+
+def search_query(projection: Projection, query: str, limit: int,
+                 after: Optional[Sequence] = None, trigram: bool = True):
+    """
+    Совпадения по ФИО или префиксу e-mail по убыванию ранга, затем по id.
+
+    Колонка rank идёт последней: по ней и id строится курсор страницы.
+    """
+    query = query.strip()
+    email_match = func.lower(User.email).like(
+        escape_like(query.lower()) + '%'
+    )
+    if trigram:
+        fio_match = literal(query).op('<%')(FIO)
+        fio_rank = func.word_similarity(query, FIO)
+    else:
+        fio_match = FIO.ilike('%' + escape_like(query) + '%')
+        fio_rank = literal(SUBSTRING_RANK)
+    rank = cast(case((email_match, EMAIL_PREFIX_RANK), else_=fio_rank),
+                Float)
+    statement = select(*projection.columns, rank.label('rank')).where(
+        or_(email_match, fio_match)
+    ).order_by(rank.desc(), User.id).limit(limit)
+    if after is not None:
+        statement = statement.where(or_(
+            rank < after[0], and_(rank == after[0], User.id > after[1])
+        ))
+    return statement
+
+
+async def search_users(session: AsyncSession, projection: Projection,
+                       query: str, limit: int,
+                       after: Optional[Sequence] = None):
+    """Страница найденных пользователей в виде кортежей проекции и ранга."""
+    statement = search_query(projection, query, limit, after,
+                             await has_trigram(session))
+    tenant_id = current_tenant.get()
+    if tenant_id is not None:
+        statement = statement.where(User.tenant_id == tenant_id)
+    return (await session.execute(statement)).all()
@@ -0,0 +1,160 @@
+"""
+Арендаторы: чей это запрос и сколько ресурсов ему можно занять.
+
+Арендатор запроса определяется в ASGI-middleware до маршрутизации:
+из подписанного утверждения tid токена, для анонимных запросов - из
+заголовка X-Tenant-ID за доверенным шлюзом (TENANT_TRUST_HEADER), иначе
+это арендатор по умолчанию. JWT-стратегия после проверки токена
+уточняет его по самому пользователю. CRUDBase добавляет условие
+на current_tenant ко всем запросам моделей с колонкой арендатора;
+фоновые задачи и CLI арендатора не выставляют и видят все данные.
+
+Каждый арендатор получает не больше TENANT_MAX_CONCURRENCY
+одновременных запросов на воркер (TENANT_CONCURRENCY - индивидуальные
+лимиты). Запрос держит место до отправки ответа, поэтому один арендатор
+не может занять весь пул соединений воркера: сверх лимита запросы ждут
+TENANT_QUEUE_TIMEOUT секунд и получают 503.
+"""
+import asyncio
+import json
+from contextvars import ContextVar
+from http import HTTPStatus
+from typing import Dict, Optional
+
+import jwt
+from fastapi_users.jwt import decode_jwt
+
+from app.core.config import settings
+from app.core.metrics import tenant_throttled_requests
+from app.core.models import DEFAULT_TENANT_ID
+
+TENANT_CLAIM = 'tid'
+TENANT_HEADER = b'x-tenant-id'
+# Аудитория токенов fastapi-users по умолчанию (JWTStrategy).
+TOKEN_AUDIENCE = ['fastapi-users:auth']
+
+# Арендатор текущего запроса; None - фоновая работа без ограничения
+# по арендатору.
+current_tenant: ContextVar[Optional[int]] = ContextVar('current_tenant',
+                                                       default=None)
+
+
+def bearer_token(headers) -> Optional[str]:
+    for name, value in headers:
+        if name == b'authorization':
+            scheme, _, token = value.decode('latin-1').partition(' ')
+            if scheme.lower() == 'bearer' and token:
+                return token
+    return None
+
+
+def token_tenant(token: str) -> Optional[int]:
+    """Арендатор из проверенного токена; None, если токен недействителен."""
+    try:
+        data = decode_jwt(token, settings.secret, TOKEN_AUDIENCE)
+    except jwt.PyJWTError:
+        return None
+    tenant_id = data.get(TENANT_CLAIM)
+    return tenant_id if isinstance(tenant_id, int) else None
+
+
+def resolve_tenant(scope: dict) -> int:
+    """Арендатор запроса по токену, доверенному заголовку или по умолчанию."""
+    headers = scope.get('headers', ())
+    token = bearer_token(headers)
+    if token is not None:
+        tenant_id = token_tenant(token)
+        if tenant_id is not None:
+            return tenant_id
+    if settings.TENANT_TRUST_HEADER:
+        for name, value in headers:
+            if name == TENANT_HEADER and value.isdigit():
+                return int(value)
+    return DEFAULT_TENANT_ID
+
+
+class TenantLimiter:
+    """
+    Семафоры одновременных запросов по арендаторам.
+
+    Семафор создаётся при первом запросе арендатора и живёт до конца
+    процесса: их число ограничено числом арендаторов. Рассчитано на один
+    event loop.
+    """
+
+    def __init__(self):
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+        self.active: Dict[int, int] = {}
+
+    @staticmethod
+    def limit(tenant_id: int) -> int:
+        return settings.TENANT_CONCURRENCY.get(
+            tenant_id, settings.TENANT_MAX_CONCURRENCY
+        )
+
+    async def acquire(self, tenant_id: int) -> bool:
+        """
+        Занимает место арендатора; False, если оно не освободилось
+        за TENANT_QUEUE_TIMEOUT. Без лимита сразу возвращает True.
+        """
+        limit = self.limit(tenant_id)
+        if limit <= 0:
+            return True
+        semaphore = self._semaphores.get(tenant_id)
+        if semaphore is None:
+            semaphore = self._semaphores[tenant_id] = asyncio.Semaphore(limit)
+        try:
+            await asyncio.wait_for(semaphore.acquire(),
+                                   settings.TENANT_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            return False
+        self.active[tenant_id] = self.active.get(tenant_id, 0) + 1
+        return True
+
+    def release(self, tenant_id: int) -> None:
+        semaphore = self._semaphores.get(tenant_id)
+        if semaphore is None or not self.active.get(tenant_id):
+            return
+        self.active[tenant_id] -= 1
+        semaphore.release()
+
+
+tenant_limiter = TenantLimiter()
+
+
+class TenantMiddleware:
+    """Выставляет current_tenant и ограничивает запросы арендатора."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        tenant_id = resolve_tenant(scope)
+        if not await tenant_limiter.acquire(tenant_id):
+            tenant_throttled_requests.inc()
+            return await self.reject(send)
+        reset = current_tenant.set(tenant_id)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(reset)
+            tenant_limiter.release(tenant_id)
+
+    @staticmethod
+    async def reject(send) -> None:
+        body = json.dumps(
+            {'detail': 'Слишком много одновременных запросов арендатора'},
+            ensure_ascii=False
+        ).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': HTTPStatus.SERVICE_UNAVAILABLE,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', b'1'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
@@ -1,58 +1,381 @@
-from typing import Optional, Union
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
 
+import jwt
 from fastapi import Depends, Request
 from fastapi_users import (BaseUserManager, FastAPIUsers, IntegerIDMixin,
-                           InvalidPasswordException)
+                           InvalidPasswordException, exceptions)
 from fastapi_users.authentication import (AuthenticationBackend,
                                           BearerTransport, JWTStrategy)
+from fastapi_users.jwt import decode_jwt, generate_jwt
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
 
+from app.core.archive import enqueue_archive
+from app.core.audit import audit_log, current_actor
+from app.core.bus import event_bus, publish_change
+from app.core.cache import TTLCache
 from app.core.config import LIFETIME, settings
-from app.core.db import get_async_session
+from app.core.db import get_async_session, get_session_factory
+from app.core.hashing import PooledPasswordHelper
+from app.core.jobs import enqueue, job_handler
 from app.core.models import User
+from app.core.revocation import (revocation_store, revoke_token,
+                                 revoke_user_tokens)
+from app.core.tenancy import TENANT_CLAIM, current_tenant
 from app.schemas.user import UserCreate
 
+logger = logging.getLogger(__name__)
+
+USER_REGISTERED = 'user.registered'
+USER_UPDATED = 'user.updated'
+USER_DEACTIVATED = 'user.deactivated'
+USER_COLUMNS = tuple(User.__table__.columns.keys())
+# В токен попадают только значения, которые без потерь ложатся в JSON.
+TOKEN_USER_COLUMNS = tuple(column for column in USER_COLUMNS
+                           if column not in ('hashed_password', 'updated_at'))
+TOKEN_USER_CLAIM = 'usr'
+# Значения этих полей не попадают в журнал аудита - только их имена.
+AUDIT_HIDDEN_FIELDS = ('password', 'hashed_password')
+
+user_cache = TTLCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+# Записи других воркеров сбрасывают кэш точечно; после разрыва соединения
+# шины события могли потеряться - кэш сбрасывается целиком.
+event_bus.subscribe_changes(
+    'user', lambda user_id, version: user_cache.invalidate(user_id)
+)
+event_bus.on_connect(lambda connection: user_cache.clear())
+
+
+def user_snapshot(
+        user: User, columns: Tuple[str, ...] = USER_COLUMNS
+) -> Dict[str, Any]:
+    """Значения колонок пользователя, пригодные для кэша и токена."""
+    return {column: getattr(user, column) for column in columns}
+
+
+def detached_user(snapshot: Dict[str, Any]) -> User:
+    """
+    Собирает отсоединённый экземпляр User из снимка.
+
+    Каждый запрос получает свой объект, поэтому его можно безопасно добавить
+    в сессию запроса: SQLAlchemy сочтёт его существующей строкой.
+    """
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     """Обеспечивает доступ к БД через SQLAlchemy."""
     yield SQLAlchemyUserDatabase(session, User)
 
+
+def check_password(password: str, email: str) -> None:
+    """Правила сложности пароля, общие для регистрации и импорта."""
+    if len(password) < 3:
+        raise InvalidPasswordException(
+            reason='Password should be at least 3 characters'
+        )
+    if email in password:
+        raise InvalidPasswordException(
+            reason='Password should not contain e-mail'
+        )
+
+
 bearer_transport = BearerTransport(tokenUrl='auth/jwt/login')
 
 
-def get_jwt_strategy() -> JWTStrategy:
+class CachedJWTStrategy(JWTStrategy):
+    """
+    JWT-стратегия, которая не читает пользователя из БД на каждый запрос.
+
+    Пользователь берётся из кэша по id из токена. В режиме AUTH_STATELESS
+    токен несёт снимок пользователя и БД не используется вовсе - права из
+    токена действуют весь его срок жизни.
+
+    Отозванные токены (выход, деактивация, смена пароля) отсекаются по
+    денайлисту в памяти до обращения к кэшу и БД.
+
+    Утверждение tid несёт арендатора пользователя: по нему TenantMiddleware
+    выбирает лимит до маршрутизации, а после проверки токена арендатором
+    запроса становится арендатор самого пользователя.
+    """
+
+    def __init__(self, *args, session: Optional[AsyncSession] = None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = session
+
+    async def read_token(self, token, user_manager):
+        user = await self._read_token(token, user_manager)
+        if user is not None:
+            current_actor.set(user.id)
+            # В снимках токенов, выпущенных до появления арендаторов,
+            # tenant_id нет - тогда остаётся арендатор из middleware.
+            if user.tenant_id is not None:
+                current_tenant.set(user.tenant_id)
+        return user
+
+    async def _read_token(self, token, user_manager):
+        if token is None:
+            return None
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience,
+                              algorithms=[self.algorithm])
+            user_id = user_manager.parse_id(data.get('sub'))
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+        if revocation_store.is_revoked(data.get('jti'), user_id,
+                                       data.get('iat')):
+            return None
+        if settings.AUTH_STATELESS and TOKEN_USER_CLAIM in data:
+            return detached_user(data[TOKEN_USER_CLAIM])
+        snapshot = user_cache.get(user_id)
+        if snapshot is not None:
+            return detached_user(snapshot)
+        try:
+            user = await user_manager.get(user_id)
+        except exceptions.UserNotExists:
+            return None
+        user_cache.set(user_id, user_snapshot(user))
+        return user
+
+    async def write_token(self, user: User) -> str:
+        data = {'sub': str(user.id), 'aud': self.token_audience,
+                'jti': uuid4().hex, 'iat': round(time.time(), 3),
+                TENANT_CLAIM: user.tenant_id}
+        if settings.AUTH_STATELESS:
+            data[TOKEN_USER_CLAIM] = user_snapshot(user, TOKEN_USER_COLUMNS)
+        return generate_jwt(data, self.encode_key, self.lifetime_seconds,
+                            algorithm=self.algorithm)
+
+    async def destroy_token(self, token: str, user: User) -> None:
+        try:
+            data = decode_jwt(token, self.decode_key, self.token_audience,
+                              algorithms=[self.algorithm])
+        except jwt.PyJWTError:
+            return
+        if 'jti' not in data:
+            return
+        if self.session is not None:
+            await revoke_token(data['jti'], data['exp'], self.session)
+            return
+        async with get_session_factory()() as session:
+            await revoke_token(data['jti'], data['exp'], session)
+
+
+def get_jwt_strategy(session: Optional[AsyncSession] = None) -> JWTStrategy:
     """Используем хранение токена в виде JWT."""
-    return JWTStrategy(secret=settings.secret, lifetime_seconds=LIFETIME)
+    return CachedJWTStrategy(secret=settings.secret,
+                             lifetime_seconds=LIFETIME, session=session)
+
+
+def get_request_jwt_strategy(
+        session: AsyncSession = Depends(get_async_session)
+) -> JWTStrategy:
+    """Стратегия запроса: выход из системы пишет отзыв в его сессию."""
+    return get_jwt_strategy(session)
 
 
 auth_backend = AuthenticationBackend(
     name='jwt',
     transport=bearer_transport,
-    get_strategy=get_jwt_strategy,
+    get_strategy=get_request_jwt_strategy,
 )
 
 
 class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
+    """
+    Менеджер пользователей, который считает хеши паролей вне event loop.
+
+    create, authenticate и _update повторяют реализацию fastapi-users,
+    заменяя синхронные вызовы password_helper на пул хеширования.
+    """
+
+    def __init__(self, user_db, password_helper=None):
+        super().__init__(user_db, password_helper or PooledPasswordHelper())
+
+    async def create(
+            self, user_create: UserCreate, safe: bool = False,
+            request: Optional[Request] = None
+    ) -> User:
+        await self.validate_password(user_create.password, user_create)
+        if await self.user_db.get_by_email(user_create.email) is not None:
+            raise exceptions.UserAlreadyExists()
+        user_dict = (user_create.create_update_dict() if safe
+                     else user_create.create_update_dict_superuser())
+        user_dict['hashed_password'] = await self.password_helper.hash_async(
+            user_dict.pop('password')
+        )
+        tenant_id = current_tenant.get()
+        if tenant_id is not None:
+            user_dict['tenant_id'] = tenant_id
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def get(self, id: int) -> User:
+        """Пользователь по id - только среди пользователей арендатора."""
+        user = await super().get(id)
+        tenant_id = current_tenant.get()
+        if tenant_id is not None and user.tenant_id != tenant_id:
+            raise exceptions.UserNotExists()
+        return user
+
+    async def authenticate(
+            self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        # Решение принимается до поиска: автосброс при SELECT скрыл бы
+        # изменения, которые ждут фиксации вместе с запросом.
+        releasable = self._connection_releasable()
+        user = await self.get_active_by_email(credentials.username)
+        if user is None:
+            # Хешируем впустую, чтобы время ответа не выдавало наличие e-mail
+            await self.password_helper.hash_async(credentials.password)
+            return None
+        if releasable:
+            await self._release_connection()
+        verified, updated_password_hash = (
+            await self.password_helper.verify_and_update_async(
+                credentials.password, user.hashed_password
+            )
+        )
+        if not verified:
+            return None
+        if updated_password_hash is not None:
+            await self.user_db.update(
+                user, {'hashed_password': updated_password_hash}
+            )
+        return user
+
+    async def get_active_by_email(self, email: str) -> Optional[User]:
+        """
+        Активный пользователь по e-mail - через частичный индекс
+        ix_user_email_lower_active. Деактивированный всё равно не смог бы
+        войти, поэтому вход не ищет среди них.
+        """
+        return await self.user_db.session.scalar(select(User).where(
+            func.lower(User.email) == func.lower(email), User.is_active
+        ))
+
+    def _connection_releasable(self) -> bool:
+        """
+        Можно ли отдать соединение посреди входа: сессия не начала
+        транзакцию и не держит несохранённых объектов, так что фиксация
+        закроет только транзакцию поиска пользователя.
+        """
+        session = getattr(self.user_db, 'session', None)
+        return session is not None and not (
+            session.in_transaction() or session.new or session.dirty
+            or session.deleted
+        )
+
+    async def _release_connection(self) -> None:
+        """Возвращает соединение в пул на время долгой проверки пароля."""
+        session = self.user_db.session
+        if session.in_transaction():
+            await session.commit()
+
+    async def _update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        update_dict = dict(update_dict)
+        password = update_dict.pop('password', None)
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict['hashed_password'] = (
+                await self.password_helper.hash_async(password)
+            )
+        return await super()._update(user, update_dict)
 
     async def validate_password(
         self,
         password: str,
         user: Union[UserCreate, User],
     ) -> None:
-        if len(password) < 3:
-            raise InvalidPasswordException(
-                reason='Password should be at least 3 characters'
-            )
-        if user.email in password:
-            raise InvalidPasswordException(
-                reason='Password should not contain e-mail'
-            )
+        check_password(password, user.email)
+
+    async def _publish_change(self, user_id: int,
+                              version: Optional[int] = None,
+                              job: Optional[Tuple[str, dict]] = None,
+                              revoke_tokens: bool = False) -> None:
+        # fastapi-users уже зафиксировал запись, событие, фоновая задача и
+        # отзыв токенов уходят следующей короткой транзакцией: если она
+        # не удалась, запись останется без задачи.
+        session = self.user_db.session
+        if job is not None:
+            await enqueue(session, *job)
+        await publish_change(session, User.__tablename__, user_id, version)
+        if revoke_tokens:
+            # revoke_user_tokens фиксирует транзакцию сам.
+            await revoke_user_tokens(user_id, session)
+        else:
+            await session.commit()
 
     async def on_after_register(
             self, user: User, request: Optional[Request] = None
     ):
-        print(f'Пользователь {user.email} зарегистрирован.')
+        await self._publish_change(user.id, user.version, (
+            USER_REGISTERED, dict(id=user.id, email=user.email)
+        ))
+
+    async def on_after_update(
+            self, user: User, update_dict: Dict[str, Any],
+            request: Optional[Request] = None
+    ):
+        # Кэш и отзыв токенов - часть безопасности, они не откладываются.
+        user_cache.invalidate(user.id)
+        audit_log.record('user.update', User.__tablename__, user.id, {
+            field: '***' if field in AUDIT_HIDDEN_FIELDS else value
+            for field, value in update_dict.items()
+        })
+        deactivated = update_dict.get('is_active') is False
+        if deactivated:
+            await enqueue_archive(self.user_db.session, user.id)
+        await self._publish_change(
+            user.id, user.version,
+            (USER_UPDATED, dict(id=user.id, fields=sorted(update_dict))),
+            revoke_tokens='password' in update_dict or deactivated
+        )
+
+    async def on_before_delete(
+            self, user: User, request: Optional[Request] = None
+    ):
+        # Строка отсечки удалится каскадом вместе с пользователем, но
+        # уведомление успеет разойтись по воркерам.
+        await revoke_user_tokens(user.id, self.user_db.session)
+
+    async def on_after_delete(
+            self, user: User, request: Optional[Request] = None
+    ):
+        user_cache.invalidate(user.id)
+        audit_log.record('user.delete', User.__tablename__, user.id,
+                         dict(email=user.email))
+        await self._publish_change(user.id)
+
+
+@job_handler(USER_REGISTERED)
+async def welcome_users(payloads: List[dict]) -> None:
+    """Место для приветственных писем; пока только журнал."""
+    for payload in payloads:
+        logger.info('Пользователь %s зарегистрирован.', payload['email'])
+
+
+@job_handler(USER_UPDATED)
+async def log_user_updates(payloads: List[dict]) -> None:
+    for payload in payloads:
+        logger.info('Пользователь id=%s изменён: %s', payload['id'],
+                    ', '.join(payload['fields']))
+
+
+@job_handler(USER_DEACTIVATED)
+async def log_user_deactivations(payloads: List[dict]) -> None:
+    logger.info('Деактивированы пользователи: %s',
+                ', '.join(str(payload['id']) for payload in payloads))
 
 
 async def get_user_manager(user_db=Depends(get_user_db)):
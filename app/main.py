@@ -1,31 +1,67 @@
 from contextlib import asynccontextmanager
 
-import uvicorn
 from fastapi import FastAPI
 
 from app.api.routers import main_router
+from app.core.audit import audit_log
 from app.core.config import settings
-from app.core.init_db import create_db_if_not_exists, create_first_superuser
+from app.core.db import (ReplicaFailoverMiddleware, dispose_engine,
+                         get_replica_set)
+from app.core.hashing import hashing_pool
+from app.core.init_db import startup, startup_timings
+from app.core.metrics import MetricsMiddleware
+from app.core.ratelimit import RateLimitMiddleware
+from app.core.responses import DefaultResponse
+from app.core.tenancy import TenantMiddleware
+from app.core.bus import event_bus
+from app.core.jobs import job_worker
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
-    Запускает процесс создания первого суперпользователя при запуске проекта.
+    Проверяет готовность БД при запуске; подготовка окружения выполняется
+    только если её ещё не было (см. app.core.init_db).
     """
     print("starting up")
-    await create_db_if_not_exists()
-    await create_first_superuser()
+    with startup_timings.phase('lifespan'):
+        await startup()
+    print(f"startup: {startup_timings.report()}")
+    event_bus.start()
+    if settings.DB_REPLICA_URLS:
+        get_replica_set().start()
+    if settings.JOB_WORKERS:
+        job_worker.start()
+    audit_log.start()
     yield
     print("shutting down")
+    await job_worker.stop()
+    await event_bus.stop()
+    if settings.DB_REPLICA_URLS:
+        await get_replica_set().stop()
+    hashing_pool.shutdown()
+    # Запросы уже завершены: остаток журнала аудита пишется до закрытия
+    # пула и не теряется.
+    await audit_log.stop()
+    await dispose_engine()
 
 app = FastAPI(title=settings.APP_TITLE, description=settings.APP_DESCRIPTION,
-              lifespan=lifespan)
+              default_response_class=DefaultResponse, lifespan=lifespan)
+# Последний добавленный middleware - внешний: метрики видят и ответы 429
+# и 503, а ограничение частоты отклоняет вход раньше, чем запрос займёт
+# место арендатора. Повтор чтения после отказа реплики - внутренний и
+# выполняется на уже занятом месте арендатора.
+app.add_middleware(ReplicaFailoverMiddleware)
+app.add_middleware(TenantMiddleware)
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(main_router)
 
 
 def run():
     """Функция программного запуска проекта для poetry."""
+    import uvicorn
+
     uvicorn.run("web.main:app", host="0.0.0.0", port=8000, reload=True)
 
 
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, ConfigDict
+
+
+class AuditEventRead(BaseModel):
+    id: int
+    created_at: datetime
+    actor_id: Optional[int] = None
+    tenant_id: Optional[int] = None
+    action: str
+    entity: str
+    entity_id: Optional[int] = None
+    changes: Dict[str, Any]
+
+    model_config = ConfigDict(from_attributes=True)
@@ -1,13 +1,59 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
+
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ObjectCreate(BaseModel):
-    pass
+    name: str = Field(..., min_length=1, max_length=254)
+    attributes: Dict[str, Any] = Field(default_factory=dict)
 
 
 class ObjectRead(ObjectCreate):
-    pass
+    id: int
+    owner_id: int
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ObjectUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=254)
+    attributes: Optional[Dict[str, Any]] = None
+
+
+class ObjectBatchCreate(ObjectCreate):
+    op: Literal['create']
+
+
+class ObjectBatchUpdate(ObjectUpdate):
+    op: Literal['update']
+    id: int
+
+
+class ObjectBatchDelete(BaseModel):
+    op: Literal['delete']
+    id: int
+
+
+ObjectBatchOperation = Annotated[
+    Union[ObjectBatchCreate, ObjectBatchUpdate, ObjectBatchDelete],
+    Field(discriminator='op')
+]
+
+
+class ObjectBatchResult(BaseModel):
+    row: int
+    op: Optional[str] = None
+    status: int
+    id: Optional[int] = None
+    version: Optional[int] = None
+    detail: Optional[str] = None
 
 
-class ObjectUpdate(ObjectCreate):
-    pass
+class ObjectBatchReport(BaseModel):
+    total: int
+    succeeded: int
+    failed: int
+    results: List[ObjectBatchResult]
@@ -1,7 +1,8 @@
 from typing import Optional
 
 from fastapi_users import schemas
-from pydantic import BaseModel, Field
+from pydantic import (BaseModel, EmailStr, Field, field_validator,
+                      model_validator)
 
 
 class UserFIO(BaseModel):
@@ -20,3 +21,35 @@ class UserCreate(schemas.BaseUserCreate, UserFIO):
 
 class UserUpdate(schemas.BaseUserUpdate, UserFIO):
     firstname: Optional[str] = Field(None, min_length=2, max_length=254)
+
+
+class UserImport(UserFIO):
+    """Строка массового импорта: пароль открытым текстом либо готовый хеш."""
+    email: EmailStr
+    password: Optional[str] = None
+    hashed_password: Optional[str] = None
+    is_active: bool = True
+    is_superuser: bool = False
+    is_verified: bool = False
+
+    @field_validator('email')
+    @classmethod
+    def lower_email(cls, email: str) -> str:
+        # Регистрация сравнивает e-mail без учёта регистра, а уникальный
+        # индекс email - с учётом; импорт хранит их в нижнем регистре.
+        return email.lower()
+
+    @model_validator(mode='after')
+    def check_password_source(self):
+        if (self.password is None) == (self.hashed_password is None):
+            raise ValueError('Нужно указать ровно одно из полей '
+                             'password и hashed_password')
+        return self
+
+
+class UserExport(UserRead):
+    pass
+
+
+class UserExportWithHash(UserExport):
+    hashed_password: str
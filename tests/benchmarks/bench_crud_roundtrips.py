@@ -0,0 +1,114 @@
+"""
+Число обращений к PostgreSQL на одну операцию записи CRUDBase.
+
+    python -m tests.benchmarks.bench_crud_roundtrips
+
+Прежняя реализация (add + commit + refresh, jsonable_encoder, get перед
+update) воспроизведена здесь для сравнения.
+"""
+import asyncio
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from app.core.crud import user_crud
+from app.core.models import User
+from app.schemas.user import UserUpdate
+from tests.benchmarks.common import (RoundTripCounter, make_engine,
+                                     make_session_factory, prepare_schema)
+
+
+def new_user(email: str) -> dict:
+    return dict(email=email, hashed_password='x', firstname='Bench',
+                is_active=True, is_superuser=False, is_verified=False)
+
+
+async def legacy_create(data, session):
+    db_obj = User(**data)
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def legacy_update(db_obj, obj_in, session):
+    obj_data = jsonable_encoder(db_obj)
+    update_data = obj_in.model_dump()
+    for field in obj_data:
+        if field in update_data and update_data[field] is not None:
+            setattr(db_obj, field, update_data[field])
+    session.add(db_obj)
+    await session.commit()
+    await session.refresh(db_obj)
+    return db_obj
+
+
+async def legacy_remove(db_obj, session):
+    await session.delete(db_obj)
+    await session.commit()
+
+
+async def legacy_delete_user(user_id, session):
+    user = await user_crud.get(user_id, session)
+    if user.is_active:
+        await legacy_update(user, UserUpdate(is_active=False), session)
+
+
+async def measure(engine, session_factory, label, operation) -> None:
+    async with session_factory() as session:
+        with RoundTripCounter(engine) as counter:
+            await operation(session)
+    print(f'{label:<34}{counter.count:>12}')
+
+
+async def main() -> None:
+    engine = make_engine()
+    await prepare_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            'DELETE FROM "user" WHERE email LIKE \'%@roundtrip.example\''
+        ))
+    factory = make_session_factory(engine)
+    ids = {}
+
+    async def remember(key, coroutine):
+        ids[key] = (await coroutine).id
+
+    print(f'{"operation":<34}{"round trips":>12}')
+    await measure(engine, factory, 'create (legacy)', lambda s: remember(
+        'legacy', legacy_create(new_user('a@roundtrip.example'), s)))
+    await measure(engine, factory, 'create', lambda s: remember(
+        'new', user_crud.create(new_user('b@roundtrip.example'), s)))
+
+    async def legacy_update_loaded(session):
+        user = await user_crud.get(ids['legacy'], session)
+        await legacy_update(user, UserUpdate(firstname='Changed'), session)
+
+    async def update_loaded(session):
+        user = await user_crud.get(ids['new'], session)
+        await user_crud.update(user, UserUpdate(firstname='Changed'), session)
+
+    await measure(engine, factory, 'get + update (legacy)',
+                  legacy_update_loaded)
+    await measure(engine, factory, 'get + update', update_loaded)
+    await measure(engine, factory, 'update_by_id', lambda s: (
+        user_crud.update_by_id(ids['new'], dict(surname='Bench'), s)))
+    await measure(engine, factory, 'delete_user (legacy)',
+                  lambda s: legacy_delete_user(ids['legacy'], s))
+    await measure(engine, factory, 'delete_user', lambda s: (
+        user_crud.deactivate(ids['new'], s)))
+
+    async def legacy_remove_loaded(session):
+        legacy = await user_crud.get(ids['legacy'], session,
+                                     include_inactive=True)
+        await legacy_remove(legacy, session)
+
+    await measure(engine, factory, 'get + remove (legacy)',
+                  legacy_remove_loaded)
+    await measure(engine, factory, 'remove_by_id',
+                  lambda s: user_crud.remove_by_id(ids['new'], s))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
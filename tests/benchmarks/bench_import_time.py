@@ -0,0 +1,58 @@
+"""
+Время импорта модулей приложения по данным ``python -X importtime``.
+
+    python -m tests.benchmarks.bench_import_time [app.main] [--top 25]
+
+Импорт выполняется в отдельном интерпретаторе, поэтому уже загруженные
+модули текущего процесса на результат не влияют.
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, Tuple
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+
+
+def measure_import(module: str = 'app.main') -> Dict[str, Tuple[int, int]]:
+    """Собственное и накопленное время импорта каждого модуля, мкс."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_DIR, capture_output=True, text=True, check=True,
+    )
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def own_import_us(timings: Dict[str, Tuple[int, int]],
+                  package: str = 'app') -> int:
+    """Собственное время импорта модулей пакета, мкс: без зависимостей."""
+    return sum(self_us for name, (self_us, _) in timings.items()
+               if name == package or name.startswith(f'{package}.'))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('module', nargs='?', default='app.main')
+    parser.add_argument('--top', type=int, default=25)
+    args = parser.parse_args()
+    timings = measure_import(args.module)
+    total_us = timings[args.module][1]
+    own_us = own_import_us(timings)
+    print(f'{args.module}: {total_us / 1000:.1f} мс, из них модули app - '
+          f'{own_us / 1000:.1f} мс ({own_us / total_us:.0%})')
+    print(f'{"собств., мс":>12} {"всего, мс":>10}  модуль')
+    slowest = sorted(timings.items(), key=lambda item: item[1][0],
+                     reverse=True)[:args.top]
+    for name, (self_us, cumulative_us) in slowest:
+        print(f'{self_us / 1000:12.1f} {cumulative_us / 1000:10.1f}  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Сравнение пути чтения списка пользователей: ORM + UserRead против проекции.
+
+Запуск (нужен PostgreSQL, по умолчанию берётся DATABASE_URL из настроек):
+
+    python -m tests.benchmarks.bench_list_read_path --rows 200000
+
+Каждый режим выполняется в отдельном процессе, чтобы пиковый RSS
+не смешивался между ними.
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.crud import user_crud
+from app.core.models import User
+from app.core.projection import Projection
+from app.schemas.user import UserRead
+from tests.benchmarks.common import (make_engine, make_session_factory,
+                                     peak_rss_mb, seed_users)
+
+MODES = ('orm', 'projection')
+
+
+async def read_orm(session) -> int:
+    """Прежний путь: ORM-объекты, dict(), response_model и jsonable_encoder."""
+    users = await user_crud.get_multi(session)
+    payload = json.dumps(jsonable_encoder(
+        [UserRead.model_validate(user) for user in users]
+    )).encode()
+    return len(payload)
+
+
+async def read_projection(session) -> int:
+    """Новый путь: только нужные колонки, кортежи и сразу JSON-байты."""
+    projection = Projection(User, UserRead)
+    rows = await user_crud.get_rows(session, projection)
+    return len(projection.to_json(rows))
+
+
+async def run_mode(mode: str) -> dict:
+    engine = make_engine()
+    session_factory = make_session_factory(engine)
+    reader = read_orm if mode == 'orm' else read_projection
+    async with session_factory() as session:
+        start = time.perf_counter()
+        size = await reader(session)
+        elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return dict(mode=mode, seconds=elapsed, bytes=size,
+                peak_rss_mb=peak_rss_mb())
+
+
+def run_in_subprocess(mode: str, rows: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, '-m', __spec__.name, '--mode', mode],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['rows'] = rows
+    result['rows_per_sec'] = rows / result['seconds']
+    return result
+
+
+def report(results: List[dict]) -> None:
+    print(f'{"mode":<12}{"rows/sec":>14}{"seconds":>10}{"peak RSS, MB":>15}')
+    for result in results:
+        print(f'{result["mode"]:<12}{result["rows_per_sec"]:>14.0f}'
+              f'{result["seconds"]:>10.3f}{result["peak_rss_mb"]:>15.1f}')
+
+
+async def seed(rows: int) -> None:
+    engine = make_engine()
+    await seed_users(engine, rows)
+    await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--mode', choices=MODES)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(asyncio.run(run_mode(args.mode))))
+        return
+    if not args.no_seed:
+        asyncio.run(seed(args.rows))
+    report([run_in_subprocess(mode, args.rows) for mode in MODES])
+
+
+if __name__ == '__main__':
+    main()
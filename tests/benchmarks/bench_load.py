@@ -0,0 +1,369 @@
+"""
+Нагрузочные сценарии API и сравнение с сохранённым baseline.
+
+    python -m tests.benchmarks.bench_load seed --users 10000 --objects 100000
+    python -m tests.benchmarks.bench_load run --target asgi
+    python -m tests.benchmarks.bench_load run --target uvicorn --workers 2
+    python -m tests.benchmarks.bench_load run --save-baseline
+
+Сценарии: login_storm (вход случайных пользователей), list_users (страницы
+/users с разных курсоров) и object_crud (60% чтений, 20% создания, по 10%
+изменения и удаления объектов). Каждый идёт --seconds секунд при
+--concurrency конкурентных клиентах. Записываются req/s, p50/p95/p99 и
+число запросов к БД на HTTP-запрос - по приросту гистограммы
+http_request_db_queries на /metrics за время сценария.
+
+Цели: asgi - приложение в этом же процессе через httpx.ASGITransport (без
+сети и lifespan); uvicorn - отдельный процесс uvicorn, запросы по HTTP.
+При нескольких воркерах /metrics отдаёт счётчики одного из них, поэтому
+запросы к БД оцениваются по его доле трафика.
+
+Результат сравнивается с tests/benchmarks/baseline.json. Код выхода 1,
+если req/s упал, а p95, p99 или запросы к БД выросли больше --tolerance.
+Сравнивать имеет смысл прогоны на одной машине с одинаковыми параметрами.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from httpx import ASGITransport, AsyncClient, HTTPError, Limits, Response
+from sqlalchemy import func, insert, select, text
+
+from app.core.config import settings
+from app.core.hashing import hash_password, hashing_pool
+from app.core.metrics import instrument_engine
+from app.core.models import SomeModel, User
+from app.core.pagination import encode_cursor
+from tests.benchmarks.common import (BENCH_DATABASE_URL, make_engine,
+                                     make_session_factory,
+                                     override_app_session, percentile,
+                                     seed_objects, seed_users)
+
+BASELINE = Path(__file__).with_name('baseline.json')
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'admin@bench.example'
+LOAD_NAME = 'load'
+# Метрика и признак "чем больше, тем лучше" для сравнения с baseline.
+COMPARED = {'rps': True, 'p95_ms': False, 'p99_ms': False,
+            'queries_per_request': False}
+
+Step = Callable[[AsyncClient, dict, random.Random], Awaitable[Response]]
+
+
+async def seed(engine, users: int, objects: int) -> None:
+    """Пересоздаёт пользователей (с общим паролем) и объекты."""
+    hashed_password = hash_password(PASSWORD)
+    await seed_users(engine, users, hashed_password)
+    async with engine.begin() as conn:
+        await conn.execute(insert(User), [dict(
+            email=ADMIN_EMAIL, hashed_password=hashed_password,
+            firstname='Admin', is_active=True, is_superuser=True,
+            is_verified=True,
+        )])
+    await seed_objects(engine, objects, users)
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE "user"'))
+
+
+async def dataset(engine) -> dict:
+    """Размер засеянных данных: из него сценарии выбирают случайные id."""
+    async with make_session_factory(engine)() as session:
+        users = await session.scalar(
+            select(func.count()).where(User.is_superuser.is_(False))
+        )
+        # Засеянные объекты занимают id с 1 подряд; созданные сценарием
+        # (name='load') могли быть удалены, поэтому в выборку не идут.
+        objects = await session.scalar(
+            select(func.count()).where(SomeModel.name != LOAD_NAME)
+        )
+    if not users or not objects:
+        raise SystemExit('Нет данных: сначала выполните seed')
+    return dict(users=users, objects=objects)
+
+
+async def login_storm(client: AsyncClient, state: dict,
+                      rng: random.Random) -> Response:
+    email = f'user{rng.randint(0, state["users"] - 1)}@bench.example'
+    return await client.post('/auth/jwt/login',
+                             data=dict(username=email, password=PASSWORD))
+
+
+async def list_users(client: AsyncClient, state: dict,
+                     rng: random.Random) -> Response:
+    after = encode_cursor([rng.randint(0, state['users'])])
+    return await client.get('/users', params=dict(limit=100, after=after),
+                            headers=state['headers'])
+
+
+async def object_crud(client: AsyncClient, state: dict,
+                      rng: random.Random) -> Response:
+    headers, created = state['headers'], state['created']
+    roll = rng.random()
+    if roll < 0.6:
+        return await client.get(
+            f'/objects/{rng.randint(1, state["objects"])}', headers=headers
+        )
+    if roll < 0.7:
+        return await client.put(
+            f'/objects/{rng.randint(1, state["objects"])}',
+            json=dict(attributes={'size': rng.randint(0, 99)}),
+            headers=headers
+        )
+    if roll < 0.8 and created:
+        return await client.delete(f'/objects/{created.pop()}',
+                                   headers=headers)
+    response = await client.post(
+        '/objects', json=dict(name=LOAD_NAME, attributes={'bench': True}),
+        headers=headers
+    )
+    if response.status_code == 201:
+        created.append(response.json()['id'])
+    return response
+
+
+SCENARIOS: Dict[str, Step] = {
+    'login_storm': login_storm,
+    'list_users': list_users,
+    'object_crud': object_crud,
+}
+
+
+def db_queries(metrics: str) -> Tuple[float, float]:
+    """Сумма и число наблюдений http_request_db_queries без /metrics."""
+    total = count = 0.0
+    for line in metrics.splitlines():
+        if 'route="/metrics"' in line:
+            continue
+        if line.startswith('http_request_db_queries_sum'):
+            total += float(line.rsplit(' ', 1)[1])
+        elif line.startswith('http_request_db_queries_count'):
+            count += float(line.rsplit(' ', 1)[1])
+    return total, count
+
+
+async def scrape(client: AsyncClient) -> Tuple[float, float]:
+    return db_queries((await client.get('/metrics')).text)
+
+
+async def drive(client: AsyncClient, step: Step, state: dict,
+                seconds: float, concurrency: int) -> Tuple[list, Counter]:
+    latencies, statuses = [], Counter()
+    deadline = time.perf_counter() + seconds
+
+    async def worker(number: int):
+        rng = random.Random(number)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await step(client, state, rng)
+            except HTTPError:
+                statuses['error'] += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            statuses[response.status_code] += 1
+
+    await asyncio.gather(*(worker(number) for number in range(concurrency)))
+    return latencies, statuses
+
+
+async def run_scenario(client: AsyncClient, step: Step, state: dict,
+                       seconds: float, concurrency: int,
+                       warmup: float) -> dict:
+    if warmup:
+        await drive(client, step, state, warmup, concurrency)
+    queries_before, requests_before = await scrape(client)
+    start = time.perf_counter()
+    latencies, statuses = await drive(client, step, state, seconds,
+                                      concurrency)
+    elapsed = time.perf_counter() - start
+    queries_after, requests_after = await scrape(client)
+    observed = requests_after - requests_before
+    return dict(
+        requests=len(latencies),
+        rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 0.5), 2),
+        p95_ms=round(percentile(latencies, 0.95), 2),
+        p99_ms=round(percentile(latencies, 0.99), 2),
+        errors=sum(count for status, count in statuses.items()
+                   if status == 'error' or status >= 400),
+        queries_per_request=round(
+            (queries_after - queries_before) / observed, 2
+        ) if observed else None,
+    )
+
+
+async def authorize(client: AsyncClient) -> dict:
+    response = await client.post(
+        '/auth/jwt/login', data=dict(username=ADMIN_EMAIL, password=PASSWORD)
+    )
+    response.raise_for_status()
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+@asynccontextmanager
+async def asgi_client(engine, concurrency: int):
+    from app.main import app
+
+    # Лимит частоты входа иначе превратит login_storm в поток 429.
+    settings.RATE_LIMIT_ENABLED = False
+    instrument_engine(engine.sync_engine)
+    override_app_session(app, make_session_factory(engine))
+    try:
+        async with AsyncClient(transport=ASGITransport(app=app),
+                               base_url='http://bench') as client:
+            yield client
+    finally:
+        hashing_pool.shutdown()
+
+
+@asynccontextmanager
+async def uvicorn_client(engine, concurrency: int, workers: int = 1,
+                         port: int = 8765, startup_timeout: float = 30):
+    env = dict(os.environ, DATABASE_URL=BENCH_DATABASE_URL,
+               STARTUP_BOOTSTRAP='skip', RATE_LIMIT_ENABLED='false')
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'app.main:app', '--port',
+         str(port), '--workers', str(workers), '--log-level', 'warning'],
+        env=env,
+    )
+    try:
+        async with AsyncClient(
+            base_url=f'http://127.0.0.1:{port}',
+            limits=Limits(max_connections=concurrency)
+        ) as client:
+            deadline = time.monotonic() + startup_timeout
+            while True:
+                if server.poll() is not None:
+                    raise SystemExit('uvicorn завершился при запуске')
+                try:
+                    await client.get('/metrics')
+                    break
+                except HTTPError:
+                    if time.monotonic() > deadline:
+                        raise
+                    await asyncio.sleep(0.2)
+            yield client
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> bool:
+    """Печатает разницу с baseline; True, если есть регрессия."""
+    for option in ('target', 'concurrency', 'seconds', 'dataset'):
+        if results.get(option) != baseline.get(option):
+            print(f'Внимание: {option} = {results.get(option)}, '
+                  f'в baseline {baseline.get(option)}')
+    regressed = False
+    print(f'{"scenario":<14}{"metric":<22}{"baseline":>10}{"now":>10}'
+          f'{"delta":>9}')
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            print(f'{name:<14}нет в baseline')
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if old:
+                delta = (new - old) / old
+            else:
+                delta = 0.0 if new == old else float('inf')
+            worse = -delta if higher_is_better else delta
+            mark = '  РЕГРЕССИЯ' if worse > tolerance else ''
+            regressed |= bool(mark)
+            print(f'{name:<14}{metric:<22}{old:>10.2f}{new:>10.2f}'
+                  f'{delta:>+9.1%}{mark}')
+    return regressed
+
+
+def report(results: dict) -> None:
+    print(f'{"scenario":<14}{"req/s":>9}{"p50":>9}{"p95":>9}{"p99":>9}'
+          f'{"errors":>8}{"q/req":>7}')
+    for name, result in results['scenarios'].items():
+        queries = result['queries_per_request']
+        print(f'{name:<14}{result["rps"]:>9.1f}{result["p50_ms"]:>9.2f}'
+              f'{result["p95_ms"]:>9.2f}{result["p99_ms"]:>9.2f}'
+              f'{result["errors"]:>8}'
+              f'{"-" if queries is None else f"{queries:.1f}":>7}')
+
+
+async def run(args) -> dict:
+    engine = make_engine()
+    state = await dataset(engine)
+    target = (asgi_client(engine, args.concurrency) if args.target == 'asgi'
+              else uvicorn_client(engine, args.concurrency, args.workers,
+                                  args.port))
+    results = dict(target=args.target, concurrency=args.concurrency,
+                   seconds=args.seconds, dataset=dict(state), scenarios={})
+    async with target as client:
+        state.update(headers=await authorize(client), created=[])
+        for name in args.scenario or SCENARIOS:
+            results['scenarios'][name] = await run_scenario(
+                client, SCENARIOS[name], state, args.seconds,
+                args.concurrency, args.warmup
+            )
+    await engine.dispose()
+    return results
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    commands = parser.add_subparsers(dest='command', required=True)
+    seeding = commands.add_parser('seed', help='заполнить бенчмарочную БД')
+    seeding.add_argument('--users', type=int, default=10_000)
+    seeding.add_argument('--objects', type=int, default=100_000)
+    running = commands.add_parser('run', help='прогнать сценарии')
+    running.add_argument('--target', choices=('asgi', 'uvicorn'),
+                         default='asgi')
+    running.add_argument('--scenario', action='append',
+                         choices=tuple(SCENARIOS))
+    running.add_argument('--seconds', type=float, default=10)
+    running.add_argument('--warmup', type=float, default=1)
+    running.add_argument('--concurrency', type=int, default=16)
+    running.add_argument('--workers', type=int, default=1)
+    running.add_argument('--port', type=int, default=8765)
+    running.add_argument('--baseline', type=Path, default=BASELINE)
+    running.add_argument('--tolerance', type=float, default=0.1)
+    running.add_argument('--output', type=Path)
+    running.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.command == 'seed':
+        async def seed_and_dispose():
+            engine = make_engine()
+            await seed(engine, args.users, args.objects)
+            await engine.dispose()
+
+        asyncio.run(seed_and_dispose())
+        return 0
+    results = asyncio.run(run(args))
+    report(results)
+    text_results = json.dumps(results, indent=2, ensure_ascii=False) + '\n'
+    if args.output:
+        args.output.write_text(text_results)
+    if args.save_baseline:
+        args.baseline.write_text(text_results)
+        return 0
+    if not args.baseline.exists():
+        print(f'{args.baseline} не найден: сравнивать не с чем')
+        return 0
+    baseline = json.loads(args.baseline.read_text())
+    return 1 if compare(results, baseline, args.tolerance) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Задержка GET /objects во время шторма логинов.
+
+    python -m tests.benchmarks.bench_login_storm --executor thread
+    python -m tests.benchmarks.bench_login_storm --executor inline
+
+Сначала меряется задержка GET /objects без нагрузки, затем - пока
+`--storm` конкурентных клиентов непрерывно логинятся. В режиме 'thread'
+p99 должен оставаться близким к спокойному, в 'inline' - заметно расти.
+"""
+import argparse
+import asyncio
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert, text
+
+from app.core.config import settings
+from app.core.hashing import hash_password, hashing_pool
+from app.core.models import User
+from app.main import app
+from tests.benchmarks.common import (make_engine, make_session_factory,
+                                     override_app_session, percentile,
+                                     prepare_schema)
+
+EMAIL = 'storm@bench.example'
+PASSWORD = 'storm-password'
+
+
+async def seed_login_user(engine) -> None:
+    await prepare_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text('DELETE FROM "user" WHERE email = :email'),
+                           dict(email=EMAIL))
+        await conn.execute(insert(User), [dict(
+            email=EMAIL, hashed_password=hash_password(PASSWORD),
+            firstname='Storm', is_active=True, is_superuser=False,
+            is_verified=False,
+        )])
+
+
+async def login(client: AsyncClient) -> dict:
+    """Заголовки с токеном: GET /objects доступен только после входа."""
+    response = await client.post(
+        '/auth/jwt/login', data=dict(username=EMAIL, password=PASSWORD)
+    )
+    response.raise_for_status()
+    return {'Authorization': f'Bearer {response.json()["access_token"]}'}
+
+
+async def probe(client: AsyncClient, headers: dict, seconds: float) -> list:
+    """Последовательные GET /objects; возвращает задержки в миллисекундах."""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        await client.get('/objects', headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def storm(client: AsyncClient, stop: asyncio.Event, counter: dict):
+    while not stop.is_set():
+        response = await client.post(
+            '/auth/jwt/login', data=dict(username=EMAIL, password=PASSWORD)
+        )
+        counter[response.status_code] = counter.get(response.status_code,
+                                                    0) + 1
+
+
+def describe(name: str, latencies: list) -> None:
+    print(f'{name:<8} n={len(latencies):<6} '
+          f'p50={percentile(latencies, 0.5):7.2f}ms '
+          f'p99={percentile(latencies, 0.99):7.2f}ms')
+
+
+async def main(executor: str, storm_size: int, seconds: float) -> None:
+    hashing_pool.kind = executor
+    # Все клиенты входят под одним адресом с одного IP: лимит частоты входа
+    # иначе превратит шторм в поток 429.
+    settings.RATE_LIMIT_ENABLED = False
+    engine = make_engine()
+    await seed_login_user(engine)
+    override_app_session(app, make_session_factory(engine))
+    async with AsyncClient(transport=ASGITransport(app=app),
+                           base_url='http://bench') as client:
+        headers = await login(client)
+        describe('quiet', await probe(client, headers, seconds))
+        stop, counter = asyncio.Event(), {}
+        stormers = [asyncio.create_task(storm(client, stop, counter))
+                    for _ in range(storm_size)]
+        describe('storm', await probe(client, headers, seconds))
+        stop.set()
+        await asyncio.gather(*stormers)
+    print(f'login responses by status: {counter}')
+    hashing_pool.shutdown()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--executor', default='thread',
+                        choices=('thread', 'process', 'inline'))
+    parser.add_argument('--storm', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.executor, args.storm, args.seconds))
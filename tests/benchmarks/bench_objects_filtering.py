@@ -0,0 +1,95 @@
+"""
+Фильтрация и сортировка объектов на большом объёме.
+
+    python -m tests.benchmarks.bench_objects_filtering --objects 1000000
+
+Заполняет somemodel средствами generate_series, затем замеряет первую
+страницу (limit 100) для каждого фильтра и печатает план запроса, чтобы
+было видно, какой индекс используется.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.crud import some_model_crud
+from app.core.models import SomeModel
+from app.core.projection import Projection
+from app.schemas.object import ObjectRead
+from tests.benchmarks.common import (Explain, make_engine,
+                                     make_session_factory, seed_objects,
+                                     seed_users)
+
+REPEATS = 20
+PROJECTION = Projection(SomeModel, ObjectRead)
+
+
+def scenarios():
+    now = datetime.now(timezone.utc)
+    return {
+        'owner': dict(criteria=[SomeModel.owner_id == 17]),
+        'owner, newest first': dict(criteria=[SomeModel.owner_id == 17],
+                                    sort='created_at', descending=True),
+        'attribute': dict(
+            criteria=[SomeModel.attributes.contains({'tag': 't42'})]
+        ),
+        'owner + attribute': dict(criteria=[
+            SomeModel.owner_id == 17,
+            SomeModel.attributes.contains({'color': 'blue'}),
+        ]),
+        'time range': dict(criteria=[
+            SomeModel.created_at >= now - timedelta(days=3),
+            SomeModel.created_at < now - timedelta(days=2),
+        ], sort='created_at'),
+        'sorted by name': dict(sort='name'),
+    }
+
+
+async def seed(engine, objects: int, owners: int) -> None:
+    await seed_users(engine, owners)
+    await seed_objects(engine, objects, owners)
+
+
+async def explain(session, scenario: dict) -> str:
+    query = some_model_crud._keyset_query(
+        100, None, PROJECTION, scenario.get('criteria', ()),
+        scenario.get('sort', 'id'), scenario.get('descending', False)
+    )
+    plan = await session.execute(Explain(query))
+    return '\n'.join(f'    {line}' for line in plan.scalars())
+
+
+async def measure(session, scenario: dict) -> list:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        await some_model_crud.get_rows(
+            session, PROJECTION, 100, None, *scenario.get('criteria', ()),
+            sort=scenario.get('sort', 'id'),
+            descending=scenario.get('descending', False),
+        )
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main(objects: int, owners: int, no_seed: bool) -> None:
+    engine = make_engine()
+    if not no_seed:
+        await seed(engine, objects, owners)
+    async with make_session_factory(engine)() as session:
+        for name, scenario in scenarios().items():
+            timings = await measure(session, scenario)
+            print(f'{name:<22} median={statistics.median(timings):6.2f}ms '
+                  f'max={max(timings):6.2f}ms')
+            print(await explain(session, scenario))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--objects', type=int, default=1_000_000)
+    parser.add_argument('--owners', type=int, default=1000)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+    asyncio.run(main(args.objects, args.owners, args.no_seed))
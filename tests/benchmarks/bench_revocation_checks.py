@@ -0,0 +1,60 @@
+"""
+Пропускная способность проверки отзыва токенов и расход памяти денайлиста.
+
+    python -m tests.benchmarks.bench_revocation_checks [--tokens 100000]
+
+БД не нужна: замеряется только RevocationStore, через который проходит
+каждый аутентифицированный запрос.
+"""
+import argparse
+import time
+import tracemalloc
+from uuid import uuid4
+
+from app.core.revocation import RevocationStore
+
+CHECKS = 1_000_000
+
+
+def fill(tokens: int, users: int) -> RevocationStore:
+    store = RevocationStore()
+    now = time.time()
+    for _ in range(tokens):
+        store.revoke_token(uuid4().hex, now + 3600)
+    for user_id in range(users):
+        store.revoke_user(user_id, now)
+    return store
+
+
+def checks_per_second(store: RevocationStore, jti, user_id, issued_at) -> int:
+    is_revoked = store.is_revoked
+    start = time.perf_counter()
+    for _ in range(CHECKS):
+        is_revoked(jti, user_id, issued_at)
+    return int(CHECKS / (time.perf_counter() - start))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tokens', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=10_000)
+    args = parser.parse_args()
+    tracemalloc.start()
+    store = fill(args.tokens, args.users)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{args.tokens} jti + {args.users} отсечек: '
+          f'{memory / 2 ** 20:.1f} МБ, '
+          f'{memory / max(len(store), 1):.0f} байт на запись')
+    revoked_jti = next(iter(store.tokens))
+    cases = {
+        'действующий токен': (uuid4().hex, args.users + 1, time.time()),
+        'отозванный jti': (revoked_jti, args.users + 1, time.time()),
+        'отсечка пользователя': (uuid4().hex, 0, time.time() - 60),
+    }
+    for label, arguments in cases.items():
+        print(f'{label}: {checks_per_second(store, *arguments):,} проверок/с')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Сериализация списка UserRead: путь response_model против быстрого пути.
+
+    python -m tests.benchmarks.bench_serialization [--rows 1000 10000 100000]
+
+БД не нужна: строки синтезируются в памяти. Режимы:
+
+- response_model - как FastAPI с response_model=List[UserRead]: валидация
+  ORM-объектов, сериализация в mode='json' и json.dumps;
+- type_adapter - заранее собранный TypeAdapter: валидация и dump_json;
+- projection - кортежи колонок проекции и сразу orjson (page_response).
+
+Код выхода 1, если быстрый путь оказался медленнее response_model.
+"""
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.core.models import User
+from app.core.projection import Projection
+from app.schemas.user import UserRead
+
+USERS_ADAPTER = TypeAdapter(List[UserRead])
+PROJECTION = Projection(User, UserRead)
+
+
+def make_users(count: int) -> List[User]:
+    return [User(id=i, email=f'user{i}@bench.example',
+                 hashed_password='x' * 60, firstname=f'Имя{i}',
+                 surname='Фамилия', patronymic='Отчество', is_active=True,
+                 is_superuser=False, is_verified=False)
+            for i in range(count)]
+
+
+def make_rows(users: List[User]) -> List[tuple]:
+    return [tuple(getattr(user, column.name) for column in PROJECTION.columns)
+            for user in users]
+
+
+def via_response_model(users: List[User], rows: List[tuple]) -> bytes:
+    validated = USERS_ADAPTER.validate_python(users, from_attributes=True)
+    return json.dumps(USERS_ADAPTER.dump_python(validated, mode='json'),
+                      ensure_ascii=False).encode()
+
+
+def via_type_adapter(users: List[User], rows: List[tuple]) -> bytes:
+    return USERS_ADAPTER.dump_json(
+        USERS_ADAPTER.validate_python(users, from_attributes=True)
+    )
+
+
+def via_projection(users: List[User], rows: List[tuple]) -> bytes:
+    return PROJECTION.to_json(rows)
+
+
+MODES: Dict[str, Callable[[List[User], List[tuple]], bytes]] = {
+    'response_model': via_response_model,
+    'type_adapter': via_type_adapter,
+    'projection': via_projection,
+}
+
+
+def best_of(serialize, users, rows, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        serialize(users, rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[1_000, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    print(f'{"rows":>8}{"mode":>16}{"rows/sec":>14}{"ms":>10}')
+    regressed = False
+    for count in args.rows:
+        users = make_users(count)
+        rows = make_rows(users)
+        results = {mode: best_of(serialize, users, rows, args.repeat)
+                   for mode, serialize in MODES.items()}
+        for mode, seconds in results.items():
+            print(f'{count:>8}{mode:>16}{count / seconds:>14.0f}'
+                  f'{seconds * 1000:>10.1f}')
+        regressed |= results['projection'] > results['response_model']
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
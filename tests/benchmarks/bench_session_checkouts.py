@@ -0,0 +1,102 @@
+"""
+Соединения из пула и обращения к серверу на один HTTP-запрос.
+
+    python -m tests.benchmarks.bench_load seed --users 1000 --objects 1000
+    python -m tests.benchmarks.bench_session_checkouts
+
+Каждый запрос выполняется --repeat раз в этом же процессе (httpx +
+ASGITransport), и печатается среднее число checkout из пула и обращений
+к серверу (RoundTripCounter) на запрос. Чтобы сравнить до и после
+изменения, скрипт запускают на обеих ревизиях против одной БД.
+"""
+import argparse
+import asyncio
+from typing import Awaitable, Callable, List, Tuple
+
+from httpx import AsyncClient, Response
+from sqlalchemy import event, func, select
+
+from app.core.models import SomeModel, User
+from app.core.user import user_cache
+from tests.benchmarks.bench_load import asgi_client, authorize
+from tests.benchmarks.common import (RoundTripCounter, make_engine,
+                                     make_session_factory)
+
+Call = Callable[[AsyncClient, dict], Awaitable[Response]]
+
+
+class CheckoutCounter:
+    """Считает соединения, выданные пулом движка."""
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _increment(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'checkout', self._increment)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'checkout', self._increment)
+
+
+def cases(object_id: int, user_id: int) -> List[Tuple[str, bool, Call]]:
+    """(название, сбрасывать ли кэш пользователей, запрос)."""
+    return [
+        ('GET /users/me (кэш)', False,
+         lambda c, h: c.get('/users/me', headers=h)),
+        ('GET /users/me (промах кэша)', True,
+         lambda c, h: c.get('/users/me', headers=h)),
+        ('GET /objects/{id}', False,
+         lambda c, h: c.get(f'/objects/{object_id}', headers=h)),
+        ('GET /users', False,
+         lambda c, h: c.get('/users', params=dict(limit=100), headers=h)),
+        ('POST /objects', False,
+         lambda c, h: c.post('/objects', json=dict(name='checkout'),
+                             headers=h)),
+        ('PUT /objects/{id}', False,
+         lambda c, h: c.put(f'/objects/{object_id}',
+                            json=dict(attributes={'bench': 1}), headers=h)),
+        ('PATCH /users/{id}', False,
+         lambda c, h: c.patch(f'/users/{user_id}',
+                              json=dict(surname='Checkout'), headers=h)),
+        ('DELETE /users/{id}', False,
+         lambda c, h: c.delete(f'/users/{user_id}', headers=h)),
+    ]
+
+
+async def main(repeat: int) -> None:
+    engine = make_engine()
+    async with make_session_factory(engine)() as session:
+        object_id = await session.scalar(select(func.min(SomeModel.id)))
+        user_id = await session.scalar(
+            select(func.max(User.id)).where(User.is_superuser.is_(False))
+        )
+    if object_id is None or user_id is None:
+        raise SystemExit('Нет данных: сначала выполните bench_load seed')
+    async with asgi_client(engine, 1) as client:
+        headers = await authorize(client)
+        print(f'{"запрос":<30}{"checkout":>10}{"обращений":>11}')
+        for name, cold, call in cases(object_id, user_id):
+            checkouts = round_trips = 0
+            for _ in range(repeat):
+                if cold:
+                    user_cache.clear()
+                with CheckoutCounter(engine) as pool, \
+                        RoundTripCounter(engine) as server:
+                    response = await call(client, headers)
+                response.raise_for_status()
+                checkouts += pool.count
+                round_trips += server.count
+            print(f'{name:<30}{checkouts / repeat:>10.2f}'
+                  f'{round_trips / repeat:>11.2f}')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args().repeat))
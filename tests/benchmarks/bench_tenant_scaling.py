@@ -0,0 +1,157 @@
+"""
+Задержка запросов одного арендатора при росте числа арендаторов.
+
+    python -m tests.benchmarks.bench_tenant_scaling --tenants 1 10 100 1000
+
+Для каждого числа арендаторов таблицы user и somemodel заполняются
+заново: у каждого арендатора --users-per-tenant пользователей и
+--objects-per-tenant объектов, так что общий объём растёт вместе с числом
+арендаторов, а объём одного арендатора - нет. Затем от имени нескольких
+арендаторов замеряются первая страница списков (limit 100) через
+CRUDBase с условием на current_tenant. Если секционирование и индексы
+по tenant_id работают, медиана не растёт вместе с таблицей; план
+запроса для последнего прогона показывает, что читается одна секция.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from sqlalchemy import Integer, bindparam, text
+
+from app.core.crud import some_model_crud, user_crud
+from app.core.models import DEFAULT_TENANT_ID, SomeModel, User
+from app.core.projection import Projection
+from app.core.tenancy import current_tenant
+from app.schemas.object import ObjectRead
+from app.schemas.user import UserRead
+from tests.benchmarks.common import (Explain, make_engine,
+                                     make_session_factory, percentile,
+                                     prepare_schema)
+
+REPEATS = 20
+SAMPLED_TENANTS = 10
+OBJECTS = Projection(SomeModel, ObjectRead)
+USERS = Projection(User, UserRead)
+# asyncpg не выводит тип параметра в арифметике, поэтому он задан явно.
+SEED_TENANTS = text('''
+    INSERT INTO tenant (id, name)
+    SELECT g, 'bench ' || g FROM generate_series(1, :tenants) AS g
+    ON CONFLICT (id) DO NOTHING
+''').bindparams(bindparam('tenants', type_=Integer))
+SEED_USERS = text('''
+    INSERT INTO "user" (tenant_id, email, hashed_password, firstname,
+                        is_active, is_superuser, is_verified)
+    SELECT 1 + (g - 1) / :per_tenant, 'user' || g || '@bench.example',
+           repeat('x', 60), 'Имя' || g, true, false, false
+    FROM generate_series(1, :tenants * :per_tenant) AS g
+''').bindparams(bindparam('tenants', type_=Integer),
+                bindparam('per_tenant', type_=Integer))
+# Пользователь g принадлежит арендатору 1 + (g - 1) / users_per_tenant,
+# поэтому владелец объекта выбирается среди пользователей его арендатора.
+SEED_OBJECTS = text('''
+    INSERT INTO somemodel (tenant_id, owner_id, name, attributes,
+                           created_at, updated_at)
+    SELECT t, (t - 1) * :users + 1 + g % :users, 'object ' || g,
+           jsonb_build_object('size', g % 100),
+           now() - make_interval(secs => g), now() - make_interval(secs => g)
+    FROM generate_series(1, :tenants * :objects) AS g,
+         LATERAL (SELECT 1 + (g - 1) / :objects AS t) AS tenant
+''').bindparams(bindparam('tenants', type_=Integer),
+                bindparam('users', type_=Integer),
+                bindparam('objects', type_=Integer))
+
+
+def scenarios():
+    return {
+        'objects, newest first': (some_model_crud, OBJECTS,
+                                  dict(sort='created_at', descending=True)),
+        'objects by id': (some_model_crud, OBJECTS, dict()),
+        'users by id': (user_crud, USERS, dict()),
+    }
+
+
+async def seed(engine, tenants: int, users: int, objects: int) -> None:
+    await prepare_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text('TRUNCATE TABLE somemodel, "user" '
+                                'RESTART IDENTITY CASCADE'))
+        await conn.execute(text('DELETE FROM tenant WHERE id <> :id'),
+                           dict(id=DEFAULT_TENANT_ID))
+        await conn.execute(SEED_TENANTS, dict(tenants=tenants))
+        await conn.execute(text(
+            "SELECT setval(pg_get_serial_sequence('tenant', 'id'), "
+            "(SELECT max(id) FROM tenant))"
+        ))
+        await conn.execute(SEED_USERS, dict(tenants=tenants,
+                                            per_tenant=users))
+        await conn.execute(SEED_OBJECTS, dict(tenants=tenants, users=users,
+                                              objects=objects))
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE somemodel, "user"'))
+
+
+async def measure(session, tenants: int) -> dict:
+    sampled = random.sample(range(1, tenants + 1),
+                            min(tenants, SAMPLED_TENANTS))
+    timings = {name: [] for name in scenarios()}
+    for tenant_id in sampled:
+        reset = current_tenant.set(tenant_id)
+        try:
+            for name, (crud, projection, options) in scenarios().items():
+                for _ in range(REPEATS):
+                    start = time.perf_counter()
+                    await crud.get_rows(session, projection, 100, **options)
+                    timings[name].append(
+                        (time.perf_counter() - start) * 1000
+                    )
+        finally:
+            current_tenant.reset(reset)
+    return timings
+
+
+async def explain(session, tenant_id: int) -> str:
+    reset = current_tenant.set(tenant_id)
+    try:
+        query = some_model_crud._keyset_query(
+            100, None, OBJECTS, sort='created_at', descending=True
+        )
+        plan = await session.execute(Explain(query))
+    finally:
+        current_tenant.reset(reset)
+    return '\n'.join(f'    {line}' for line in plan.scalars())
+
+
+async def main(tenant_counts, users: int, objects: int) -> None:
+    engine = make_engine()
+    results = {}
+    for tenants in tenant_counts:
+        start = time.perf_counter()
+        await seed(engine, tenants, users, objects)
+        print(f'{tenants} арендаторов: данные за '
+              f'{time.perf_counter() - start:.1f} с')
+        async with make_session_factory(engine)() as session:
+            results[tenants] = await measure(session, tenants)
+            if tenants == tenant_counts[-1]:
+                print(await explain(session, tenants))
+    await engine.dispose()
+    print(f'{"запрос":<24}{"арендаторов":>12}{"медиана, мс":>13}'
+          f'{"p95, мс":>9}')
+    for name in scenarios():
+        for tenants, timings in results.items():
+            print(f'{name:<24}{tenants:>12}'
+                  f'{statistics.median(timings[name]):>13.2f}'
+                  f'{percentile(timings[name], 0.95):>9.2f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--tenants', type=int, nargs='+',
+                        default=[1, 10, 100, 1000])
+    parser.add_argument('--users-per-tenant', type=int, default=10)
+    parser.add_argument('--objects-per-tenant', type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(main(args.tenants, args.users_per_tenant,
+                     args.objects_per_tenant))
@@ -0,0 +1,103 @@
+"""
+Поиск пользователей по ФИО и префиксу e-mail на большом объёме.
+
+    python -m tests.benchmarks.bench_user_search --users 1000000
+
+Заполняет user средствами generate_series, замеряет первую страницу
+GET /users/search для каждого сценария и печатает план запроса. Код
+выхода 1, если хотя бы один сценарий читает таблицу полным просмотром.
+Без pg_trgm на сервере условие по ФИО индексом не покрыто, и полный
+просмотр неизбежен - тогда планы только печатаются.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.core.models import User
+from app.core.projection import Projection
+from app.core.search import has_trigram, search_query
+from app.schemas.user import UserRead
+from tests.benchmarks.common import (Explain, make_engine,
+                                     make_session_factory, prepare_schema)
+
+REPEATS = 20
+LIMIT = 20
+PROJECTION = Projection(User, UserRead)
+SEED_USERS = text('''
+    INSERT INTO "user" (email, hashed_password, firstname, surname,
+                        patronymic, is_active, is_superuser, is_verified)
+    SELECT 'user' || g || '@mail' || g % 50 || '.example',
+           'x',
+           (ARRAY['Иван', 'Пётр', 'Анна', 'Мария', 'Сергей', 'Ольга',
+                  'Дмитрий', 'Елена', 'Алексей', 'Наталья'])[1 + g % 10],
+           (ARRAY['Иванов', 'Смирнов', 'Кузнецов', 'Попов', 'Васильев',
+                  'Петров', 'Соколов', 'Михайлов', 'Новиков', 'Фёдоров',
+                  'Морозов', 'Волков', 'Алексеев', 'Лебедев', 'Семёнов',
+                  'Егоров', 'Павлов', 'Козлов', 'Степанов', 'Николаев'])
+               [1 + g / 10 % 20] || (g / 200 % 500),
+           (ARRAY['Иванович', 'Петрович', 'Сергеевич'])[1 + g % 3],
+           true, false, false
+    FROM generate_series(1, :count) AS g
+''')
+SCENARIOS = {
+    'ФИО': 'Кузнецов123',
+    'ФИО с опечаткой': 'Кузнецв123',
+    'префикс e-mail': 'user12345',
+}
+
+
+async def seed(engine, users: int) -> None:
+    await prepare_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text('TRUNCATE TABLE "user" RESTART IDENTITY '
+                                'CASCADE'))
+        await conn.execute(SEED_USERS, dict(count=users))
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE "user"'))
+
+
+async def measure(session, statement) -> list:
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        await session.execute(statement)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+async def main(users: int, no_seed: bool) -> int:
+    engine = make_engine()
+    if not no_seed:
+        await seed(engine, users)
+    failed = False
+    async with make_session_factory(engine)() as session:
+        trigram = await has_trigram(session)
+        if not trigram:
+            print('pg_trgm не установлен: поиск по ФИО без индекса')
+        for name, query in SCENARIOS.items():
+            statement = search_query(PROJECTION, query, LIMIT,
+                                     trigram=trigram)
+            timings = await measure(session, statement)
+            plan = (await session.execute(
+                Explain(statement, 'ANALYZE, BUFFERS')
+            )).scalars().all()
+            print(f'{name:<18} median={statistics.median(timings):7.2f}ms '
+                  f'max={max(timings):7.2f}ms')
+            print('\n'.join(f'    {line}' for line in plan))
+            if trigram and any('Seq Scan' in line for line in plan):
+                failed = True
+    await engine.dispose()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--no-seed', action='store_true')
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.users, args.no_seed)))
@@ -0,0 +1,139 @@
+"""Общие помощники бенчмарков: подключение к БД и наполнение данными."""
+import os
+import resource
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.expression import ClauseElement, Executable
+
+from app.core.config import settings
+from app.core.db import Base
+from app.core.models import User
+
+BENCH_DATABASE_URL = os.getenv('BENCH_DATABASE_URL', settings.DATABASE_URL)
+SEED_BATCH = 5000
+SEED_OBJECTS = text('''
+    INSERT INTO somemodel (owner_id, name, attributes, created_at,
+                           updated_at)
+    SELECT 1 + g % :owners,
+           'object ' || g,
+           jsonb_build_object(
+               'color', (ARRAY['red', 'green', 'blue', 'black'])[1 + g % 4],
+               'size', g % 100,
+               'tag', 't' || g % 1000),
+           now() - make_interval(secs => g),
+           now() - make_interval(secs => g)
+    FROM generate_series(1, :count) AS g
+''')
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN над готовым выражением с обычными параметрами привязки."""
+    inherit_cache = False
+
+    def __init__(self, statement, options: str = ''):
+        self.statement = statement
+        self.options = options
+
+
+@compiles(Explain)
+def compile_explain(element, compiler, **kw):
+    options = f'({element.options}) ' if element.options else ''
+    return f'EXPLAIN {options}' + compiler.process(element.statement, **kw)
+
+
+def make_engine(**kwargs):
+    return create_async_engine(BENCH_DATABASE_URL, **kwargs)
+
+
+def make_session_factory(engine):
+    return sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def peak_rss_mb() -> float:
+    """Пиковый RSS текущего процесса в мегабайтах (Linux: ru_maxrss в КБ)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def prepare_schema(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+
+async def seed_users(engine, count: int,
+                     hashed_password: str = 'x' * 60) -> None:
+    """Пересоздаёт содержимое таблицы user из `count` синтетических строк."""
+    await prepare_schema(engine)
+    async with engine.begin() as conn:
+        await conn.execute(text('TRUNCATE TABLE "user" RESTART IDENTITY '
+                                'CASCADE'))
+        for start in range(0, count, SEED_BATCH):
+            await conn.execute(insert(User), [
+                dict(email=f'user{i}@bench.example',
+                     hashed_password=hashed_password,
+                     firstname=f'Имя{i}', surname='Фамилия',
+                     patronymic='Отчество', is_active=True,
+                     is_superuser=False, is_verified=False)
+                for i in range(start, min(start + SEED_BATCH, count))
+            ])
+
+
+async def seed_objects(engine, count: int, owners: int) -> None:
+    """Добавляет `count` объектов владельцам с id от 1 до `owners`."""
+    async with engine.begin() as conn:
+        await conn.execute(SEED_OBJECTS, dict(owners=owners, count=count))
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text('VACUUM ANALYZE somemodel'))
+
+
+def percentile(values, fraction: float) -> float:
+    """Перцентиль по методу ближайшего ранга; fraction - доля от 0 до 1."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1,
+                       int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def override_app_session(app, session_factory) -> None:
+    """Подменяет сессию приложения на сессию бенчмарочной БД."""
+    from app.core.db import get_async_session
+
+    async def get_bench_session():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = get_bench_session
+
+
+class RoundTripCounter:
+    """
+    Считает обращения к серверу через события движка.
+
+    BEGIN и COMMIT/ROLLBACK - отдельные обращения у asyncpg, поэтому
+    учитываются наравне с выполненными выражениями.
+    """
+
+    EVENTS = ('before_cursor_execute', 'begin', 'commit', 'rollback')
+
+    def __init__(self, engine):
+        self.engine = engine.sync_engine
+        self.count = 0
+
+    def _increment(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        from sqlalchemy import event
+        for name in self.EVENTS:
+            event.listen(self.engine, name, self._increment)
+        return self
+
+    def __exit__(self, *exc_info):
+        from sqlalchemy import event
+        for name in self.EVENTS:
+            event.remove(self.engine, name, self._increment)
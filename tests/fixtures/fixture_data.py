@@ -1,10 +1,14 @@
 import asyncpg
 import pytest
+from fastapi import Depends
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.core.db import Base, get_async_session
+from app.core.hashing import hash_password
+from app.core.metrics import instrument_engine
+from app.core.models import User
 from app.core.user import current_superuser, current_user
 from app.main import app
 from app.schemas.user import UserCreate
@@ -37,6 +41,7 @@ async def async_db_engine():
     )
 
     engine = create_async_engine(SQLALCHEMY_DATABASE_URL)
+    instrument_engine(engine.sync_engine)
     try:
         await create_database_if_not_exists()
         async with engine.begin() as conn:
@@ -67,15 +72,53 @@ async def client(async_db):
         yield client
 
 
+async def create_db_user(session: AsyncSession, user: UserCreate) -> User:
+    """Сохраняет пользователя фикстуры в БД, чтобы у него был id."""
+    db_user = User(**user.model_dump(exclude={'password'}),
+                   hashed_password=hash_password(user.password))
+    session.add(db_user)
+    await session.commit()
+    return db_user
+
+
+def as_current_user(user_id: int):
+    """
+    Подмена current_user/current_superuser: пользователь заново читается
+    в сессии запроса, поэтому откат или истечение объектов в одном тесте
+    не ломают следующие.
+    """
+
+    async def current(
+            session: AsyncSession = Depends(get_async_session)
+    ) -> User:
+        return await session.get(User, user_id, populate_existing=True)
+
+    return current
+
+
 @pytest.fixture(scope='session')
-async def authenticated_client(client):
-    app.dependency_overrides[current_user] = lambda: authenticated_user
-    return client
+async def authenticated_user_id(async_db):
+    return (await create_db_user(async_db, authenticated_user)).id
 
 
 @pytest.fixture(scope='session')
-async def superuser_client(client):
-    app.dependency_overrides[current_superuser] = lambda: superuser
+async def superuser_id(async_db):
+    return (await create_db_user(async_db, superuser)).id
+
+
+# Подмена пользователя живёт один тест: иначе результат тестов без
+# авторизации зависел бы от того, какие фикстуры уже отработали.
+@pytest.fixture
+async def authenticated_client(client, authenticated_user_id, monkeypatch):
+    monkeypatch.setitem(app.dependency_overrides, current_user,
+                        as_current_user(authenticated_user_id))
+    return client
+
+
+@pytest.fixture
+async def superuser_client(client, superuser_id, monkeypatch):
+    monkeypatch.setitem(app.dependency_overrides, current_superuser,
+                        as_current_user(superuser_id))
     return client
 
 
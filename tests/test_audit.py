@@ -0,0 +1,158 @@
+from datetime import datetime, timezone
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import delete, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core.audit import AuditLog, audit_log, partition_name
+from app.core.config import settings
+from app.core.models import AuditEvent
+from app.core.user import current_superuser, current_user
+from app.main import app
+from app.schemas.user import UserCreate
+
+from .fixtures.fixture_data import as_current_user, create_db_user
+
+
+@pytest.fixture
+async def audit_sessions(async_db_engine):
+    factory = sessionmaker(async_db_engine, class_=AsyncSession,
+                           expire_on_commit=False)
+    yield factory
+    async with factory() as session:
+        await session.execute(delete(AuditEvent).where(
+            AuditEvent.entity.like('test%')
+        ))
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_events_are_written_in_batches_by_month(audit_sessions,
+                                                      monkeypatch):
+    """
+    События копятся в буфере и пишутся пачками; секции месяцев
+    создаются перед первой записью.
+    """
+    monkeypatch.setattr(settings, 'AUDIT_BATCH_SIZE', 2)
+    log = AuditLog(audit_sessions)
+    for entity_id in range(3):
+        log.record('test.update', 'test', entity_id, dict(n=entity_id),
+                   actor_id=1)
+    old = datetime(2020, 1, 15, tzinfo=timezone.utc)
+    log.buffer[0]['created_at'] = old
+    assert len(log) == 3
+    assert await log.flush() == 3
+    assert len(log) == 0
+    async with audit_sessions() as session:
+        events = (await session.scalars(
+            select(AuditEvent).where(AuditEvent.entity == 'test')
+            .order_by(AuditEvent.entity_id)
+        )).all()
+        assert [event.changes for event in events] == [
+            dict(n=0), dict(n=1), dict(n=2)
+        ]
+        assert events[0].created_at == old
+        partition = await session.scalar(
+            text('SELECT tableoid::regclass::text FROM audit_event '
+                 'WHERE entity_id = 0 AND entity = :entity'),
+            dict(entity='test')
+        )
+        assert partition == partition_name(old.date())
+
+
+@pytest.mark.anyio
+async def test_stop_flushes_buffer(audit_sessions, monkeypatch):
+    """Остановка записывает события, которые не дождались пачки."""
+    monkeypatch.setattr(settings, 'AUDIT_FLUSH_INTERVAL', 3600)
+    log = AuditLog(audit_sessions)
+    log.start()
+    log.record('test.delete', 'test-stop', 7)
+    await log.stop()
+    assert log.stats() == dict(buffered=0, written=1, dropped=0,
+                               rejected=0)
+    async with audit_sessions() as session:
+        assert await session.scalar(select(AuditEvent.entity_id).where(
+            AuditEvent.entity == 'test-stop'
+        )) == 7
+
+
+@pytest.mark.anyio
+async def test_rejected_events_do_not_block_the_log(audit_sessions,
+                                                    monkeypatch):
+    """
+    Событие, которое БД отвергает, отбрасывается, а остальные события
+    пачки записываются; недоступная БД возвращает пачку в буфер.
+    """
+    log = AuditLog(audit_sessions)
+    for entity_id in range(4):
+        log.record('test.update', 'test-rejected', entity_id)
+    log.buffer[2]['action'] = 'x' * 100
+    assert await log.flush() == 3
+    assert log.stats() == dict(buffered=0, written=3, dropped=0,
+                               rejected=1)
+    async with audit_sessions() as session:
+        assert (await session.scalars(
+            select(AuditEvent.entity_id)
+            .where(AuditEvent.entity == 'test-rejected')
+            .order_by(AuditEvent.entity_id)
+        )).all() == [0, 1, 3]
+
+    def unavailable():
+        raise OperationalError('SELECT 1', {}, ConnectionRefusedError())
+
+    monkeypatch.setattr(log, 'session_factory', unavailable)
+    log.record('test.update', 'test-rejected', 4)
+    with pytest.raises(OperationalError):
+        await log.flush()
+    assert [event['entity_id'] for event in log.buffer] == [4]
+    assert log.rejected == 1
+
+
+def test_buffer_limit_drops_oldest(monkeypatch):
+    monkeypatch.setattr(settings, 'AUDIT_BUFFER_LIMIT', 2)
+    log = AuditLog()
+    for entity_id in range(3):
+        log.record('test.update', 'test', entity_id)
+    assert [event['entity_id'] for event in log.buffer] == [1, 2]
+    assert log.dropped == 1
+
+
+@pytest.mark.anyio
+async def test_object_changes_are_audited(client: AsyncClient, async_db,
+                                          audit_sessions, monkeypatch):
+    """
+    Изменения объектов попадают в журнал с автором каждого действия
+    и доступны в /audit.
+    """
+    author = await create_db_user(async_db, UserCreate(
+        email='author@example.com', firstname='Author', password='qwerty'
+    ))
+    admin = await create_db_user(async_db, UserCreate(
+        email='auditor@example.com', firstname='Auditor', password='qwerty',
+        is_superuser=True
+    ))
+    monkeypatch.setattr(audit_log, 'session_factory', audit_sessions)
+    monkeypatch.setitem(app.dependency_overrides, current_user,
+                        as_current_user(author.id))
+    monkeypatch.setitem(app.dependency_overrides, current_superuser,
+                        as_current_user(admin.id))
+    created = await client.post('/objects', json=dict(name='audited'))
+    object_id = created.json()['id']
+    deleted = await client.delete(f'/objects/{object_id}')
+    assert deleted.status_code == 204, deleted.text
+    await audit_log.flush()
+    response = await client.get('/audit', params=dict(
+        entity='somemodel', entity_id=object_id, order='desc'
+    ))
+    assert response.status_code == 200, response.text
+    events = response.json()
+    assert [(event['action'], event['actor_id']) for event in events] == [
+        ('object.delete', admin.id), ('object.create', author.id)
+    ]
+    # Чтение /audit шло в общей сессии тестов: завершаем её транзакцию,
+    # иначе блокировка audit_event задержит создание секций в других
+    # тестах.
+    await async_db.commit()
@@ -1,3 +1,10 @@
+import pytest
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+
+from app.core.init_db import (ALEMBIC_INI, SCHEMA_REVISION, is_bootstrapped,
+                              mark_bootstrapped)
+
 from .conftest import BASE_DIR
 
 
@@ -33,3 +40,32 @@ def test_check_migration_file_exist():
     assert len(files_in_version_dir) > 0, (
         'В папке `alembic.versions` не обнаружены файлы миграций'
     )
+
+
+def test_db_profile_fills_only_unset_pool_settings():
+    """
+    Профиль БД задаёт параметры пула, но не перекрывает явные значения.
+    """
+    profiled = Settings(DB_PROFILE='pgbouncer', DB_POOL_SIZE=3)
+    assert profiled.DB_PGBOUNCER is True
+    assert profiled.DB_MAX_OVERFLOW == 0
+    assert profiled.DB_POOL_SIZE == 3
+
+
+def test_schema_revision_is_alembic_head():
+    """
+    SCHEMA_REVISION совпадает с последней миграцией: иначе bootstrap
+    не будет считаться выполненным после обновления схемы.
+    """
+    script = ScriptDirectory.from_config(Config(str(ALEMBIC_INI)))
+    assert script.get_current_head() == SCHEMA_REVISION
+
+
+@pytest.mark.anyio
+async def test_bootstrap_marker_is_checked(async_db_engine):
+    """
+    Запуск считает окружение готовым только после отметки bootstrap.
+    """
+    assert await is_bootstrapped(async_db_engine) is False
+    await mark_bootstrapped(async_db_engine)
+    assert await is_bootstrapped(async_db_engine) is True
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from sqlalchemy import select
+
+from app.core.hashing import (HashingPool, HashingPoolSaturated,
+                              PooledPasswordHelper)
+from app.core.models import User
+from app.core.user import UserManager
+from app.schemas.user import UserCreate
+
+from .fixtures.fixture_data import create_db_user
+
+
+@pytest.mark.anyio
+async def test_password_hashing_runs_in_pool():
+    """
+    Хеш, посчитанный в пуле, проверяется этим же хелпером.
+    """
+    helper = PooledPasswordHelper(HashingPool('thread', 1, 1))
+    hashed = await helper.hash_async('qwerty')
+    assert (await helper.verify_and_update_async('qwerty', hashed))[0]
+    assert not (await helper.verify_and_update_async('wrong', hashed))[0]
+    helper.pool.shutdown()
+
+
+@pytest.mark.anyio
+async def test_saturated_pool_rejects_with_503():
+    """
+    Переполненный пул сразу отклоняет задачу, не ставя её в очередь.
+    """
+    pool = HashingPool('thread', workers=1, queue_size=0)
+    busy = asyncio.ensure_future(pool.run(time.sleep, 0.2))
+    await asyncio.sleep(0)
+    with pytest.raises(HashingPoolSaturated) as error:
+        await pool.run(time.sleep, 0)
+    assert error.value.status_code == 503
+    await busy
+    assert pool.rejected == 1
+    pool.shutdown()
+
+
+@pytest.mark.anyio
+async def test_login_releases_connection_without_committing_changes(async_db):
+    """
+    Вход отдаёт соединение на время проверки пароля, только если это не
+    зафиксирует несохранённые изменения сессии.
+    """
+    manager = UserManager(SQLAlchemyUserDatabase(async_db, User))
+    user = await create_db_user(async_db, UserCreate(
+        email='pending@example.com', firstname='Pending', password='qwerty'
+    ))
+    credentials = SimpleNamespace(username=user.email, password='qwerty')
+    assert (await manager.authenticate(credentials)).id == user.id
+    assert not async_db.in_transaction()
+
+    user.firstname = 'Changed'
+    assert (await manager.authenticate(credentials)).id == user.id
+    assert async_db.in_transaction()
+    async with async_db.bind.connect() as connection:
+        assert await connection.scalar(
+            select(User.firstname).where(User.id == user.id)
+        ) == 'Pending'
+    await async_db.commit()
@@ -0,0 +1,34 @@
+import os
+
+from tests.benchmarks.bench_import_time import measure_import, own_import_us
+
+# Доля собственных модулей app во времени импорта app.main: остальное -
+# fastapi, pydantic и SQLAlchemy, и от машины доля почти не зависит.
+# Замер: ~11% до серии изменений, ~21% сейчас (5 прогонов, 0.19-0.22).
+IMPORT_OWN_SHARE_BUDGET = float(os.getenv('IMPORT_OWN_SHARE_BUDGET', 0.3))
+# Абсолютный бюджет, мс, имеет смысл только для конкретной машины,
+# поэтому проверяется, лишь если задан.
+IMPORT_TIME_BUDGET_MS = os.getenv('IMPORT_TIME_BUDGET_MS')
+LAZY_MODULES = ('uvicorn', 'asyncpg', 'alembic')
+
+
+def test_app_import_time_within_budget():
+    """
+    Собственные модули занимают ограниченную долю импорта app.main,
+    и он не загружает модули, нужные только при запуске сервера,
+    подключении к БД или миграциях.
+    """
+    timings = measure_import('app.main')
+    eager = [name for name in LAZY_MODULES if name in timings]
+    assert not eager, f'При импорте app.main загружены: {eager}'
+    import_us = timings['app.main'][1]
+    share = own_import_us(timings) / import_us
+    assert share <= IMPORT_OWN_SHARE_BUDGET, (
+        f'Модули app заняли {share:.0%} импорта app.main '
+        f'при бюджете {IMPORT_OWN_SHARE_BUDGET:.0%}'
+    )
+    if IMPORT_TIME_BUDGET_MS is not None:
+        assert import_us / 1000 <= int(IMPORT_TIME_BUDGET_MS), (
+            f'Импорт app.main занял {import_us / 1000:.0f} мс '
+            f'при бюджете {IMPORT_TIME_BUDGET_MS} мс'
+        )
@@ -0,0 +1,97 @@
+import pytest
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from app.core import jobs
+from app.core.config import settings
+from app.core.jobs import JobWorker, claim_statement, enqueue
+from app.core.models import Job, User
+from app.core.user import USER_REGISTERED, UserManager
+from app.schemas.user import UserCreate
+
+
+@pytest.fixture
+async def job_sessions(async_db_engine):
+    factory = sessionmaker(async_db_engine, class_=AsyncSession,
+                           expire_on_commit=False)
+    yield factory
+    async with factory() as session:
+        await session.execute(delete(Job).where(Job.kind.like('test.%')))
+        await session.commit()
+
+
+@pytest.mark.anyio
+async def test_jobs_are_batched_and_retried(job_sessions, monkeypatch):
+    """
+    Задачи одного вида обрабатываются одним вызовом и удаляются; упавшая
+    задача откладывается с задержкой, а после max_attempts остаётся failed.
+    """
+    calls = []
+
+    async def collect(payloads):
+        calls.append(payloads)
+
+    async def fail(payloads):
+        raise RuntimeError('smtp недоступен')
+
+    monkeypatch.setitem(jobs.handlers, 'test.batch', collect)
+    monkeypatch.setitem(jobs.handlers, 'test.fail', fail)
+    monkeypatch.setattr(settings, 'JOB_MAX_ATTEMPTS', 2)
+    async with job_sessions() as session:
+        for number in range(3):
+            await enqueue(session, 'test.batch', dict(number=number))
+        await enqueue(session, 'test.fail', {})
+        await session.commit()
+
+    worker = JobWorker(job_sessions)
+    assert await worker.run_once() >= 4
+    assert calls == [[dict(number=0), dict(number=1), dict(number=2)]]
+    async with job_sessions() as session:
+        failed = (await session.scalars(
+            select(Job).where(Job.kind.like('test.%'))
+        )).one()
+        assert failed.kind == 'test.fail'
+        assert (failed.status, failed.attempts) == ('pending', 1)
+        assert 'smtp недоступен' in failed.last_error
+        assert failed.run_at > await session.scalar(select(func.now()))
+        await session.execute(update(Job).where(Job.id == failed.id)
+                              .values(run_at=func.now()))
+        await session.commit()
+
+    await worker.run_once()
+    async with job_sessions() as session:
+        failed = await session.get(Job, failed.id)
+        assert (failed.status, failed.attempts) == ('failed', 2)
+
+
+@pytest.mark.anyio
+async def test_concurrent_claims_skip_locked_jobs(job_sessions):
+    """Воркеры не забирают задачи, уже занятые другой транзакцией."""
+    async with job_sessions() as session:
+        await enqueue(session, 'test.claim', dict(number=1))
+        await enqueue(session, 'test.claim', dict(number=2))
+        await session.commit()
+    async with job_sessions() as first, job_sessions() as second:
+        mine = (await first.execute(claim_statement(1))).all()
+        theirs = (await second.execute(claim_statement(100))).all()
+        claimed = [job.payload for job in mine + theirs
+                   if job.kind == 'test.claim']
+        assert sorted(claimed, key=str) == [dict(number=1), dict(number=2)]
+        await first.rollback()
+        await second.rollback()
+
+
+@pytest.mark.anyio
+async def test_registration_enqueues_job(async_db):
+    """Регистрация не выполняет побочные действия, а ставит задачу."""
+    manager = UserManager(SQLAlchemyUserDatabase(async_db, User))
+    user = await manager.create(UserCreate(email='queued@example.com',
+                                           firstname='Queued',
+                                           password='qwerty'))
+    job = (await async_db.scalars(select(Job).where(
+        Job.kind == USER_REGISTERED, Job.payload['id'].as_integer() == user.id
+    ))).one()
+    assert job.payload == dict(id=user.id, email='queued@example.com')
+    assert job.status == 'pending'
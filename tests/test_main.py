@@ -4,52 +4,94 @@ import pytest
 from fastapi import status
 from httpx import AsyncClient
 
+from app.core.config import settings
+from app.core.user import current_superuser, current_user
+from app.main import app
+
 NEW_OBJECT = dict(name="Any new object")
 NEW_USER = dict(email="user@example.com",
                 firstname="Richard",
                 password="string")
 
 
+async def create_object(client: AsyncClient) -> int:
+    """Создаёт объект от имени текущего пользователя и возвращает его id."""
+    response = await client.post("/objects", json=NEW_OBJECT)
+    assert response.status_code == status.HTTP_201_CREATED
+    return response.json()["id"]
+
+
 @pytest.mark.anyio
 class TestAPI:
 
-    @pytest.mark.parametrize("endpoint", [("put", "/objects/1"),
+    @pytest.mark.parametrize("endpoint", [("get", "/objects"),
+                                          ("get", "/objects/1"),
+                                          ("put", "/objects/1"),
                                           ("delete", "/objects/1"),
                                           ("post", "/objects")])
     async def test_unauthorized_user_cant_crud(self, client: AsyncClient,
                                                endpoint):
         """
-        Неавторизованный пользователь не имеет доступа к небезопасным методам.
+        Неавторизованный пользователь не имеет доступа к объектам: без
+        проверенного токена арендатор запроса неизвестен.
         """
         response = await getattr(client, endpoint[0])(endpoint[1])
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
         assert response.json() == {"detail": "Unauthorized"}
 
 
+    async def test_authorized_user_can_add_object(
+        self, authenticated_client: AsyncClient
+    ):
+        """
+        Авторизованный пользователь может добавить запись.
+        """
+        response = await authenticated_client.post(
+            "/objects", data=json.dumps(NEW_OBJECT)
+        )
+        assert response.status_code == status.HTTP_201_CREATED
+        assert NEW_OBJECT.get("name") in response.content.decode("utf-8")
+
+
     @pytest.mark.parametrize("endpoint", [("get", "/objects"),
-                                          ("get", "/objects/1")])
+                                          ("get", "/objects/{id}")])
     async def test_authorized_user_can_view_objects(
-        self, authenticated_client: AsyncClient, endpoint, 
+        self, authenticated_client: AsyncClient, endpoint,
     ):
         """
         Авторизованный пользователь может просматривать объекты.
         """
-        response = await getattr(authenticated_client,
-                                 endpoint[0])(endpoint[1])
+        object_id = await create_object(authenticated_client)
+        response = await getattr(authenticated_client, endpoint[0])(
+            endpoint[1].format(id=object_id)
+        )
         assert response.status_code == status.HTTP_200_OK
 
 
-    async def test_authorized_user_can_add_object(
+    async def test_objects_can_be_filtered_and_sorted(
         self, authenticated_client: AsyncClient
     ):
         """
-        Авторизованный пользователь может добавить запись.
+        Список объектов фильтруется по атрибутам и листается курсором
+        в заданном порядке сортировки.
         """
-        response = await authenticated_client.post(
-            "/objects", data=json.dumps(NEW_OBJECT)
+        for name in ("Бета", "Альфа", "Гамма"):
+            response = await authenticated_client.post(
+                "/objects",
+                json=dict(name=name, attributes={"kind": "filtered"})
+            )
+            assert response.status_code == status.HTTP_201_CREATED
+        url = ('/objects?limit=2&sort=name&order=desc'
+               '&attributes={"kind": "filtered"}')
+        response = await authenticated_client.get(url)
+        assert [item["name"] for item in response.json()] == ["Гамма", "Бета"]
+        cursor = response.headers["X-Next-Cursor"]
+        response = await authenticated_client.get(f"{url}&after={cursor}")
+        assert [item["name"] for item in response.json()] == ["Альфа"]
+        response = await authenticated_client.get(
+            "/objects?sort=hashed_password"
         )
-        assert response.status_code == status.HTTP_201_CREATED
-        assert NEW_OBJECT.get("name") in response.content.decode("utf-8")
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
     async def test_authorized_user_cant_change_and_delete_object(
@@ -67,13 +109,118 @@ class TestAPI:
 
 
     async def test_super_user_can_change_and_delete_object(
-        self, superuser_client: AsyncClient
+        self, authenticated_client: AsyncClient,
+        superuser_client: AsyncClient
     ):
         """
         Superuser может изменить и удалить запись.
         """
-        response = await superuser_client.put("/objects/1",
+        url = f"/objects/{await create_object(authenticated_client)}"
+        response = await superuser_client.put(url,
                                               data=json.dumps(NEW_OBJECT))
         assert response.status_code == status.HTTP_200_OK
-        response = await superuser_client.delete("/objects/1")
+        response = await superuser_client.delete(url)
         assert response.status_code == status.HTTP_204_NO_CONTENT
+
+
+    async def test_object_conditional_get(
+        self, authenticated_client: AsyncClient,
+        superuser_client: AsyncClient
+    ):
+        """
+        Актуальная копия объекта и списка подтверждается ответом 304,
+        а изменение объекта меняет его ETag.
+        """
+        response = await superuser_client.post(
+            "/objects", json=dict(name="Версионный")
+        )
+        url = f"/objects/{response.json()['id']}"
+        response = await superuser_client.get(url)
+        etag = response.headers["ETag"]
+        assert "Last-Modified" in response.headers
+        response = await superuser_client.get(
+            url, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        response = await superuser_client.get(
+            url,
+            headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 -0000"}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        response = await superuser_client.get("/objects")
+        list_etag = response.headers["ETag"]
+        assert response.headers["Cache-Control"] == "private"
+        assert response.headers["Vary"] == "Authorization, X-Tenant-ID"
+        response = await superuser_client.get(
+            "/objects", headers={"If-None-Match": list_etag}
+        )
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        await superuser_client.put(url, json=dict(name="Изменённый"))
+        response = await superuser_client.get(
+            url, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        assert response.headers["ETag"] != etag
+        response = await superuser_client.get(
+            "/objects", headers={"If-None-Match": list_etag}
+        )
+        assert response.status_code == status.HTTP_200_OK
+
+
+    async def test_objects_batch(
+        self, authenticated_client: AsyncClient,
+        superuser_client: AsyncClient, monkeypatch
+    ):
+        """
+        Пакет операций выполняется в одной транзакции с результатом по
+        каждой строке; превышение лимита отклоняет пакет целиком.
+        """
+        response = await superuser_client.post(
+            "/objects:batch", content=b'{"op": "delete", "id": 100500}'
+        )
+        assert response.json()["results"][0]["status"] == 403
+        monkeypatch.setitem(app.dependency_overrides, current_user,
+                            app.dependency_overrides[current_superuser])
+        monkeypatch.setattr(settings, "OBJECTS_BATCH_CHUNK_SIZE", 2)
+        operations = [
+            dict(op="create", name="Пакетный 1"),
+            dict(op="create", name="Пакетный 2", attributes={"n": 2}),
+            dict(op="update", id=100500, name="Нет такого"),
+            dict(op="delete", id=100500),
+            dict(op="rename", id=100500),
+        ]
+        body = "\n".join(json.dumps(operation) for operation in operations)
+        response = await superuser_client.post("/objects:batch",
+                                               content=body.encode())
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert (report["total"], report["succeeded"]) == (5, 2)
+        assert [result["status"] for result in report["results"]] == [
+            201, 201, 404, 404, 422
+        ]
+        created, renamed = [result["id"] for result in report["results"][:2]]
+        body = "\n".join(json.dumps(operation) for operation in [
+            dict(op="update", id=created, attributes={"n": 1}),
+            dict(op="update", id=renamed, name="Переименованный"),
+            dict(op="update", id=created),
+            dict(op="delete", id=created),
+        ])
+        response = await superuser_client.post("/objects:batch",
+                                               content=body.encode())
+        results = response.json()["results"]
+        assert [result["status"] for result in results] == [
+            200, 200, 200, 204
+        ]
+        assert results[0]["version"] == results[2]["version"] == 2
+        response = await superuser_client.get(f"/objects/{renamed}")
+        assert response.json()["name"] == "Переименованный"
+        assert response.json()["attributes"] == {"n": 2}
+        response = await superuser_client.get(f"/objects/{created}")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        monkeypatch.setattr(settings, "OBJECTS_BATCH_MAX_ITEMS", 1)
+        response = await superuser_client.post(
+            "/objects:batch",
+            content=b'{"op": "create", "name": "a"}\n'
+                    b'{"op": "create", "name": "b"}'
+        )
+        assert response.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
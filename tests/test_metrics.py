@@ -0,0 +1,46 @@
+import logging
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.core.metrics import Histogram
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Гистограмма отдаёт накопительные корзины, сумму и количество.
+    """
+    histogram = Histogram('latency_seconds', 'Латентность.', (0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value, route='/objects')
+    lines = list(histogram.samples())
+    assert lines == [
+        'latency_seconds_bucket{route="/objects",le="0.1"} 1',
+        'latency_seconds_bucket{route="/objects",le="1"} 2',
+        'latency_seconds_bucket{route="/objects",le="+Inf"} 3',
+        'latency_seconds_sum{route="/objects"} 5.55',
+        'latency_seconds_count{route="/objects"} 3',
+    ]
+
+
+@pytest.mark.anyio
+async def test_requests_and_queries_are_measured(
+    authenticated_client: AsyncClient, monkeypatch, caplog
+):
+    """
+    Запросы попадают в /metrics с шаблоном маршрута и числом обращений
+    к БД, а превышение порога запросов даёт предупреждение о N+1.
+    """
+    monkeypatch.setattr(settings, 'N_PLUS_ONE_THRESHOLD', 1)
+    with caplog.at_level(logging.WARNING, logger='app.core.metrics'):
+        await authenticated_client.get('/objects')
+    assert 'N+1' in caplog.text
+    response = await authenticated_client.get('/metrics')
+    assert response.headers['content-type'].startswith('text/plain')
+    assert 'http_requests_total{method="GET",route="/objects"' in response.text
+    assert 'http_request_db_queries_count{route="/objects"}' in response.text
+    assert ('http_request_db_checkouts_count{route="/objects"}'
+            in response.text)
+    assert 'http_requests_in_flight 1' in response.text
+    assert 'db_pool_size' in response.text
@@ -0,0 +1,58 @@
+import pytest
+from httpx import AsyncClient
+
+from app.core import ratelimit
+from app.core.config import settings
+from app.core.ratelimit import TokenBuckets
+
+
+def test_token_buckets_refill_and_eviction():
+    """
+    Корзина пропускает burst запросов, затем пополняется со скоростью
+    per_minute; число хранимых ключей ограничено maxsize.
+    """
+    now = [0.0]
+    buckets = TokenBuckets(per_minute=60, burst=2, maxsize=2,
+                           clock=lambda: now[0])
+    assert buckets.take('a') == 0
+    assert buckets.take('a') == 0
+    assert buckets.take('a') == pytest.approx(1)
+    now[0] = 0.5
+    assert buckets.take('a') == pytest.approx(0.5)
+    now[0] = 1
+    assert buckets.take('a') == 0
+    buckets.take('b')
+    buckets.take('c')
+    assert len(buckets) == 2
+    assert buckets.take('a') == 0
+
+
+@pytest.mark.anyio
+async def test_login_attempts_are_throttled(
+    client: AsyncClient, monkeypatch
+):
+    """
+    Попытки входа с одним e-mail сверх лимита получают 429 с Retry-After,
+    но только на том IP, с которого их превысили.
+    """
+    monkeypatch.setattr(settings, 'RATE_LIMIT_EMAIL_BURST', 2)
+    monkeypatch.setattr(settings, 'RATE_LIMIT_EMAIL_PER_MINUTE', 1)
+    monkeypatch.setattr(ratelimit, 'rate_limiter', None)
+    credentials = dict(username='Throttled@Example.com', password='wrong')
+    for _ in range(2):
+        response = await client.post('/auth/jwt/login', data=credentials)
+        assert response.status_code == 400
+    credentials['username'] = 'throttled@example.com'
+    response = await client.post('/auth/jwt/login', data=credentials)
+    assert response.status_code == 429
+    assert 0 < int(response.headers['retry-after']) <= 60
+    response = await client.post('/auth/jwt/login', data=credentials,
+                                 headers={'X-Forwarded-For': '203.0.113.7'})
+    assert response.status_code == 429
+    monkeypatch.setattr(settings, 'RATE_LIMIT_TRUST_FORWARDED', True)
+    response = await client.post('/auth/jwt/login', data=credentials,
+                                 headers={'X-Forwarded-For': '203.0.113.7'})
+    assert response.status_code == 400
+    credentials['username'] = 'other@example.com'
+    response = await client.post('/auth/jwt/login', data=credentials)
+    assert response.status_code == 400
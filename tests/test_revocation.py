@@ -0,0 +1,75 @@
+import pytest
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from httpx import AsyncClient
+
+from app.core.config import LIFETIME
+from app.core.models import User
+from app.core.revocation import RevocationStore
+from app.core.user import UserManager, get_jwt_strategy
+from app.schemas.user import UserCreate
+
+REVOKED_USER = UserCreate(email="revoked@example.com",
+                          firstname="Revoked",
+                          password="qwerty")
+
+
+def test_revocation_store_expires_entries():
+    """
+    Отзыв действует до истечения токена, после чего запись удаляется.
+    """
+    now = [1000.0]
+    store = RevocationStore(clock=lambda: now[0])
+    store.revoke_token('a' * 32, expires=1010)
+    store.revoke_user(7, revoked_before=1000)
+    assert store.is_revoked('a' * 32, 1, issued_at=990)
+    assert store.is_revoked(None, 7, issued_at=999)
+    assert store.is_revoked(None, 7, issued_at=None)
+    assert not store.is_revoked(None, 7, issued_at=1001)
+    now[0] = 1000 + LIFETIME
+    store.purge()
+    assert len(store) == 0
+
+
+@pytest.mark.anyio
+async def test_logout_and_deactivation_revoke_tokens(
+    async_db, superuser_client: AsyncClient
+):
+    """
+    Выход из системы отзывает токен, деактивация - все токены пользователя.
+    """
+    manager = UserManager(SQLAlchemyUserDatabase(async_db, User))
+    user = await manager.create(REVOKED_USER)
+    strategy = get_jwt_strategy(async_db)
+    logged_out = await strategy.write_token(user)
+    active = await strategy.write_token(user)
+    await strategy.destroy_token(logged_out, user)
+    assert await strategy.read_token(logged_out, manager) is None
+    assert (await strategy.read_token(active, manager)).id == user.id
+    response = await superuser_client.delete(f"/users/{user.id}")
+    assert response.status_code == 200
+    assert await strategy.read_token(active, manager) is None
+
+
+@pytest.mark.anyio
+async def test_deactivation_commits_once(
+    async_db, superuser_client: AsyncClient, monkeypatch
+):
+    """
+    Деактивация, её фоновые задачи и отзыв токенов фиксируются одной
+    транзакцией - соединение из пула берётся один раз.
+    """
+    manager = UserManager(SQLAlchemyUserDatabase(async_db, User))
+    user = await manager.create(UserCreate(email="single@example.com",
+                                           firstname="Single",
+                                           password="qwerty"))
+    commits = []
+    commit = async_db.commit
+
+    async def counting_commit():
+        commits.append(1)
+        await commit()
+
+    monkeypatch.setattr(async_db, 'commit', counting_commit)
+    response = await superuser_client.delete(f"/users/{user.id}")
+    assert response.status_code == 200
+    assert len(commits) == 1
@@ -0,0 +1,30 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+
+from app.core.models import SomeModel, User
+from app.core.projection import Projection
+from app.schemas.object import ObjectRead
+from app.schemas.user import UserRead
+
+
+def test_trusted_json_matches_response_model():
+    """
+    Быстрый путь без валидации отдаёт те же данные, что и response_model.
+    """
+    user = User(id=1, email='fast@example.com', hashed_password='x',
+                firstname='Быстрый', surname=None, patronymic=None,
+                is_active=True, is_superuser=False, is_verified=False)
+    trusted = Projection(User, UserRead).object_to_json(user)
+    assert UserRead.model_validate_json(trusted) == UserRead.model_validate(user)
+    now = datetime.now(timezone.utc)
+    obj = SomeModel(id=2, name='Объект', owner_id=1, created_at=now,
+                    updated_at=now, attributes={'price': 10, 'tags': ['a']})
+    projection = Projection(SomeModel, ObjectRead)
+    trusted = ObjectRead.model_validate_json(projection.object_to_json(obj))
+    assert trusted == ObjectRead.model_validate(obj)
+    obj.attributes = {'price': Decimal('1.5')}
+    assert orjson.loads(projection.object_to_json(obj))['attributes'] == {
+        'price': '1.5'
+    }
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy import func, select, update
+
+from app.core.archive import archive_users
+from app.core.crud import some_model_crud, user_crud
+from app.core.models import User, UserArchive
+from app.core.projection import Projection
+from app.schemas.user import UserCreate, UserRead
+
+from .fixtures.fixture_data import create_db_user
+
+
+def soft_deleted_user(email: str) -> UserCreate:
+    return UserCreate(email=email, firstname='Deleted', password='qwerty',
+                      is_active=False)
+
+
+@pytest.mark.anyio
+async def test_inactive_users_are_hidden_by_default(async_db):
+    """
+    Чтение через CRUDBase видит только активных пользователей, пока не
+    передан include_inactive.
+    """
+    user = await create_db_user(async_db,
+                                soft_deleted_user('hidden@example.com'))
+    assert await user_crud.get(user.id, async_db) is None
+    assert await user_crud.get_validators(user.id, async_db) is None
+    assert (await user_crud.get(user.id, async_db,
+                                include_inactive=True)).id == user.id
+    projection = Projection(User, UserRead)
+    visible = await user_crud.get_rows(async_db, projection)
+    everyone = await user_crud.get_rows(async_db, projection,
+                                        include_inactive=True)
+    assert user.id not in [row.id for row in visible]
+    assert user.id in [row.id for row in everyone]
+    assert await user_crud.deactivate(user.id, async_db) is None
+
+
+@pytest.mark.anyio
+async def test_long_deactivated_users_are_archived(async_db):
+    """
+    Давно деактивированный пользователь без объектов переносится
+    в user_archive; владелец объектов и недавно деактивированный - нет.
+    """
+    archived = await create_db_user(async_db,
+                                    soft_deleted_user('old@example.com'))
+    owner = await create_db_user(async_db,
+                                 soft_deleted_user('owner@example.com'))
+    recent = await create_db_user(async_db,
+                                  soft_deleted_user('recent@example.com'))
+    await some_model_crud.create(dict(name='kept', owner_id=owner.id),
+                                 async_db)
+    await async_db.execute(
+        update(User).where(User.id.in_([archived.id, owner.id]))
+        .values(updated_at=func.now() - timedelta(days=365))
+    )
+    await async_db.commit()
+    moved = await archive_users(
+        async_db, [archived.id, owner.id, recent.id]
+    )
+    assert moved == [archived.id]
+    row = await async_db.get(UserArchive, archived.id)
+    assert row.email == 'old@example.com'
+    remaining = set(await async_db.scalars(select(User.id).where(
+        User.id.in_([archived.id, owner.id, recent.id])
+    )))
+    assert remaining == {owner.id, recent.id}
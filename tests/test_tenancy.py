@@ -0,0 +1,133 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import insert, text, update
+
+from app.core import tenancy
+from app.core.config import settings
+from app.core.crud import some_model_crud, user_crud
+from app.core.models import DEFAULT_TENANT_ID, Tenant, User
+from app.core.tenancy import (TENANT_HEADER, TenantLimiter, TenantMiddleware,
+                              current_tenant, resolve_tenant)
+from app.core.user import get_jwt_strategy
+from app.schemas.user import UserCreate
+
+from .fixtures.fixture_data import create_db_user
+
+
+@contextmanager
+def tenant(tenant_id: int):
+    reset = current_tenant.set(tenant_id)
+    try:
+        yield
+    finally:
+        current_tenant.reset(reset)
+
+
+def tenant_user(email: str) -> UserCreate:
+    return UserCreate(email=email, firstname='Tenant', password='qwerty')
+
+
+@pytest.mark.anyio
+async def test_crud_is_scoped_to_current_tenant(async_db):
+    """
+    Чтение и запись через CRUDBase видят только арендатора current_tenant;
+    новые объекты получают его id и попадают в хеш-секцию.
+    """
+    tenant_id = await async_db.scalar(
+        insert(Tenant).values(name='test-tenant').returning(Tenant.id)
+    )
+    member = await create_db_user(async_db, tenant_user('member@example.com'))
+    await async_db.execute(update(User).where(User.id == member.id)
+                           .values(tenant_id=tenant_id))
+    await async_db.commit()
+    outsider = await create_db_user(async_db,
+                                    tenant_user('outsider@example.com'))
+    foreign = await some_model_crud.create(
+        dict(name='default tenant', owner_id=outsider.id), async_db
+    )
+    with tenant(tenant_id):
+        assert await user_crud.get(outsider.id, async_db) is None
+        assert (await user_crud.get(member.id, async_db)).id == member.id
+        created = await some_model_crud.create(
+            dict(name='tenant object', owner_id=member.id), async_db
+        )
+        assert created.tenant_id == tenant_id
+        assert await some_model_crud.get(foreign.id, async_db) is None
+        assert await some_model_crud.remove_by_id(foreign.id,
+                                                  async_db) is None
+    with tenant(DEFAULT_TENANT_ID):
+        assert await some_model_crud.get(created.id, async_db) is None
+        assert (await some_model_crud.get(foreign.id, async_db)) is not None
+    partition = await async_db.scalar(
+        text('SELECT tableoid::regclass::text FROM somemodel WHERE id = :id'),
+        dict(id=created.id)
+    )
+    assert partition.startswith('somemodel_p')
+
+
+@pytest.mark.anyio
+async def test_tenant_is_resolved_from_verified_token(monkeypatch):
+    """
+    Арендатор берётся из подписанного токена; заголовок X-Tenant-ID -
+    только за доверенным шлюзом.
+    """
+    token = await get_jwt_strategy().write_token(
+        User(id=1, tenant_id=7, email='tenant@example.com')
+    )
+    scope = dict(headers=[(b'authorization', f'Bearer {token}'.encode())])
+    assert resolve_tenant(scope) == 7
+    forged = dict(headers=[(b'authorization', b'Bearer forged'),
+                           (TENANT_HEADER, b'9')])
+    assert resolve_tenant(forged) == DEFAULT_TENANT_ID
+    monkeypatch.setattr(settings, 'TENANT_TRUST_HEADER', True)
+    assert resolve_tenant(forged) == 9
+
+
+@pytest.mark.anyio
+async def test_tenant_limiter_caps_concurrency(monkeypatch):
+    monkeypatch.setattr(settings, 'TENANT_MAX_CONCURRENCY', 1)
+    monkeypatch.setattr(settings, 'TENANT_CONCURRENCY', {2: 2})
+    monkeypatch.setattr(settings, 'TENANT_QUEUE_TIMEOUT', 0.01)
+    limiter = TenantLimiter()
+    assert await limiter.acquire(1)
+    assert not await limiter.acquire(1)
+    assert await limiter.acquire(2) and await limiter.acquire(2)
+    assert limiter.active == {1: 1, 2: 2}
+    limiter.release(1)
+    assert await limiter.acquire(1)
+
+
+@pytest.mark.anyio
+async def test_middleware_rejects_requests_over_tenant_limit(monkeypatch):
+    """
+    Запрос сверх лимита арендатора получает 503, не доходя до приложения;
+    current_tenant выставлен только на время запроса.
+    """
+    monkeypatch.setattr(settings, 'TENANT_MAX_CONCURRENCY', 1)
+    monkeypatch.setattr(settings, 'TENANT_QUEUE_TIMEOUT', 0.01)
+    monkeypatch.setattr(tenancy, 'tenant_limiter', TenantLimiter())
+    seen, sent = [], []
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        seen.append(current_tenant.get())
+        await release.wait()
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = TenantMiddleware(app)
+    scope = dict(type='http', headers=[])
+    # Прямые вызовы read_token в других тестах выставляют current_tenant
+    # в общем контексте; middleware должен вернуть прежнее значение.
+    outer = current_tenant.get()
+    first = asyncio.ensure_future(middleware(scope, None, send))
+    await asyncio.sleep(0)
+    await middleware(scope, None, send)
+    assert sent[0]['status'] == 503
+    release.set()
+    await first
+    assert seen == [DEFAULT_TENANT_ID]
+    assert current_tenant.get() == outer
@@ -3,8 +3,12 @@ import json
 import pytest
 from fastapi import status
 from httpx import AsyncClient
+from sqlalchemy import func, select
 
-from .fixtures.fixture_data import app
+from app.core.models import User
+from app.schemas.user import UserCreate
+
+from .fixtures.fixture_data import app, create_db_user
 
 NEW_USER = dict(email="new_user@example.com",
                 firstname="Username",
@@ -54,6 +58,26 @@ class TestAuth:
         assert response.status_code == status.HTTP_200_OK
 
 
+    async def test_users_list_is_paginated(self, client: AsyncClient):
+        """
+        Список пользователей отдаётся постранично с курсором следующей
+        страницы.
+        """
+        headers = {'Authorization': NEW_USER["access_token"]}
+        all_users = (await client.get("/users", headers=headers)).json()
+        seen, url = [], "/users?limit=1"
+        while url:
+            response = await client.get(url, headers=headers)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.json()) <= 1
+            seen += [user["id"] for user in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            url = cursor and f"/users?limit=1&after={cursor}"
+        assert seen == [user["id"] for user in all_users]
+        response = await client.get("/users?after=!bad!", headers=headers)
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
     @pytest.mark.parametrize("endpoint", [("delete", "/users/1")])
     async def test_superuser_can_delete_users(self,
                                               superuser_client: AsyncClient,
@@ -66,3 +90,115 @@ class TestAuth:
         assert response.status_code == status.HTTP_200_OK
         assert ('Пользователь с id=1 деактивирован' in
                 response.content.decode("utf-8"))
+
+
+    async def test_deactivating_unknown_user_returns_404(
+        self, superuser_client: AsyncClient
+    ):
+        """
+        Деактивация несуществующего пользователя возвращает 404.
+        """
+        response = await superuser_client.delete("/users/100500")
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+    async def test_superuser_can_import_users(self,
+                                              superuser_client: AsyncClient):
+        """
+        Суперпользователь загружает пользователей из CSV и получает отчёт
+        с ошибками по номерам строк.
+        """
+        rows = "\n".join([
+            "email,password,firstname,surname",
+            "imported1@example.com,secret1,Иван,Иванов",
+            "not-an-email,secret2,Пётр,",
+            f"{NEW_USER['email']},secret3,Дубль,",
+            "imported2@example.com,secret4,Анна,",
+        ])
+        response = await superuser_client.post(
+            "/users/import?format=csv", content=rows.encode("utf-8"),
+            headers={"Content-Type": "text/csv"}
+        )
+        assert response.status_code == status.HTTP_200_OK
+        report = response.json()
+        assert report["total"] == 4
+        assert report["created"] == 2
+        assert report["skipped"] == 1
+        assert [error["row"] for error in report["errors"]] == [3, 4]
+
+    async def test_export_never_includes_password_hashes(self):
+        """
+        У HTTP-выгрузки нет параметра для хэшей паролей: их выгружает
+        только команда export-users.
+        """
+        operation = app.openapi()["paths"]["/users/export"]["get"]
+        assert [parameter["name"] for parameter
+                in operation["parameters"]] == ["format"]
+
+    async def test_import_lowercases_emails(self,
+                                            superuser_client: AsyncClient,
+                                            async_db):
+        """
+        Импорт приводит e-mail к нижнему регистру и пропускает
+        пользователей, уже зарегистрированных с другим регистром.
+        """
+        await create_db_user(async_db, UserCreate(
+            email="CaseUser@example.com", password="secret",
+            firstname="Регистр"
+        ))
+        rows = "\n".join([
+            "email,password,firstname",
+            "caseuser@example.com,secret1,Дубль",
+            "NewCase@Example.com,secret2,Новый",
+            "newcase@example.com,secret3,Дубль",
+        ])
+        response = await superuser_client.post(
+            "/users/import?format=csv", content=rows.encode("utf-8"),
+            headers={"Content-Type": "text/csv"}
+        )
+        report = response.json()
+        assert (report["created"], report["skipped"]) == (1, 2)
+        emails = await async_db.scalars(
+            select(User.email).where(func.lower(User.email).in_(
+                ["caseuser@example.com", "newcase@example.com"]
+            )).order_by(User.email)
+        )
+        assert emails.all() == ["CaseUser@example.com",
+                                "newcase@example.com"]
+
+    async def test_superuser_can_search_users(self,
+                                              superuser_client: AsyncClient,
+                                              async_db):
+        """
+        Поиск находит пользователей по ФИО и префиксу e-mail
+        и отдаёт результаты постранично.
+        """
+        for email, firstname, surname in [
+            ("searchable1@example.com", "Семён", "Сидоренко"),
+            ("searchable2@example.com", "Ольга", None),
+        ]:
+            await create_db_user(async_db, UserCreate(
+                email=email, password="secret", firstname=firstname,
+                surname=surname
+            ))
+        response = await superuser_client.get("/users/search?q=Сидоренко")
+        assert response.status_code == status.HTTP_200_OK
+        assert [user["email"] for user in response.json()] == [
+            "searchable1@example.com"
+        ]
+        emails = []
+        cursor = None
+        for _ in range(3):
+            params = {"q": "Searchable", "limit": 1}
+            if cursor:
+                params["after"] = cursor
+            response = await superuser_client.get("/users/search",
+                                                  params=params)
+            emails += [user["email"] for user in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+        assert emails == ["searchable1@example.com",
+                          "searchable2@example.com"]
+        response = await superuser_client.get(
+            "/users/search", params={"q": "searchable", "after": "bad"}
+        )
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
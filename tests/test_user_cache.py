@@ -0,0 +1,50 @@
+import pytest
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+
+from app.core.cache import TTLCache
+from app.core.models import User
+from app.core.user import UserManager, get_jwt_strategy, user_cache
+from app.schemas.user import UserCreate, UserUpdate
+
+CACHED_USER = UserCreate(email="cached@example.com",
+                         firstname="Cached",
+                         password="qwerty")
+
+
+def test_ttl_cache_expires_and_evicts():
+    """
+    Записи кэша устаревают по TTL и вытесняются по LRU.
+    """
+    now = [0.0]
+    cache = TTLCache(maxsize=2, ttl=10, clock=lambda: now[0])
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.set(3, 'c')
+    assert cache.get(2) is None
+    now[0] = 11
+    assert cache.get(1) is None
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+@pytest.mark.anyio
+async def test_token_resolution_is_cached_and_invalidated(async_db):
+    """
+    Повторное чтение токена не идёт в БД, обновление сбрасывает кэш.
+    """
+    manager = UserManager(SQLAlchemyUserDatabase(async_db, User))
+    user = await manager.create(CACHED_USER)
+    strategy = get_jwt_strategy()
+    token = await strategy.write_token(user)
+    user_cache.clear()
+    hits = user_cache.hits
+
+    assert (await strategy.read_token(token, manager)).id == user.id
+    cached = await strategy.read_token(token, manager)
+    assert cached.email == CACHED_USER.email
+    assert user_cache.hits == hits + 1
+
+    await manager.update(UserUpdate(is_superuser=True), user, safe=False)
+    assert len(user_cache) == 0
+    assert (await strategy.read_token(token, manager)).is_superuser